@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Subject, ClassLevel, Assignment, StudentAssignment, Result
+from django.utils import timezone
+from .models import Subject, ClassLevel, Assignment, StudentAssignment, Result, ReportCardJob, GradingScheme, TranscriptSnapshot, StoredBlob, session_for_date, term_for_date
+from .report_cards import start_job
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -13,18 +15,71 @@ class ClassLevelAdmin(admin.ModelAdmin):
     list_display = ['name', 'level', 'school']
     list_filter = ['school']
     ordering = ['level']
+    actions = ['generate_report_cards']
+
+    @admin.action(description='Generate report cards for the current term')
+    def generate_report_cards(self, request, queryset):
+        today = timezone.now().date()
+        for class_level in queryset.filter(school__isnull=False):
+            job = ReportCardJob.objects.create(
+                school_id=class_level.school_id,
+                class_level=class_level,
+                session=session_for_date(today),
+                term=term_for_date(today),
+                created_by=request.user,
+            )
+            start_job(job)
+        self.message_user(request, "Report card generation started. Follow its progress under Report card jobs.")
+
+@admin.register(GradingScheme)
+class GradingSchemeAdmin(admin.ModelAdmin):
+    list_display = ['school', 'name', 'version', 'updated_at']
+    readonly_fields = ['version', 'updated_at']
+    search_fields = ['school__name', 'name']
+
+@admin.register(TranscriptSnapshot)
+class TranscriptSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['student', 'session', 'created_at']
+    list_filter = ['session']
+    search_fields = ['student__admission_number', 'student__user__first_name', 'student__user__last_name']
+    readonly_fields = ['student', 'session', 'data', 'created_at']
 
 @admin.register(Assignment)
 class AssignmentAdmin(admin.ModelAdmin):
-    list_display = ['title', 'subject', 'teacher', 'due_date', 'max_score']
-    list_filter = ['subject', 'teacher']
+    list_display = ['title', 'subject', 'teacher', 'due_date', 'max_score', 'lazy_submissions']
+    list_filter = ['subject', 'teacher', 'lazy_submissions']
 
 @admin.register(StudentAssignment)
 class StudentAssignmentAdmin(admin.ModelAdmin):
     list_display = ['student', 'assignment', 'is_submitted', 'score']
     list_filter = ['is_submitted']
 
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refs', 'last_uploaded']
+    readonly_fields = ['name', 'size', 'refs', 'last_uploaded']
+
 @admin.register(Result)
 class ResultAdmin(admin.ModelAdmin):
-    list_display = ['student', 'subject', 'exam_type', 'score', 'max_score', 'date_taken']
-    list_filter = ['exam_type', 'subject']
\ No newline at end of file
+    list_display = ['student', 'subject', 'exam_type', 'score', 'max_score', 'session', 'term', 'date_taken']
+    list_filter = ['session', 'term', 'exam_type', 'subject']
+
+@admin.register(ReportCardJob)
+class ReportCardJobAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'completed', 'total', 'progress', 'output', 'created_at']
+    list_filter = ['status', 'school']
+    readonly_fields = ['status', 'total', 'completed', 'output', 'error', 'created_by']
+    actions = ['resume_jobs']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        if not change:
+            start_job(obj)
+
+    @admin.action(description='Resume selected jobs')
+    def resume_jobs(self, request, queryset):
+        for job in queryset.exclude(status='running'):
+            start_job(job)
+        self.message_user(request, "Selected report card jobs resumed.")
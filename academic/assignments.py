@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from users.models import Student
+from .models import Assignment, StudentAssignment
+
+
+BATCH_SIZE = 1000
+
+
+def fan_out(assignment, class_ids, school):
+    """
+    Record the classes an assignment is set for and, unless it is lazy, create
+    a StudentAssignment for every student in them with batched INSERTs.
+    Returns the number of rows created.
+    """
+    students = Student.objects.filter(school=school, class_level_id__in=class_ids)
+    with transaction.atomic():
+        assignment.classes.set(class_ids)
+        if assignment.lazy_submissions:
+            # Rows come later, but the class members are assigned from now
+            assignment.assigned_count = students.count()
+            assignment.save(update_fields=['assigned_count'])
+            return 0
+        rows = [
+            StudentAssignment(assignment=assignment, student_id=student_id)
+            for student_id in students.values_list('id', flat=True)
+        ]
+        StudentAssignment.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        assignment.assigned_count = len(rows)
+        assignment.save(update_fields=['assigned_count'])
+    return len(rows)
+
+
+def lazy_assignments(student):
+    """Lazy assignments set for the student's class that the student has no row for yet"""
+    if not student.class_level_id:
+        return Assignment.objects.none()
+    return Assignment.objects.filter(
+        lazy_submissions=True, classes=student.class_level_id
+    ).exclude(studentassignment__student=student)
+
+
+def materialize(student):
+    """Create the student's missing rows for lazy assignments, on their first view"""
+    rows = [
+        StudentAssignment(assignment_id=assignment_id, student=student)
+        for assignment_id in lazy_assignments(student).values_list('id', flat=True)
+    ]
+    if rows:
+        StudentAssignment.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def student_assignment_for(student, assignment):
+    """The student's StudentAssignment, created now for a lazy assignment set for their class"""
+    student_assignment = StudentAssignment.objects.filter(assignment=assignment, student=student).first()
+    if student_assignment is None and assignment.lazy_submissions and student.class_level_id and \
+            assignment.classes.filter(id=student.class_level_id).exists():
+        student_assignment, _ = StudentAssignment.objects.get_or_create(assignment=assignment, student=student)
+    return student_assignment
+
+
+def pending_count(student):
+    """Assignments the student has not submitted, counting lazy ones with no row yet"""
+    return StudentAssignment.objects.filter(student=student, is_submitted=False).count() + \
+        lazy_assignments(student).count()
+
+
+def submit(student_assignment):
+    """
+    Save a submission and count it once on its assignment. The is_submitted
+    flip is a conditional UPDATE, so a double submit can't count twice.
+    """
+    with transaction.atomic():
+        first = StudentAssignment.objects.filter(pk=student_assignment.pk, is_submitted=False).update(
+            is_submitted=True
+        )
+        student_assignment.is_submitted = True
+        student_assignment.submission_date = student_assignment.submission_date or timezone.now()
+        student_assignment.save()
+        if first:
+            Assignment.objects.filter(pk=student_assignment.assignment_id).update(
+                submitted_count=F('submitted_count') + 1
+            )
+    return bool(first)
+
+
+def grade(student_assignment, score, feedback=''):
+    """Set (or clear, with score None) a submission's score and move the assignment's counters by the difference"""
+    with transaction.atomic():
+        previous = StudentAssignment.objects.select_for_update().filter(
+            pk=student_assignment.pk
+        ).values_list('score', flat=True).first()
+        student_assignment.score = score
+        student_assignment.feedback = feedback
+        student_assignment.save(update_fields=['score', 'feedback'])
+
+        graded = (score is not None) - (previous is not None)
+        Assignment.objects.filter(pk=student_assignment.assignment_id).update(
+            graded_count=F('graded_count') + graded,
+            score_sum=F('score_sum') + (score or 0) - (previous or 0),
+        )
+
+
+def reconcile_counters(assignments=None):
+    """
+    Recompute the counters of every assignment (or a queryset of them) from
+    the StudentAssignment rows and save those that drifted. Lazy assignments
+    count every student now in their classes as assigned. Returns the number
+    of assignments repaired.
+    """
+    assignments = Assignment.objects.all() if assignments is None else assignments
+    rows = assignments.annotate(
+        row_count=Count('studentassignment', distinct=True),
+        submitted=Count('studentassignment', filter=Q(studentassignment__is_submitted=True), distinct=True),
+        graded=Count('studentassignment', filter=Q(studentassignment__score__isnull=False), distinct=True),
+    ).only('id', 'lazy_submissions', 'assigned_count', 'submitted_count', 'graded_count', 'score_sum')
+    score_sums = dict(
+        StudentAssignment.objects.filter(assignment__in=assignments).values('assignment_id').annotate(
+            total=Sum('score')
+        ).order_by().values_list('assignment_id', 'total')
+    )
+    class_sizes = dict(
+        assignments.filter(lazy_submissions=True).annotate(
+            size=Count('classes__student', distinct=True)
+        ).values_list('id', 'size')
+    )
+
+    changed = []
+    for assignment in rows:
+        counters = {
+            'assigned_count': max(assignment.row_count, class_sizes.get(assignment.id, 0)),
+            'submitted_count': assignment.submitted,
+            'graded_count': assignment.graded,
+            'score_sum': score_sums.get(assignment.id) or 0,
+        }
+        if any(getattr(assignment, field) != value for field, value in counters.items()):
+            for field, value in counters.items():
+                setattr(assignment, field, value)
+            changed.append(assignment)
+    if changed:
+        Assignment.objects.bulk_update(
+            changed, ['assigned_count', 'submitted_count', 'graded_count', 'score_sum'], batch_size=BATCH_SIZE
+        )
+    return len(changed)
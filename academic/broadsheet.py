@@ -0,0 +1,139 @@
+import csv
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F, FloatField, Sum
+from django.http import StreamingHttpResponse
+
+from users.models import Student
+from .exports import Echo
+from .gradebook import Gradebook, grade_bands
+from .grading import results_version, scheme_for_school, weight_expression
+from .models import ClassSubject, Result
+
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def subject_totals(class_level, session, term, weights=None):
+    """
+    Yield (student_id, subject_id, total) for a class and term from one grouped
+    query. Only subjects the class offers (its ClassSubject rows) are counted.
+    """
+    weight = weight_expression(weights)
+    rows = Result.objects.filter(
+        student__class_level=class_level,
+        subject__classsubject__class_level=class_level,
+        session=session,
+        term=term,
+        max_score__gt=0,
+    ).exclude(assessment=Result.OVERALL).values('student_id', 'subject_id').annotate(
+        weighted=Sum(F('score') * 100.0 / F('max_score') * weight, output_field=FloatField()),
+        weight=Sum(weight, output_field=FloatField()),
+    ).order_by().values_list('student_id', 'subject_id', 'weighted', 'weight')
+    for student_id, subject_id, weighted, weight_sum in rows:
+        if weight_sum:
+            yield student_id, subject_id, round(weighted / weight_sum, 1)
+
+
+def _cell(value):
+    return None if value != value else value
+
+
+def build_broadsheet(class_level, session, term, scheme=None):
+    """
+    Every student in a class against every subject it offers, with subject
+    totals and grades, overall total, average, grade and position.
+
+    Three queries (subjects, students, the grouped results query) plus the
+    grading scheme lookup; the pivot, grades and ranks are done with numpy.
+    """
+    scheme = scheme or scheme_for_school(class_level.school_id)
+    subjects = list(
+        ClassSubject.objects.filter(class_level=class_level).select_related('subject').order_by('subject__name')
+    )
+    students = list(
+        Student.objects.filter(class_level=class_level).select_related('user').order_by('admission_number')
+    )
+
+    student_index = {student.id: i for i, student in enumerate(students)}
+    subject_index = {class_subject.subject_id: j for j, class_subject in enumerate(subjects)}
+    scores = np.full((len(students), len(subjects)), np.nan)
+    for student_id, subject_id, total in subject_totals(class_level, session, term, scheme.weights):
+        if student_id in student_index and subject_id in subject_index:
+            scores[student_index[student_id], subject_index[subject_id]] = total
+
+    # Subjects become the columns of a gradebook, each marked out of 100
+    gradebook = Gradebook(student_index, subject_index, scores, np.where(np.isnan(scores), np.nan, 100.0))
+    averages = gradebook.totals()
+    positions = gradebook.ranks(averages)
+    subject_grades = grade_bands(scores, scheme.bands)
+    grades = grade_bands(averages, scheme.bands)
+    sums = np.where(gradebook.mask.any(axis=1), np.nansum(scores, axis=1), np.nan)
+    subject_averages = gradebook.assessment_averages()
+
+    rows = []
+    for i, student in enumerate(students):
+        rows.append({
+            'student_id': student.id,
+            'name': student.user.get_full_name() or student.user.username,
+            'admission_number': student.admission_number,
+            'cells': [
+                {'total': _cell(score), 'grade': grade}
+                for score, grade in zip(scores[i].tolist(), subject_grades[i].tolist())
+            ],
+            'total': _cell(round(float(sums[i]), 1)),
+            'average': _cell(float(averages[i])),
+            'grade': grades[i],
+            'position': int(positions[i]) or None,
+        })
+    rows.sort(key=lambda row: (row['position'] or len(rows) + 1, row['admission_number']))
+
+    return {
+        'class_level': {'id': class_level.id, 'name': class_level.name},
+        'session': session,
+        'term': term,
+        'grading_scheme': scheme.name,
+        'subjects': [
+            {'id': cs.subject_id, 'name': cs.subject.name, 'code': cs.subject.code} for cs in subjects
+        ],
+        'students': rows,
+        'subject_averages': [subject_averages.get(cs.subject_id) for cs in subjects],
+        'class_average': gradebook.class_average(averages),
+    }
+
+
+def class_broadsheet(class_level, session, term):
+    """
+    build_broadsheet(), cached per class and term. Keyed on the class's
+    results_version, which is bumped when its results, students or subjects
+    change, and on the grading scheme's version; both are stored in the
+    database so no worker serves a stale broadsheet.
+    """
+    scheme = scheme_for_school(class_level.school_id)
+    key = f"broadsheet:{class_level.id}:{results_version(class_level.id)}:{session}:{term}:{scheme.version}"
+    broadsheet = cache.get(key)
+    if broadsheet is None:
+        broadsheet = build_broadsheet(class_level, session, term, scheme)
+        cache.set(key, broadsheet, CACHE_TIMEOUT)
+    return broadsheet
+
+
+def broadsheet_csv(broadsheet, filename):
+    """Stream a broadsheet as CSV, one student per row"""
+    def rows():
+        yield ['Position', 'Admission Number', 'Student'] + [s['name'] for s in broadsheet['subjects']] + [
+            'Total', 'Average', 'Grade'
+        ]
+        for row in broadsheet['students']:
+            yield [row['position'] or '', row['admission_number'], row['name']] + [
+                '' if cell['total'] is None else cell['total'] for cell in row['cells']
+            ] + ['' if row['total'] is None else row['total'], '' if row['average'] is None else row['average'], row['grade']]
+        yield ['', '', 'Subject average'] + [
+            '' if average is None else average for average in broadsheet['subject_averages']
+        ] + ['', '' if broadsheet['class_average'] is None else broadsheet['class_average'], '']
+
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows()), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
@@ -0,0 +1,166 @@
+import csv
+import logging
+import os
+import tempfile
+import zipfile
+
+from django.utils.text import get_valid_filename
+
+from django.http import FileResponse, HttpResponseBadRequest, StreamingHttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+HEADER = [
+    'Student', 'Admission Number', 'Class', 'Subject', 'Exam Type', 'Session', 'Term',
+    'Score', 'Max Score', 'Percentage', 'Date Taken', 'Comment',
+]
+
+FIELDS = [
+    'student__user__first_name', 'student__user__last_name', 'student__admission_number',
+    'student__class_level__name', 'subject__name', 'exam_type', 'session', 'term',
+    'score', 'max_score', 'date_taken', 'comment',
+]
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+class ZipBuffer:
+    """
+    Write-only file for zipfile that hands back whatever was written since the
+    last take(). It can't seek, so zipfile writes each entry's sizes after its
+    data and the archive can be streamed as it is built.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def submission_entries(submissions):
+    """Yield (entry name, StudentAssignment) for each submitted file, named by admission number and student"""
+    used = set()
+    rows = submissions.filter(is_submitted=True).exclude(submitted_file='').exclude(
+        submitted_file__isnull=True
+    ).select_related('student__user').order_by('student__admission_number').iterator(chunk_size=CHUNK_SIZE)
+    for submission in rows:
+        student = submission.student
+        name = get_valid_filename(
+            f"{student.admission_number} {student.user.get_full_name() or student.user.username}"
+        )
+        ext = os.path.splitext(submission.submitted_file.name)[1].lower()
+        entry = f"{name}{ext}"
+        copy = 2
+        while entry in used:
+            entry = f"{name}_{copy}{ext}"
+            copy += 1
+        used.add(entry)
+        yield entry, submission
+
+
+def zip_chunks(entries):
+    """
+    Build a zip of (entry name, StudentAssignment) pairs and yield it in pieces
+    as each file is read, so memory stays at about one file chunk however many
+    or large the submissions are. Files missing from storage are skipped.
+    """
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for entry, submission in entries:
+            info = zipfile.ZipInfo(entry, date_time=(submission.submission_date or submission.created_at).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            try:
+                upload = submission.submitted_file.open('rb')
+            except (FileNotFoundError, OSError):
+                logger.warning("Submission %s: %s is missing, skipped", submission.id, submission.submitted_file.name)
+                continue
+            with upload, archive.open(info, mode='w') as target:
+                for chunk in upload.chunks():
+                    target.write(chunk)
+                    data = buffer.take()
+                    if data:
+                        yield data
+            yield buffer.take()
+    yield buffer.take()
+
+
+def stream_submissions_zip(submissions, filename):
+    """Stream every submitted file of a StudentAssignment queryset as one zip, with no temp file"""
+    response = StreamingHttpResponse(
+        (data for data in zip_chunks(submission_entries(submissions)) if data), content_type='application/zip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    return response
+
+
+def export_rows(results):
+    """Yield one list per result, read from a server-side cursor in chunks"""
+    rows = results.order_by('-date_taken', '-id').values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    for (first_name, last_name, admission_number, class_name, subject, exam_type, session, term,
+         score, max_score, date_taken, comment) in rows:
+        yield [
+            f"{first_name} {last_name}".strip(), admission_number, class_name or '', subject, exam_type,
+            session, term or '', score, max_score,
+            round(score * 100 / max_score, 1) if max_score else '', date_taken, comment or '',
+        ]
+
+
+def stream_csv(results, filename):
+    writer = csv.writer(Echo())
+    lines = (writer.writerow(row) for row in _with_header(export_rows(results)))
+    response = StreamingHttpResponse(lines, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def stream_xlsx(results, filename):
+    """
+    openpyxl's write-only workbook streams rows to a temporary file rather than
+    keeping them in memory; the finished file is then sent in chunks.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return HttpResponseBadRequest('Excel export needs openpyxl installed; export as CSV instead')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    for row in _with_header(export_rows(results)):
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_results(results, export_format, filename):
+    """Export a filtered Result queryset as CSV or XLSX"""
+    if export_format == 'xlsx':
+        return stream_xlsx(results, filename)
+    return stream_csv(results, filename)
+
+
+def _with_header(rows):
+    yield HEADER
+    yield from rows
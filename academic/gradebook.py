@@ -0,0 +1,208 @@
+import numpy as np
+
+from .models import Result
+from .stats import PASS_MARK
+
+
+COMPETITION = 'competition'  # 1, 2, 2, 4
+DENSE = 'dense'              # 1, 2, 2, 3
+
+# Default grade bands as (minimum percentage, grade), highest first
+GRADE_BANDS = [(70, 'A'), (60, 'B'), (50, 'C'), (45, 'D'), (0, 'F')]
+
+
+def grade_bands(percentages, bands=GRADE_BANDS):
+    """Grade for each value of a percentage array from (minimum, grade) bands, '' for NaN"""
+    percentages = np.asarray(percentages, dtype=float)
+    bands = sorted(bands)
+    minimums = np.array([minimum for minimum, _ in bands], dtype=float)
+    labels = np.array([''] + [grade for _, grade in bands], dtype=object)
+    index = np.searchsorted(minimums, np.nan_to_num(percentages, nan=-1.0), side='right')
+    index[np.isnan(percentages)] = 0
+    return labels[index]
+
+
+class Gradebook:
+    """
+    The scores of one class (or cohort) in one subject and term as a dense
+    students x assessments matrix.
+
+    scores and max_scores are float arrays with NaN where a student has no
+    result for an assessment; mask is True where a usable score exists. All
+    totals, ranks, percentiles and grades are computed on whole arrays.
+    """
+
+    def __init__(self, student_ids, assessments, scores, max_scores):
+        self.student_ids = list(student_ids)
+        self.assessments = list(assessments)
+        self.scores = scores
+        self.max_scores = max_scores
+        self.mask = ~np.isnan(scores) & (np.nan_to_num(max_scores) > 0)
+
+    @classmethod
+    def from_rows(cls, rows, student_ids=None):
+        """
+        Build a gradebook from (student_id, assessment, score, max_score) rows.
+        student_ids fixes the row order and keeps students with no scores.
+        """
+        student_index = {}
+        for student_id in student_ids or []:
+            student_index.setdefault(student_id, len(student_index))
+        assessment_index = {}
+        cells = []
+        for student_id, assessment, score, max_score in rows:
+            i = student_index.setdefault(student_id, len(student_index))
+            j = assessment_index.setdefault(assessment, len(assessment_index))
+            cells.append((i, j, score, max_score))
+
+        shape = (len(student_index), len(assessment_index))
+        scores = np.full(shape, np.nan)
+        max_scores = np.full(shape, np.nan)
+        if cells:
+            i, j, score, max_score = (np.array(column, dtype=float) for column in zip(*cells))
+            i = i.astype(int)
+            j = j.astype(int)
+            scores[i, j] = score
+            max_scores[i, j] = max_score
+        return cls(student_index, assessment_index, scores, max_scores)
+
+    @classmethod
+    def load_results(cls, results):
+        """Load the CA scores in a Result queryset (one subject) with a single query"""
+        rows = results.exclude(
+            assessment=Result.OVERALL
+        ).values_list('student_id', 'assessment', 'score', 'max_score')
+        return cls.from_rows(rows)
+
+    @classmethod
+    def load(cls, class_level, subject, session, term):
+        """Load the CA scores of a class for one subject and term with a single query"""
+        return cls.load_results(Result.objects.filter(
+            student__class_level=class_level,
+            subject=subject,
+            session=session,
+            term=term,
+        ))
+
+    @classmethod
+    def load_by_subject(cls, results):
+        """Split a Result queryset into {subject_id: Gradebook} with a single query"""
+        grouped = {}
+        rows = results.exclude(assessment=Result.OVERALL).values_list(
+            'subject_id', 'student_id', 'assessment', 'score', 'max_score'
+        )
+        for subject_id, student_id, assessment, score, max_score in rows:
+            grouped.setdefault(subject_id, []).append((student_id, assessment, score, max_score))
+        return {subject_id: cls.from_rows(subject_rows) for subject_id, subject_rows in grouped.items()}
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def percentages(self):
+        """Score as a percentage of its max score, NaN where missing"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.mask, self.scores * 100.0 / self.max_scores, np.nan)
+
+    def totals(self, weights=None, decimals=1):
+        """
+        Weighted average percentage per student over the assessments they
+        have, NaN for a student with none. weights is {assessment: weight};
+        by default every assessment counts equally.
+        """
+        if weights:
+            w = np.array([float(weights.get(name, 0)) for name in self.assessments])
+        else:
+            w = np.ones(len(self.assessments))
+        percentages = np.nan_to_num(self.percentages())
+        weight_sums = (self.mask * w).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            totals = np.where(weight_sums > 0, (percentages * w).sum(axis=1) / weight_sums, np.nan)
+        return np.round(totals, decimals) if decimals is not None else totals
+
+    def ranks(self, totals=None, method=COMPETITION):
+        """Position per student (1 = highest total), 0 for a student without a total"""
+        totals = self.totals() if totals is None else totals
+        valid = ~np.isnan(totals)
+        ranks = np.zeros(len(totals), dtype=int)
+        negated = -totals[valid]
+        if method == COMPETITION:
+            # One more than the number of strictly higher totals
+            ranks[valid] = np.searchsorted(np.sort(negated), negated, side='left') + 1
+        else:
+            ranks[valid] = np.searchsorted(np.unique(negated), negated) + 1
+        return ranks
+
+    def percentile_ranks(self, totals=None):
+        """Percentage of students with a total at or below each student's, NaN without a total"""
+        totals = self.totals() if totals is None else totals
+        valid = ~np.isnan(totals)
+        ordered = np.sort(totals[valid])
+        result = np.full(len(totals), np.nan)
+        if len(ordered):
+            result[valid] = np.searchsorted(ordered, totals[valid], side='right') * 100.0 / len(ordered)
+        return result
+
+    def percentile(self, q, totals=None):
+        totals = self.totals() if totals is None else totals
+        return round(float(np.nanpercentile(totals, q)), 1) if (~np.isnan(totals)).any() else None
+
+    def grades(self, totals=None, bands=GRADE_BANDS):
+        """Grade per student from (minimum, grade) bands, '' for a student without a total"""
+        totals = self.totals() if totals is None else totals
+        return grade_bands(totals, bands)
+
+    def class_average(self, totals=None):
+        totals = self.totals() if totals is None else totals
+        return round(float(np.nanmean(totals)), 1) if (~np.isnan(totals)).any() else None
+
+    def std_dev(self, totals=None):
+        totals = self.totals() if totals is None else totals
+        return round(float(np.nanstd(totals)), 1) if (~np.isnan(totals)).any() else None
+
+    def assessment_averages(self):
+        """{assessment: average percentage} over the students who took it"""
+        percentages = self.percentages()
+        counts = self.mask.sum(axis=0)
+        sums = np.nan_to_num(percentages).sum(axis=0)
+        return {
+            name: round(float(sums[j] / counts[j]), 1)
+            for j, name in enumerate(self.assessments) if counts[j]
+        }
+
+    def total_by_student(self, totals=None):
+        """{student_id: total} for the students who have one"""
+        totals = self.totals() if totals is None else totals
+        return {
+            student_id: float(total)
+            for student_id, total in zip(self.student_ids, totals.tolist()) if total == total
+        }
+
+    def position_by_student(self, method=COMPETITION, totals=None):
+        """{student_id: position} for the students who have a total"""
+        return {
+            student_id: rank
+            for student_id, rank in zip(self.student_ids, self.ranks(totals, method).tolist()) if rank
+        }
+
+    def student_columns(self, totals=None, method=COMPETITION):
+        """Per-student totals, positions and grades as JSON-ready lists in student_ids order"""
+        totals = self.totals() if totals is None else totals
+        return {
+            'totals': [None if total != total else total for total in totals.tolist()],
+            'positions': [rank or None for rank in self.ranks(totals, method).tolist()],
+            'grades': self.grades(totals).tolist(),
+        }
+
+    def summary(self, totals=None):
+        """Class-level figures for one subject"""
+        totals = self.totals() if totals is None else totals
+        return {
+            'students': int((~np.isnan(totals)).sum()),
+            'class_average': self.class_average(totals),
+            'std_dev': self.std_dev(totals),
+            'highest': self.percentile(100, totals),
+            'lowest': self.percentile(0, totals),
+            'median': self.percentile(50, totals),
+            'pass_rate': round(float((totals[~np.isnan(totals)] >= PASS_MARK).mean() * 100), 1)
+            if (~np.isnan(totals)).any() else None,
+        }
@@ -0,0 +1,140 @@
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, Value, When
+
+from .gradebook import Gradebook, grade_bands
+from .models import ClassLevel, GradingScheme, Result
+
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def scheme_for_school(school_id):
+    """The school's GradingScheme, or an unsaved default (WAEC, equal weights) if it has none"""
+    scheme = GradingScheme.objects.filter(school_id=school_id).first()
+    return scheme or GradingScheme(school_id=school_id, version=0)
+
+
+def scheme_for_class(class_level):
+    """scheme_for_school() for a ClassLevel or its id"""
+    school_id = getattr(class_level, 'school_id', None)
+    if school_id is None:
+        school_id = ClassLevel.objects.filter(pk=getattr(class_level, 'pk', class_level)).values_list(
+            'school_id', flat=True
+        ).first()
+    return scheme_for_school(school_id)
+
+
+def apply_scheme(scheme, gradebook):
+    """
+    Weighted totals, grades, remarks and positions for every student in a
+    gradebook, computed in one vectorised pass. Returns
+    {student_id: {'total', 'grade', 'remark', 'position'}}.
+    """
+    totals = gradebook.totals(weights=scheme.weights or None)
+    grades = gradebook.grades(totals, scheme.bands)
+    positions = gradebook.ranks(totals)
+    remarks = scheme.remarks
+    return {
+        student_id: {
+            'total': total,
+            'grade': grade,
+            'remark': remarks.get(grade, ''),
+            'position': int(position),
+        }
+        for student_id, total, grade, position in zip(
+            gradebook.student_ids, totals.tolist(), grades.tolist(), positions.tolist()
+        )
+        if total == total
+    }
+
+
+def weight_expression(weights):
+    """Per-row assessment weight for a Result query, the SQL version of Gradebook.totals(weights)"""
+    if not weights:
+        return Value(1.0)
+    return Case(
+        *[When(assessment=name, then=Value(float(weight))) for name, weight in weights.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def results_version(class_level_id):
+    return ClassLevel.objects.filter(pk=class_level_id).values_list('results_version', flat=True).first() or 0
+
+
+def bump_results_version(class_level_id):
+    """
+    Called whenever a class's results change. The version lives on the
+    ClassLevel row, not in the cache, so every worker and management command
+    stops serving the old grades at once.
+    """
+    ClassLevel.objects.filter(pk=class_level_id).update(results_version=F('results_version') + 1)
+
+
+def class_grades(class_level, subject, session, term, scheme=None, version=None, gradebook=None):
+    """
+    apply_scheme() for one class, subject and term. Cached by the scheme's
+    version and the class's results_version, both stored in the database, so
+    a result edit or a scheme change never serves stale grades.
+
+    Callers grading several subjects can pass the class's results_version
+    they read once, and a gradebook they already loaded to use on a miss.
+    """
+    class_level_id = getattr(class_level, 'pk', class_level)
+    subject_id = getattr(subject, 'pk', subject)
+    scheme = scheme or scheme_for_class(class_level)
+
+    if version is None:
+        version = results_version(class_level_id)
+    key = f"grades:{scheme.school_id}:{scheme.version}:{class_level_id}:{version}:{subject_id}:{session}:{term}"
+    grades = cache.get(key)
+    if grades is None:
+        if gradebook is None:
+            gradebook = Gradebook.load(class_level_id, subject_id, session, term)
+        grades = apply_scheme(scheme, gradebook)
+        cache.set(key, grades, CACHE_TIMEOUT)
+    return grades
+
+
+def cohort_grades(school, level, subject, session, term, scheme=None):
+    """apply_scheme() over a whole year group (every class at a ClassLevel.level) in one query"""
+    gradebook = Gradebook.load_results(Result.objects.filter(
+        student__school=school,
+        student__class_level__level=level,
+        subject=subject,
+        session=session,
+        term=term,
+    ))
+    return apply_scheme(scheme or scheme_for_school(school.pk), gradebook)
+
+
+def attach_grades(results, scheme, class_level=None):
+    """
+    Set .percentage and .grade on a list of Result rows in one vectorised
+    pass. With class_level, the "overall" rows take their grade from
+    class_grades(), the same weighted grade the report card shows.
+    """
+    if not results:
+        return results
+    scores = np.array([result.score for result in results], dtype=float)
+    max_scores = np.array([result.max_score for result in results], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentages = np.where(max_scores > 0, np.round(scores * 100.0 / max_scores), np.nan)
+    for result, percentage, grade in zip(results, percentages.tolist(), grade_bands(percentages, scheme.bands).tolist()):
+        result.percentage = None if percentage != percentage else int(percentage)
+        result.grade = grade
+
+    overall = [result for result in results if result.assessment == Result.OVERALL and result.session and result.term]
+    if class_level is not None and overall:
+        version = results_version(getattr(class_level, 'pk', class_level))
+        graded = {}
+        for result in overall:
+            key = (result.subject_id, result.session, result.term)
+            if key not in graded:
+                graded[key] = class_grades(class_level, *key, scheme=scheme, version=version)
+            row = graded[key].get(result.student_id)
+            if row:
+                result.grade = row['grade']
+    return results
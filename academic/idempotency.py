@@ -0,0 +1,63 @@
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+KEEP_DAYS = 7
+
+
+def _replay(stored):
+    response = JsonResponse(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a JSON view safe to retry. A request carrying an Idempotency-Key
+    header runs once per user and key: its writes and the stored response
+    commit together, and a replay gets the stored response without touching
+    the database again. Server errors are not stored, so they can be retried.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER, '')[:64]
+        if not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if stored:
+            return _replay(stored)
+
+        try:
+            with transaction.atomic():
+                response = view(request, *args, **kwargs)
+                if response.status_code < 500 and response.get('Content-Type') == 'application/json':
+                    IdempotencyKey.objects.create(
+                        user=request.user,
+                        key=key,
+                        path=request.path[:200],
+                        status_code=response.status_code,
+                        response=json.loads(response.content),
+                    )
+        except IntegrityError:
+            # The same batch was committed by a concurrent retry
+            stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if stored is None:
+                raise
+            return _replay(stored)
+        return response
+    return wrapper
+
+
+def purge_idempotency_keys(days=KEEP_DAYS):
+    """Delete keys older than `days`. Returns the number deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
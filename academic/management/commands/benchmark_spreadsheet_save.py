@@ -0,0 +1,122 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from academic.models import ClassLevel, Result, Subject
+from academic.spreadsheet import ca_exam_type, overall_exam_type, save_spreadsheet_rows
+from schools.models import School
+from users.models import Student, Teacher, User
+
+
+CA_CATEGORIES = [
+    {'name': 'Test 1', 'maxScore': 20},
+    {'name': 'Test 2', 'maxScore': 20},
+    {'name': 'Assignment', 'maxScore': 10},
+    {'name': 'Project', 'maxScore': 10},
+    {'name': 'Exam', 'maxScore': 40},
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and wall time of the per-cell and bulk spreadsheet save paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[40, 200, 1000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'students':>8} {'path':>8} {'queries':>8} {'seconds':>8}")
+        for size in options['sizes']:
+            for name, save in [('per-cell', self.legacy_save), ('bulk', self.bulk_save)]:
+                # Each run works on fresh fixture data that is rolled back afterwards
+                try:
+                    with transaction.atomic():
+                        teacher, subject, class_level, rows = self.create_fixtures(size)
+                        # Save twice so both the insert and the update paths are measured
+                        save(teacher, subject, class_level, rows)
+                        queries = []
+                        with connection.execute_wrapper(self.count_queries(queries)):
+                            started = time.perf_counter()
+                            save(teacher, subject, class_level, rows)
+                            elapsed = time.perf_counter() - started
+                        raise Rollback
+                except Rollback:
+                    pass
+                self.stdout.write(f"{size:>8} {name:>8} {len(queries):>8} {elapsed:>8.3f}")
+
+    def count_queries(self, queries):
+        def wrapper(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        return wrapper
+
+    def create_fixtures(self, size):
+        school = School.objects.create(
+            name='Benchmark School', school_type='secondary', subscription_type='basic',
+            phone='0', email='bench@example.com', address='-', city='-', lga='-',
+        )
+        class_level = ClassLevel.objects.create(name='Benchmark Class', level='ss_1', school=school)
+        subject = Subject.objects.create(name='Benchmark Subject', code='BENCHSUBJ')
+        teacher_user = User.objects.create(username='bench_teacher', user_type='teacher', school=school)
+        teacher = Teacher.objects.create(user=teacher_user, school=school)
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_student_{i}', user_type='student', school=school, password='!')
+            for i in range(size)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, school=school, class_level=class_level, admission_number=f'BENCH{i:06d}')
+            for i, user in enumerate(users)
+        ])
+
+        rows = []
+        for i, student in enumerate(students):
+            rows.append({
+                'student_id': student.id,
+                'ca_scores': [
+                    {'ca_name': ca['name'], 'score': (i + j) % ca['maxScore'], 'max_score': ca['maxScore']}
+                    for j, ca in enumerate(CA_CATEGORIES)
+                ],
+                'comment': '',
+                'total_score': 50,
+                'position': i + 1,
+            })
+        return teacher, subject, class_level, rows
+
+    def bulk_save(self, teacher, subject, class_level, rows):
+        save_spreadsheet_rows(teacher, subject, class_level, 1, '2025', rows)
+
+    def legacy_save(self, teacher, subject, class_level, rows):
+        """The original one-query-per-cell loop, kept here as the baseline"""
+        for row in rows:
+            student = Student.objects.get(id=row['student_id'], class_level=class_level)
+            for ca_score in row['ca_scores']:
+                Result.objects.update_or_create(
+                    student=student,
+                    subject=subject,
+                    exam_type=ca_exam_type(1, ca_score['ca_name']),
+                    recorded_by=teacher,
+                    defaults={
+                        'score': ca_score['score'],
+                        'max_score': ca_score['max_score'],
+                        'comment': row['comment'],
+                        'date_taken': timezone.now().date(),
+                    }
+                )
+            Result.objects.update_or_create(
+                student=student,
+                subject=subject,
+                exam_type=overall_exam_type(1),
+                recorded_by=teacher,
+                defaults={
+                    'score': row['total_score'],
+                    'max_score': 100,
+                    'comment': f"Position: {row['position']}. {row['comment']}",
+                    'date_taken': timezone.now().date(),
+                }
+            )
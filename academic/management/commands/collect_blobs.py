@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from academic.storage import GC_GRACE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Recount blob storage references and delete blobs no assignment or submission uses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=GC_GRACE.total_seconds() / 3600,
+                            help='Keep unreferenced blobs uploaded within this many hours (default: 1)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        deleted, freed = collect_garbage(timedelta(hours=options['grace_hours']), options['dry_run'])
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully {verb} {deleted} unused blobs ({freed / 1024 / 1024:.1f} MB)!')
+        )
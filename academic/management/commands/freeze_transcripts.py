@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from academic.models import StudentTermSummary
+from academic.transcripts import current_session, freeze_session
+
+
+class Command(BaseCommand):
+    help = 'Freeze finished sessions into transcript snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', help='Session start year to freeze (default: every finished session)')
+        parser.add_argument('--refreeze', action='store_true', help='Rebuild snapshots that already exist')
+
+    def handle(self, *args, **options):
+        if options['session']:
+            sessions = [options['session']]
+        else:
+            sessions = StudentTermSummary.objects.exclude(session='').filter(
+                session__lt=current_session()
+            ).values_list('session', flat=True).distinct().order_by('session')
+
+        for session in sessions:
+            try:
+                count = freeze_session(session, refreeze=options['refreeze'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully froze {count} transcripts for the {session} session!')
+            )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from academic.models import ClassLevel, ReportCardJob, session_for_date, term_for_date
+from academic.report_cards import run_job
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Generate report cards for a class or a whole school into a single zip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='School id (every class in the school)')
+        parser.add_argument('--class', dest='class_level', type=int, help='ClassLevel id')
+        parser.add_argument('--session', help='Session start year, e.g. 2025 for 2025/2026 (default: current)')
+        parser.add_argument('--term', type=int, choices=[1, 2, 3], help='Term (default: current)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--resume', type=int, help='Id of an unfinished job to continue')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ReportCardJob.objects.get(id=options['resume'])
+            except ReportCardJob.DoesNotExist:
+                raise CommandError(f"Report card job {options['resume']} does not exist")
+        else:
+            today = timezone.now().date()
+            if options['class_level']:
+                class_level = ClassLevel.objects.select_related('school').filter(id=options['class_level']).first()
+                if class_level is None:
+                    raise CommandError(f"Class {options['class_level']} does not exist")
+                school = class_level.school
+            elif options['school']:
+                class_level = None
+                school = School.objects.filter(id=options['school']).first()
+                if school is None:
+                    raise CommandError(f"School {options['school']} does not exist")
+            else:
+                raise CommandError('Pass --school, --class or --resume')
+
+            job = ReportCardJob.objects.create(
+                school=school,
+                class_level=class_level,
+                session=options['session'] or session_for_date(today),
+                term=options['term'] or term_for_date(today),
+            )
+
+        self.stdout.write(f"Job {job.id}: {job}")
+        run_job(job, workers=options['workers'], progress=self.report_progress)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully generated {job.completed} report cards: {job.output.path}')
+        )
+
+    def report_progress(self, completed, total):
+        self.stdout.write(f"  {completed}/{total} report cards")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from academic.idempotency import KEEP_DAYS, purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete stored idempotency keys older than a number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=KEEP_DAYS, help=f'Keep keys newer than this (default: {KEEP_DAYS})')
+
+    def handle(self, *args, **options):
+        count = purge_idempotency_keys(options['days'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully deleted {count} idempotency keys!')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from academic.summaries import rebuild_term_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-student term summary table from all results'
+
+    def handle(self, *args, **options):
+        count = rebuild_term_summaries()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {count} student term summaries!')
+        )
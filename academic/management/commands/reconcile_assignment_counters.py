@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from academic.assignments import reconcile_counters
+from academic.models import Assignment
+
+
+class Command(BaseCommand):
+    help = 'Recompute the assigned/submitted/graded counters on assignments and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only assignments of teachers in this school')
+
+    def handle(self, *args, **options):
+        assignments = Assignment.objects.all()
+        if options['school']:
+            assignments = assignments.filter(teacher__school_id=options['school'])
+        count = reconcile_counters(assignments)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully repaired counters on {count} assignments!')
+        )
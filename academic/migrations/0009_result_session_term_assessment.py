@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+def split_exam_types(apps, schema_editor):
+    """Fill term/assessment from "term1_test_1" style exam types and session from date_taken"""
+    Result = apps.get_model('academic', 'Result')
+    batch = []
+    for result in Result.objects.only('id', 'exam_type', 'date_taken').iterator(chunk_size=2000):
+        prefix, _, assessment = result.exam_type.partition('_')
+        if assessment and prefix.startswith('term') and prefix[4:].isdigit():
+            result.term, result.assessment = int(prefix[4:]), assessment
+        else:
+            result.term, result.assessment = None, result.exam_type
+        date = result.date_taken
+        result.session = str(date.year if date.month >= 9 else date.year - 1)
+        batch.append(result)
+        if len(batch) >= 2000:
+            Result.objects.bulk_update(batch, ['term', 'assessment', 'session'])
+            batch = []
+    if batch:
+        Result.objects.bulk_update(batch, ['term', 'assessment', 'session'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0008_assignment_submission_date'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='result',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='assessment',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='session',
+            field=models.CharField(blank=True, default='', max_length=9),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='term',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'First Term'), (2, 'Second Term'), (3, 'Third Term')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='exam_type',
+            field=models.CharField(choices=[('test', 'Test'), ('assignment', 'Assignment'), ('exam', 'Exam')], max_length=50),
+        ),
+        migrations.RunPython(split_exam_types, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='result',
+            unique_together={('student', 'subject', 'session', 'exam_type', 'date_taken')},
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['subject', 'session', 'term', 'assessment'], name='result_subject_term_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', 'session', 'term'], name='result_student_term_idx'),
+        ),
+    ]
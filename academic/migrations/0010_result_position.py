@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0009_result_session_term_assessment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    Result = apps.get_model('academic', 'Result')
+    StudentTermSummary = apps.get_model('academic', 'StudentTermSummary')
+    rows = Result.objects.values('student_id', 'session', 'term').annotate(
+        result_count=models.Count('id'),
+        percentage_sum=models.Sum(
+            models.F('score') * 100.0 / models.F('max_score'), filter=models.Q(max_score__gt=0)
+        ),
+        total_score=models.Sum('score'),
+        total_max_score=models.Sum('max_score'),
+        subjects_taken=models.Count('subject', distinct=True),
+    ).order_by()
+    StudentTermSummary.objects.bulk_create([
+        StudentTermSummary(
+            student_id=row['student_id'],
+            session=row['session'],
+            term=row['term'] or 0,
+            result_count=row['result_count'],
+            percentage_sum=row['percentage_sum'] or 0,
+            total_score=row['total_score'] or 0,
+            total_max_score=row['total_max_score'] or 0,
+            subjects_taken=row['subjects_taken'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0010_result_position'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTermSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session', models.CharField(blank=True, default='', max_length=9)),
+                ('term', models.PositiveSmallIntegerField(default=0)),
+                ('result_count', models.PositiveIntegerField(default=0)),
+                ('percentage_sum', models.FloatField(default=0)),
+                ('total_score', models.FloatField(default=0)),
+                ('total_max_score', models.FloatField(default=0)),
+                ('subjects_taken', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_summaries', to='users.student')),
+            ],
+            options={
+                'ordering': ['session', 'term'],
+                'unique_together': {('student', 'session', 'term')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
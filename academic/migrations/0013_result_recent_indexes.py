@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0012_reportcardjob'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['recorded_by', '-date_taken', '-id'], name='result_teacher_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', '-date_taken', '-id'], name='result_student_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+import academic.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0013_result_recent_indexes'),
+        ('schools', '0007_about_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='WAEC', max_length=100)),
+                ('boundaries', models.JSONField(default=academic.models.default_grade_boundaries)),
+                ('weights', models.JSONField(blank=True, default=dict)),
+                ('version', models.PositiveIntegerField(default=1, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grading_scheme', to='schools.school')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0014_gradingscheme'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session', models.CharField(max_length=9)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcript_snapshots', to='users.student')),
+            ],
+            options={
+                'ordering': ['session'],
+                'unique_together': {('student', 'session')},
+            },
+        ),
+    ]
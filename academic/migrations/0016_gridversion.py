@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0015_transcriptsnapshot'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GridVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session', models.CharField(max_length=9)),
+                ('term', models.PositiveSmallIntegerField(choices=[(1, 'First Term'), (2, 'Second Term'), (3, 'Third Term')])),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='academic.classlevel')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='academic.subject')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='users.teacher')),
+            ],
+            options={
+                'unique_together': {('class_level', 'subject', 'session', 'term')},
+            },
+        ),
+    ]
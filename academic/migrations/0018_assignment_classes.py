@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0017_idempotencykey'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='classes',
+            field=models.ManyToManyField(blank=True, related_name='assignments', to='academic.classlevel'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='lazy_submissions',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentassignment',
+            unique_together={('assignment', 'student')},
+        ),
+    ]
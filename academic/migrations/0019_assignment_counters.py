@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0018_assignment_classes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='assigned_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='graded_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='score_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='submitted_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
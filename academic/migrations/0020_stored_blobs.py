@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:27
+
+import academic.storage
+import django.core.validators
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0019_assignment_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('last_uploaded', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='assignment',
+            name='assignment_file',
+            field=models.FileField(blank=True, null=True, storage=academic.storage.ContentAddressedStorage(), upload_to='assignments/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'txt', 'zip'])]),
+        ),
+        migrations.AlterField(
+            model_name='studentassignment',
+            name='submitted_file',
+            field=models.FileField(blank=True, null=True, storage=academic.storage.ContentAddressedStorage(), upload_to='submitted_assignments/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'txt', 'zip', 'jpg', 'png'])]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0020_stored_blobs'),
+        ('users', '0005_admission_number_length'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='result',
+            unique_together={('student', 'subject', 'session', 'exam_type', 'date_taken', 'recorded_by')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0021_result_unique_per_teacher'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classlevel',
+            name='results_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from django.core.validators import FileExtensionValidator
 from django.conf import settings
+from django.utils import timezone
+import datetime
+
+from .storage import blob_storage
 
 
 class Subject(models.Model):
@@ -32,6 +36,8 @@ class ClassLevel(models.Model):
     level = models.CharField(max_length=20, choices=LEVEL_CHOICES)  # Change to CharField
     description = models.TextField(blank=True)
     school = models.ForeignKey('schools.School', on_delete=models.CASCADE, null=True, related_name='academic_classes')
+    # Bumped whenever the class's results, students or subjects change; part of the cache key of its grades and broadsheets
+    results_version = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['level']
@@ -63,16 +69,49 @@ class Assignment(models.Model):
     max_score = models.IntegerField(default=100)
     created_at = models.DateTimeField(auto_now_add=True)
     submission_date = models.DateTimeField(null=True, blank=True)
-    assignment_file = models.FileField(upload_to='assignments/', blank=True, null=True, validators=[FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'txt', 'zip'])])
+    assignment_file = models.FileField(upload_to='assignments/', storage=blob_storage, blank=True, null=True, validators=[FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'txt', 'zip'])])
+    classes = models.ManyToManyField(ClassLevel, blank=True, related_name='assignments')
+    # Create each student's StudentAssignment on first view or submission instead of up front
+    lazy_submissions = models.BooleanField(default=False)
+    # Kept in step by academic.assignments; reconcile_assignment_counters repairs drift
+    assigned_count = models.PositiveIntegerField(default=0)
+    submitted_count = models.PositiveIntegerField(default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
     
     def __str__(self):
         return self.title
 
+    @property
+    def average_score(self):
+        return round(self.score_sum / self.graded_count, 1) if self.graded_count else None
+
+    @property
+    def average_percentage(self):
+        if not self.graded_count or not self.max_score:
+            return None
+        return round(self.score_sum * 100 / (self.graded_count * self.max_score), 1)
+
+    @property
+    def submission_rate(self):
+        return round(self.submitted_count * 100 / self.assigned_count, 1) if self.assigned_count else 0
+
+class StoredBlob(models.Model):
+    """A file in the content-addressed blob storage and how many rows point at it"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refs = models.PositiveIntegerField(default=0)
+    last_uploaded = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
 class StudentAssignment(models.Model):
     assignment = models.ForeignKey('Assignment', on_delete=models.CASCADE)
     student = models.ForeignKey('users.Student', on_delete=models.CASCADE)
     submitted_file = models.FileField(
         upload_to='submitted_assignments/', 
+        storage=blob_storage,
         blank=True, 
         null=True, 
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'txt', 'zip', 'jpg', 'png'])]
@@ -82,6 +121,9 @@ class StudentAssignment(models.Model):
     feedback = models.TextField(blank=True)
     is_submitted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['assignment', 'student']
     
     def __str__(self):
         return f"{self.student} - {self.assignment}"
@@ -93,22 +135,232 @@ class Result(models.Model):
         ('assignment', 'Assignment'),
         ('exam', 'Exam'),
     )
+    TERM_CHOICES = (
+        (1, 'First Term'),
+        (2, 'Second Term'),
+        (3, 'Third Term'),
+    )
+    OVERALL = 'overall'
     
     student = models.ForeignKey('users.Student', on_delete=models.CASCADE)  # String reference
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
-    exam_type = models.CharField(max_length=20, choices=EXAM_TYPES)
+    exam_type = models.CharField(max_length=50, choices=EXAM_TYPES)
     score = models.IntegerField()
     max_score = models.IntegerField(default=100)
     date_taken = models.DateField()
     recorded_by = models.ForeignKey('users.Teacher', on_delete=models.CASCADE)  # String reference
     comment = models.TextField(blank=True, null=True)
+    # Session start year ("2025" for 2025/2026), term and assessment name
+    # (e.g. "test_1", "overall"), split out of exam_type so they can be indexed
+    session = models.CharField(max_length=9, blank=True, default='')
+    term = models.PositiveSmallIntegerField(choices=TERM_CHOICES, null=True, blank=True)
+    assessment = models.CharField(max_length=50, blank=True, default='')
+    # Class position for the term, kept on the "overall" row by academic.ranking
+    position = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
-        unique_together = ['student', 'subject', 'exam_type', 'date_taken']
+        # Each teacher keeps their own row for a cell, as the spreadsheet save matches them
+        unique_together = ['student', 'subject', 'session', 'exam_type', 'date_taken', 'recorded_by']
+        indexes = [
+            models.Index(fields=['subject', 'session', 'term', 'assessment'], name='result_subject_term_idx'),
+            models.Index(fields=['student', 'session', 'term'], name='result_student_term_idx'),
+            # Keyset pagination of result listings, newest first
+            models.Index(fields=['recorded_by', '-date_taken', '-id'], name='result_teacher_recent_idx'),
+            models.Index(fields=['student', '-date_taken', '-id'], name='result_student_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.subject} - {self.get_exam_type_display()}"
     
+    def save(self, *args, **kwargs):
+        self.term, self.assessment = parse_exam_type(self.exam_type)
+        if self.date_taken and (not self.session or self._session_follows_date()):
+            self.session = session_for_date(self.date_taken)
+        super().save(*args, **kwargs)
+
+    def _session_follows_date(self):
+        """
+        True when date_taken moved since the row was loaded and its session was
+        the one derived from the old date, so it should move with it. A session
+        set to anything else (or changed in the same edit) is kept.
+        """
+        loaded = getattr(self, '_loaded_date', None)  # (date_taken, session), set by academic.signals
+        if not loaded or str(loaded[0]) == str(self.date_taken):
+            return False
+        return self.session == loaded[1] == session_for_date(loaded[0])
+
+
+def parse_exam_type(exam_type):
+    """Split a spreadsheet exam_type such as "term1_test_1" into (1, "test_1")"""
+    prefix, _, assessment = exam_type.partition('_')
+    if assessment and prefix.startswith('term') and prefix[4:].isdigit():
+        return int(prefix[4:]), assessment
+    return None, exam_type
+
+
+def session_for_date(date):
+    """Sessions run from September, so March 2026 belongs to the "2025" session"""
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    return str(date.year if date.month >= 9 else date.year - 1)
+
+def term_for_date(date):
+    """First term runs September-December, second January-April, third May-August"""
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    if date.month >= 9:
+        return 1
+    return 2 if date.month <= 4 else 3
+
+class StudentTermSummary(models.Model):
+    """Per student, session and term rollup of Result rows, kept current by academic.summaries"""
+    student = models.ForeignKey('users.Student', on_delete=models.CASCADE, related_name='term_summaries')
+    session = models.CharField(max_length=9, blank=True, default='')
+    term = models.PositiveSmallIntegerField(default=0)  # 0 for results recorded outside a term
+    result_count = models.PositiveIntegerField(default=0)
+    percentage_sum = models.FloatField(default=0)
+    total_score = models.FloatField(default=0)
+    total_max_score = models.FloatField(default=0)
+    subjects_taken = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'session', 'term']
+        ordering = ['session', 'term']
+
+    def __str__(self):
+        return f"{self.student} - {self.session} term {self.term}"
+
+    @property
+    def average_percentage(self):
+        return self.percentage_sum / self.result_count if self.result_count else 0
+
+    @property
+    def weighted_average(self):
+        return self.total_score / self.total_max_score * 100 if self.total_max_score else 0
+
+class GridVersion(models.Model):
+    """Version token of one class/subject/term results spreadsheet, bumped on every save"""
+    class_level = models.ForeignKey(ClassLevel, on_delete=models.CASCADE)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    session = models.CharField(max_length=9)
+    term = models.PositiveSmallIntegerField(choices=Result.TERM_CHOICES)
+    version = models.PositiveIntegerField(default=0)
+    updated_by = models.ForeignKey('users.Teacher', on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['class_level', 'subject', 'session', 'term']
+
+    def __str__(self):
+        return f"{self.class_level} - {self.subject} - {self.session} term {self.term} (v{self.version})"
+
+class IdempotencyKey(models.Model):
+    """The stored response of a request sent with an Idempotency-Key header, replayed on retries"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    path = models.CharField(max_length=200)
+    status_code = models.PositiveSmallIntegerField(default=200)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
+
+class TranscriptSnapshot(models.Model):
+    """A student's results for a finished session, frozen once by academic.transcripts"""
+    student = models.ForeignKey('users.Student', on_delete=models.CASCADE, related_name='transcript_snapshots')
+    session = models.CharField(max_length=9)
+    # {'terms': {term: average}, 'annual_average', 'result_count', 'percentage_sum',
+    #  'subjects': [{'name', 'terms': {term: total}, 'annual'}]}
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['student', 'session']
+        ordering = ['session']
+
+    def __str__(self):
+        return f"{self.student} - {self.session} transcript"
+
+def default_grade_boundaries():
+    """WAEC style grades as [{'min', 'grade', 'remark'}], highest first"""
+    return [
+        {'min': 75, 'grade': 'A1', 'remark': 'Excellent'},
+        {'min': 70, 'grade': 'B2', 'remark': 'Very Good'},
+        {'min': 65, 'grade': 'B3', 'remark': 'Good'},
+        {'min': 60, 'grade': 'C4', 'remark': 'Credit'},
+        {'min': 55, 'grade': 'C5', 'remark': 'Credit'},
+        {'min': 50, 'grade': 'C6', 'remark': 'Credit'},
+        {'min': 45, 'grade': 'D7', 'remark': 'Pass'},
+        {'min': 40, 'grade': 'E8', 'remark': 'Pass'},
+        {'min': 0, 'grade': 'F9', 'remark': 'Fail'},
+    ]
+
+class GradingScheme(models.Model):
+    """A school's grade boundaries and CA/exam weighting, applied in bulk by academic.grading"""
+    school = models.OneToOneField('schools.School', on_delete=models.CASCADE, related_name='grading_scheme')
+    name = models.CharField(max_length=100, default='WAEC')
+    boundaries = models.JSONField(default=default_grade_boundaries)
+    # {assessment: weight}, e.g. {"test_1": 10, "test_2": 10, "assignment": 10, "exam": 70}.
+    # Assessments left out get no weight; leave empty to weight every assessment equally.
+    weights = models.JSONField(default=dict, blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)  # bumped on every change, keys cached grades
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.school.name}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.version += 1
+        super().save(*args, **kwargs)
+
+    @property
+    def bands(self):
+        """Boundaries as (minimum, grade) pairs"""
+        return [(float(boundary['min']), boundary['grade']) for boundary in self.boundaries]
+
+    @property
+    def remarks(self):
+        return {boundary['grade']: boundary.get('remark', '') for boundary in self.boundaries}
+
+class ReportCardJob(models.Model):
+    """A batch of report cards for one class or a whole school, built by academic.report_cards"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    school = models.ForeignKey('schools.School', on_delete=models.CASCADE, related_name='report_card_jobs')
+    class_level = models.ForeignKey(ClassLevel, on_delete=models.CASCADE, null=True, blank=True)  # empty for the whole school
+    session = models.CharField(max_length=9)
+    term = models.PositiveSmallIntegerField(choices=Result.TERM_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    output = models.FileField(upload_to='report_cards/', blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        target = self.class_level.name if self.class_level else self.school.name
+        return f"Report cards: {target} - {self.session} term {self.term}"
+
+    @property
+    def progress(self):
+        return round(self.completed * 100 / self.total) if self.total else 0
+
 class FeeStructure(models.Model):
     class_level = models.ForeignKey('ClassLevel', on_delete=models.CASCADE, related_name='fee_structures')
     academic_year = models.CharField(max_length=20)
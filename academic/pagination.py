@@ -0,0 +1,53 @@
+import base64
+import binascii
+import datetime
+
+from django.db.models import Q
+from django.shortcuts import render
+
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(result):
+    """Opaque token for the position just after a result in (date_taken, id) order"""
+    raw = f"{result.date_taken.isoformat()}_{result.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (date_taken, id) from a cursor token, or None if it is missing or invalid"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        date_taken, result_id = raw.split('_')
+        return datetime.date.fromisoformat(date_taken), int(result_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_page(results, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return (page, next_cursor) for a Result queryset, newest first.
+
+    Seeks past the cursor with a WHERE on (date_taken, id) instead of an
+    OFFSET, so a deep page costs the same as the first one. next_cursor is
+    None on the last page.
+    """
+    results = results.order_by('-date_taken', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        date_taken, result_id = position
+        results = results.filter(Q(date_taken__lt=date_taken) | Q(date_taken=date_taken, id__lt=result_id))
+
+    page = list(results[:page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
+def render_rows(request, template, context, next_cursor):
+    """Render just the table rows of a page for "load more", with the next cursor in a header"""
+    response = render(request, template, context)
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
@@ -0,0 +1,91 @@
+from django.db import transaction
+
+from .gradebook import COMPETITION, DENSE, Gradebook
+from .grading import bump_results_version, scheme_for_class
+from .models import Result
+from .summaries import refresh_term_summaries
+
+
+def class_totals(class_level, subject, session, term, scheme=None):
+    """
+    Term totals for every student in a class as {student_id: total}.
+
+    A total is the student's percentage over their CA results, weighted by
+    the school's grading scheme as on the report card and broadsheet, and
+    rounded to one decimal place. Read from the class Gradebook, loaded with
+    a single query.
+    """
+    scheme = scheme or scheme_for_class(class_level)
+    gradebook = Gradebook.load(class_level, subject, session, term)
+    return gradebook.total_by_student(gradebook.totals(scheme.weights or None))
+
+
+def rank(totals, method=COMPETITION):
+    """
+    Rank {key: total} from highest to lowest and return {key: position}.
+
+    Equal totals share a position. With competition ranking the next position
+    skips the tied places (1, 2, 2, 4); dense ranking does not (1, 2, 2, 3).
+    """
+    positions = {}
+    previous = None
+    position = 0
+    ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    for index, (key, total) in enumerate(ordered, start=1):
+        if total != previous:
+            position = index if method == COMPETITION else position + 1
+            previous = total
+        positions[key] = position
+    return positions
+
+
+def rank_class(class_level, subject, session, term, method=COMPETITION):
+    """Return [{'student_id', 'total', 'position'}] ordered by position"""
+    totals = class_totals(class_level, subject, session, term)
+    positions = rank(totals, method)
+    return sorted(
+        (
+            {'student_id': student_id, 'total': total, 'position': positions[student_id]}
+            for student_id, total in totals.items()
+        ),
+        key=lambda row: (row['position'], row['student_id'])
+    )
+
+
+def recompute_positions(class_level, subject, session, term, method=COMPETITION, scheme=None):
+    """
+    Recompute totals and positions for one class, subject and term and store
+    them on the students' "overall" results. Totals are weighted by the
+    school's grading scheme, as apply_scheme() does for report cards, so the
+    stored figures match them. Returns {student_id: position}.
+    """
+    scheme = scheme or scheme_for_class(class_level)
+    gradebook = Gradebook.load(class_level, subject, session, term)
+    weighted = gradebook.totals(scheme.weights or None)
+    totals = gradebook.total_by_student(weighted)
+    positions = gradebook.position_by_student(method, weighted)
+
+    with transaction.atomic():
+        overall_results = list(Result.objects.filter(
+            student__class_level=class_level,
+            subject=subject,
+            session=session,
+            term=term,
+            assessment=Result.OVERALL,
+        ).only('id', 'student_id', 'score', 'position'))
+
+        changed = []
+        for result in overall_results:
+            position = positions.get(result.student_id)
+            score = round(totals[result.student_id]) if result.student_id in totals else result.score
+            if result.position != position or result.score != score:
+                result.position = position
+                result.score = score
+                changed.append(result)
+        if changed:
+            Result.objects.bulk_update(changed, ['position', 'score'], batch_size=500)
+            refresh_term_summaries((result.student_id, session, term) for result in changed)
+
+    class_level_id = getattr(class_level, 'pk', class_level)
+    bump_results_version(class_level_id)
+    return positions
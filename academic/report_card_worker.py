@@ -0,0 +1,26 @@
+"""
+Functions run inside the report card process pool.
+
+Kept apart from academic.report_cards so that unpickling them in a freshly
+spawned worker does not import any models before Django is set up.
+"""
+import os
+
+from django.template.loader import render_to_string
+
+
+TEMPLATE = 'academic/report_card.html'
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def write_card(path, card):
+    """Render one card. Written via a temp file so a resumed job never sees half a card."""
+    html = render_to_string(TEMPLATE, card)
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(path + '.part', path)
+    return path
@@ -0,0 +1,215 @@
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from users.models import Student
+from .gradebook import Gradebook
+from .grading import class_grades, results_version, scheme_for_school
+from .models import ReportCardJob, Result, StudentTermSummary
+from .ranking import rank
+from .report_card_worker import init_worker, write_card
+
+
+PROGRESS_EVERY = 25  # cards between progress updates
+
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or 'unnamed'
+
+
+def session_label(session):
+    """"2025" -> "2025/2026" """
+    return f"{session}/{int(session) + 1}" if str(session).isdigit() else session
+
+
+def class_report_cards(school, class_level, session, term):
+    """
+    Build the report card data for every student in a class as plain dicts
+    that can be sent to worker processes. Uses five queries: students,
+    results, term summaries, the grading scheme and the class's
+    results_version. Grades come from class_grades(), so a job run again
+    for an unchanged class reuses the cached grades.
+    """
+    students = list(
+        Student.objects.filter(class_level=class_level).select_related('user').order_by('admission_number')
+    )
+
+    results = Result.objects.filter(
+        student__class_level=class_level, session=session, term=term
+    ).order_by('subject__name', 'id').values_list(
+        'student_id', 'subject_id', 'subject__name', 'assessment', 'score', 'max_score', 'position'
+    )
+
+    # {student_id: {subject: {'assessments': [...], 'total': ..., 'position': ...}}}
+    subjects = {}
+    gradebook_rows = {}
+    subject_ids = {}
+    for student_id, subject_id, subject_name, assessment, score, max_score, position in results:
+        subject_ids[subject_name] = subject_id
+        subject = subjects.setdefault(student_id, {}).setdefault(
+            subject_name, {'name': subject_name, 'assessments': [], 'total': None, 'position': None, 'grade': '', 'remark': ''}
+        )
+        if assessment == Result.OVERALL:
+            subject['total'] = score
+            subject['position'] = position
+        else:
+            subject['assessments'].append({
+                'name': assessment.replace('_', ' ').title(),
+                'score': score,
+                'max_score': max_score,
+            })
+            gradebook_rows.setdefault(subject_name, []).append((student_id, assessment, score, max_score))
+
+    # Totals, positions and grades per subject come from each subject's
+    # gradebook, weighted and graded with the school's grading scheme
+    scheme = scheme_for_school(school.id)
+    version = results_version(class_level.id)
+    class_averages = {}
+    for subject_name, rows in gradebook_rows.items():
+        gradebook = Gradebook.from_rows(rows)
+        graded = class_grades(
+            class_level, subject_ids[subject_name], session, term, scheme=scheme, version=version, gradebook=gradebook
+        )
+        class_averages[subject_name] = gradebook.class_average(gradebook.totals(scheme.weights or None))
+        for student_id, row in graded.items():
+            subjects[student_id][subject_name].update(row)
+    for student_subjects in subjects.values():
+        for subject in student_subjects.values():
+            subject['class_average'] = class_averages.get(subject['name'])
+
+    averages = {
+        student_id: round(percentage_sum / result_count, 1)
+        for student_id, result_count, percentage_sum in StudentTermSummary.objects.filter(
+            student__class_level=class_level, session=session, term=term
+        ).values_list('student_id', 'result_count', 'percentage_sum')
+        if result_count
+    }
+    positions = rank(averages)
+
+    school_data = {
+        'name': school.name,
+        'motto': school.motto,
+        'address': school.address,
+        'phone': school.phone,
+        'email': school.email,
+        'primary_color': school.primary_color,
+    }
+
+    cards = []
+    for student in students:
+        cards.append({
+            'filename': f"{_safe_name(student.admission_number)}.html",
+            'school': school_data,
+            'student': {
+                'name': student.user.get_full_name() or student.user.username,
+                'admission_number': student.admission_number,
+                'class_name': class_level.name,
+            },
+            'session': session_label(session),
+            'term': term,
+            'subjects': sorted(subjects.get(student.id, {}).values(), key=lambda s: s['name']),
+            'average': averages.get(student.id),
+            'position': positions.get(student.id),
+            'class_size': len(students),
+            'generated_at': timezone.now().strftime('%d %b %Y'),
+        })
+    return cards
+
+
+def job_dir(job):
+    return os.path.join(settings.MEDIA_ROOT, 'report_cards', f'job_{job.id}')
+
+
+def _zip_cards(work_dir, paths, zip_path):
+    with zipfile.ZipFile(zip_path + '.part', 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path in paths:
+            archive.write(path, os.path.relpath(path, work_dir))
+    os.replace(zip_path + '.part', zip_path)
+
+
+def run_job(job, workers=None, progress=None):
+    """
+    Render every card for a job across a process pool and zip them.
+
+    Cards are written to a per-job folder under MEDIA_ROOT, one file per
+    student, and cards already on disk are skipped, so running a failed or
+    interrupted job again picks up where it stopped. progress, if given, is
+    called with (completed, total) as cards finish.
+    """
+    job.status = 'running'
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+
+    try:
+        school = job.school
+        classes = [job.class_level] if job.class_level_id else list(school.academic_classes.all())
+        work_dir = job_dir(job)
+
+        paths = []
+        pending = []
+        completed = 0
+        total = 0
+        for class_level in classes:
+            class_dir = os.path.join(work_dir, _safe_name(class_level.name))
+            os.makedirs(class_dir, exist_ok=True)
+            for card in class_report_cards(school, class_level, job.session, job.term):
+                total += 1
+                path = os.path.join(class_dir, card['filename'])
+                paths.append(path)
+                if os.path.exists(path):
+                    completed += 1
+                else:
+                    pending.append((path, card))
+
+        job.total = total
+        job.completed = completed
+        job.save(update_fields=['total', 'completed', 'updated_at'])
+        if progress:
+            progress(completed, total)
+
+        if pending:
+            # spawn rather than fork: jobs may be started from a thread in the web server
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=init_worker) as pool:
+                futures = [pool.submit(write_card, path, card) for path, card in pending]
+                for future in as_completed(futures):
+                    future.result()
+                    completed += 1
+                    if completed % PROGRESS_EVERY == 0 or completed == total:
+                        ReportCardJob.objects.filter(id=job.id).update(completed=completed, updated_at=timezone.now())
+                        if progress:
+                            progress(completed, total)
+
+        zip_name = f'report_cards/job_{job.id}.zip'
+        _zip_cards(work_dir, paths, os.path.join(settings.MEDIA_ROOT, zip_name))
+        job.output.name = zip_name
+        job.completed = completed
+        job.status = 'done'
+        job.save(update_fields=['output', 'completed', 'status', 'updated_at'])
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+    return job
+
+
+def start_job(job, workers=None):
+    """Run a job in a background thread so an admin request can return straight away"""
+    def target():
+        try:
+            run_job(ReportCardJob.objects.get(id=job.id), workers=workers)
+        except Exception as e:
+            print(f"Report card job {job.id} failed: {e}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,204 @@
+import csv
+import io
+import math
+import os
+
+from django.db import transaction
+
+from users.models import Student
+from .models import Result, parse_exam_type, session_for_date
+from .ranking import recompute_positions
+from .summaries import refresh_term_summaries
+
+
+CHUNK_SIZE = 1000
+
+# Accepted spellings of each column header, compared lower-cased with spaces as underscores
+COLUMNS = {
+    'admission_number': ['admission_number', 'admission_no', 'admission', 'adm_no'],
+    'score': ['score', 'mark', 'marks'],
+    'max_score': ['max_score', 'max', 'out_of'],
+    'comment': ['comment', 'comments', 'remark', 'remarks'],
+}
+
+ERROR_REPORT_FIELDS = ['row', 'admission_number', 'score', 'error']
+
+
+class ScoreImportError(Exception):
+    """The uploaded file cannot be read at all (as opposed to a bad row)"""
+
+
+def _column_map(header):
+    """Map our column names to their index in the file's header row"""
+    normalised = [str(name or '').strip().lower().replace(' ', '_') for name in header]
+    columns = {}
+    for column, aliases in COLUMNS.items():
+        for index, name in enumerate(normalised):
+            if name in aliases:
+                columns[column] = index
+                break
+    missing = [column for column in ('admission_number', 'score') if column not in columns]
+    if missing:
+        raise ScoreImportError(f"Missing column(s): {', '.join(missing)}")
+    return columns
+
+
+def _rows(records):
+    """Turn an iterator of raw records (header first) into (row_number, dict) pairs"""
+    records = iter(records)
+    try:
+        header = next(records)
+    except StopIteration:
+        raise ScoreImportError('The file is empty')
+    columns = _column_map(header)
+
+    for row_number, record in enumerate(records, start=2):
+        if not any(value not in (None, '') for value in record):
+            continue
+        yield row_number, {
+            column: record[index] if index < len(record) else None
+            for column, index in columns.items()
+        }
+
+
+def iter_csv_rows(uploaded_file):
+    uploaded_file.seek(0)
+    text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    try:
+        yield from _rows(csv.reader(text))
+    finally:
+        text.detach()
+
+
+def iter_xlsx_rows(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ScoreImportError('Excel import needs openpyxl installed; upload a CSV file instead')
+    # read_only mode streams rows from the sheet instead of loading it all
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        yield from _rows(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_upload_rows(uploaded_file):
+    """Yield (row_number, row) from an uploaded CSV or XLSX file one row at a time"""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(uploaded_file)
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(uploaded_file)
+    raise ScoreImportError('Upload a .csv or .xlsx file')
+
+
+def _number(value):
+    number = value if isinstance(value, (int, float)) else float(str(value).strip())
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+def import_scores(teacher, class_level, subject, exam_type, max_score, date_taken, rows, chunk_size=CHUNK_SIZE):
+    """
+    Write scores for one class, subject and exam from an iterator of
+    (row_number, row) pairs.
+
+    Admission numbers are resolved with one query for the whole class. Rows
+    are validated (known student, whole-number score from 0 to max_score) and
+    written in chunks with an upsert on the result's unique key, all inside a
+    single transaction. Returns (saved_count, errors) where errors is a list
+    of {'row', 'admission_number', 'score', 'error'} dicts.
+    """
+    students = dict(
+        Student.objects.filter(class_level=class_level).values_list('admission_number', 'id')
+    )
+    term, assessment = parse_exam_type(exam_type)
+    session = session_for_date(date_taken)
+    saved_count = 0
+    errors = []
+    student_ids = set()
+
+    def error(row_number, row, message):
+        errors.append({
+            'row': row_number,
+            'admission_number': row.get('admission_number'),
+            'score': row.get('score'),
+            'error': message,
+        })
+
+    def write(chunk):
+        Result.objects.bulk_create(
+            chunk.values(),
+            update_conflicts=True,
+            unique_fields=['student', 'subject', 'session', 'exam_type', 'date_taken', 'recorded_by'],
+            update_fields=['score', 'max_score', 'comment'],
+        )
+
+    with transaction.atomic():
+        chunk = {}
+        for row_number, row in rows:
+            admission_number = str(row.get('admission_number') or '').strip()
+            student_id = students.get(admission_number)
+            if student_id is None:
+                error(row_number, row, f"No student with admission number '{admission_number}' in {class_level.name}")
+                continue
+
+            try:
+                score = _number(row.get('score'))
+                row_max_score = _number(row['max_score']) if row.get('max_score') not in (None, '') else max_score
+            except (TypeError, ValueError):
+                error(row_number, row, 'Score must be a number')
+                continue
+            if row_max_score <= 0:
+                error(row_number, row, 'Max score must be greater than 0')
+                continue
+            if score < 0 or score > row_max_score:
+                error(row_number, row, f"Score must be between 0 and {row_max_score:g}")
+                continue
+            # Results hold whole marks; a fraction is rejected rather than rounded
+            if score != int(score) or row_max_score != int(row_max_score):
+                error(row_number, row, 'Scores must be whole numbers')
+                continue
+
+            # A later row for the same student replaces an earlier one
+            chunk[student_id] = Result(
+                student_id=student_id,
+                subject=subject,
+                exam_type=exam_type,
+                score=int(score),
+                max_score=int(row_max_score),
+                comment=str(row.get('comment') or '').strip(),
+                date_taken=date_taken,
+                recorded_by=teacher,
+                session=session,
+                term=term,
+                assessment=assessment,
+            )
+            if len(chunk) >= chunk_size:
+                write(chunk)
+                saved_count += len(chunk)
+                student_ids.update(chunk)
+                chunk = {}
+
+        if chunk:
+            write(chunk)
+            saved_count += len(chunk)
+            student_ids.update(chunk)
+
+        # bulk_create skips the Result signals, so refresh the rollups once here
+        refresh_term_summaries((student_id, session, term) for student_id in student_ids)
+        if student_ids and term is not None:
+            recompute_positions(class_level, subject, session, term)
+
+    return saved_count, errors
+
+
+def error_report_csv(errors):
+    """CSV text listing every rejected row, for the teacher to fix and re-upload"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=ERROR_REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(errors)
+    return output.getvalue()
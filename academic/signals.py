@@ -0,0 +1,179 @@
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Student
+from .grading import bump_results_version
+from .models import Assignment, ClassSubject, Result, StudentAssignment
+from .ranking import recompute_positions
+from .storage import add_reference, drop_reference
+from .summaries import refresh_term_summaries
+
+
+_pending = threading.local()
+
+
+def _term_key(result):
+    return (result.student_id, result.session, result.term)
+
+
+def _batch():
+    """
+    The rollup work queued by this thread's Result signals. It is done once,
+    by flush_result_rollups, when the transaction commits (straight away in
+    autocommit), so a cascade or a loop of ORM writes inside one transaction
+    refreshes each summary and re-ranks each class only once.
+
+    A batch whose flush is no longer registered with the connection belongs
+    to a transaction (or savepoint) that rolled back, so it is dropped
+    rather than carried into the next commit.
+    """
+    batch = getattr(_pending, 'batch', None)
+    if batch is None or not _scheduled(batch):
+        batch = _pending.batch = {'terms': set(), 'grids': set(), 'classes': {}, 'flush': None}
+    return batch
+
+
+def _scheduled(batch):
+    connection = transaction.get_connection()
+    return connection.in_atomic_block and any(func is batch['flush'] for _, func, _ in connection.run_on_commit)
+
+
+def _schedule(batch):
+    """Register a batch's flush once, after its first keys are in; in autocommit it runs straight away"""
+    if batch['flush'] is None:
+        batch['flush'] = partial(flush_result_rollups, batch)
+        transaction.on_commit(batch['flush'])
+
+
+def flush_result_rollups(batch):
+    """Refresh the queued term summaries and re-rank each queued (class, subject, session, term) once"""
+    if getattr(_pending, 'batch', None) is batch:
+        _pending.batch = None
+
+    classes = batch['classes']
+    missing = {student_id for student_id, _, _, _ in batch['grids']} - set(classes)
+    if missing:
+        classes.update(Student.objects.filter(id__in=missing).values_list('id', 'class_level_id'))
+    grids = {
+        (classes[student_id], subject_id, session, term)
+        for student_id, subject_id, session, term in batch['grids']
+        if classes.get(student_id)
+    }
+
+    with transaction.atomic():
+        refresh_term_summaries(batch['terms'])
+        for class_level_id, subject_id, session, term in grids:
+            recompute_positions(class_level_id, subject_id, session, term)
+
+
+@receiver(post_init, sender=Result)
+def remember_previous_term(sender, instance, **kwargs):
+    """Keep the (student, session, term) a loaded result is filed under, and its date, to see if an edit moves it"""
+    fields = instance.__dict__
+    instance._previous_term_key = None
+    if instance.pk and all(field in fields for field in ('student_id', 'session', 'term')):
+        instance._previous_term_key = _term_key(instance)
+    # Result.save moves a derived session along when date_taken changes
+    instance._loaded_date = None
+    if instance.pk and 'date_taken' in fields and 'session' in fields:
+        instance._loaded_date = (instance.date_taken, instance.session)
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def refresh_result_rollups(sender, instance, **kwargs):
+    """Queue the term summaries and class positions a changed result feeds into"""
+    keys = {_term_key(instance)}
+    previous = getattr(instance, '_previous_term_key', None)
+    if previous:
+        keys.add(previous)
+    instance._previous_term_key = _term_key(instance)
+    instance._loaded_date = (instance.date_taken, instance.session)
+
+    batch = _batch()
+    batch['terms'].update(keys)
+    if instance.assessment != Result.OVERALL:
+        batch['grids'].update(
+            (student_id, instance.subject_id, session, term) for student_id, session, term in keys if term is not None
+        )
+    _schedule(batch)
+
+
+@receiver(pre_delete, sender=Student)
+def remember_deleted_student_class(sender, instance, **kwargs):
+    """A deleted student's results are ranked out of their class after the student row is gone"""
+    batch = _batch()
+    batch['classes'][instance.pk] = instance.class_level_id
+    _schedule(batch)
+
+
+@receiver(post_init, sender=Student)
+def remember_results_class(sender, instance, **kwargs):
+    """Keep the class a loaded student was in; False when the field was deferred. schools.signals keeps its own copy for fees."""
+    fields = instance.__dict__
+    instance._results_class_level_id = fields['class_level_id'] if 'class_level_id' in fields else False
+
+
+@receiver(post_save, sender=Student)
+def student_moved_class(sender, instance, created, **kwargs):
+    """A student joining, leaving or changing class changes the rows of both classes' broadsheets"""
+    previous = instance._results_class_level_id
+    if 'class_level_id' not in instance.__dict__:
+        return
+    if created or previous != instance.class_level_id:
+        for class_level_id in {previous, instance.class_level_id} - {None, False}:
+            bump_results_version(class_level_id)
+    instance._results_class_level_id = instance.class_level_id
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=ClassSubject)
+@receiver(post_delete, sender=ClassSubject)
+def class_changed(sender, instance, **kwargs):
+    if instance.class_level_id:
+        bump_results_version(instance.class_level_id)
+
+
+FILE_FIELDS = {Assignment: 'assignment_file', StudentAssignment: 'submitted_file'}
+
+
+def _file_name(instance, field):
+    # Read the raw value so a deferred field isn't loaded just to be tracked
+    value = instance.__dict__.get(field)
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Assignment)
+@receiver(post_init, sender=StudentAssignment)
+def remember_stored_file(sender, instance, **kwargs):
+    """Keep the file a row pointed at when loaded, to see if a save changes it"""
+    field = FILE_FIELDS[sender]
+    instance._stored_file = _file_name(instance, field) if field in instance.__dict__ else None
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=StudentAssignment)
+def count_file_references(sender, instance, **kwargs):
+    """Move the blob reference counts when a row's file is set, replaced or cleared"""
+    field = FILE_FIELDS[sender]
+    if field not in instance.__dict__:
+        return
+    previous, current = instance._stored_file, _file_name(instance, field)
+    if previous is None:
+        # Loaded without the file field; collect_blobs recounts anything missed here
+        instance._stored_file = current
+    elif previous != current:
+        add_reference(current)
+        if previous:
+            drop_reference(previous)
+        instance._stored_file = current
+
+
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=StudentAssignment)
+def release_file_reference(sender, instance, **kwargs):
+    drop_reference(instance._stored_file)
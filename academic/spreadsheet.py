@@ -0,0 +1,353 @@
+import math
+
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import Student
+from .gradebook import Gradebook
+from .models import GridVersion, Result, session_for_date
+from .summaries import refresh_term_summaries
+
+
+BATCH_SIZE = 500
+OVERALL = Result.OVERALL
+
+
+def ca_assessment(ca_name):
+    """Assessment key for a spreadsheet CA column ("Test 1" -> "test_1")"""
+    return ca_name.lower().replace(' ', '_')
+
+
+def ca_exam_type(term, ca_name):
+    """Build the exam_type used for a spreadsheet CA column (e.g. "term1_test_1")"""
+    return f"term{term}_{ca_assessment(ca_name)}"
+
+
+def overall_exam_type(term):
+    return f"term{term}_{OVERALL}"
+
+
+def session_key(session):
+    """The session a spreadsheet save is filed under, defaulting to the current one"""
+    return str(session or session_for_date(timezone.now().date()))
+
+
+def load_existing_scores(teacher, subject, class_level, term, session=None):
+    """
+    Return the saved CA scores of a class for one subject and term as a list of
+    {'student_id', 'ca_name', 'score', 'max_score', 'comment'} dicts, using a
+    single query.
+    """
+    results = Result.objects.filter(
+        student__class_level=class_level,
+        subject=subject,
+        term=term,
+        recorded_by=teacher,
+    ).exclude(assessment=OVERALL)
+    if session:
+        results = results.filter(session=session)
+    results = results.order_by('student_id', 'id').values_list('student_id', 'assessment', 'score', 'max_score', 'comment')
+
+    return [
+        {
+            'student_id': student_id,
+            'ca_name': assessment,
+            'score': score,
+            'max_score': max_score,
+            'comment': comment or '',
+        }
+        for student_id, assessment, score, max_score, comment in results
+    ]
+
+
+def columnar_scores(scores):
+    """
+    Pack the rows from load_existing_scores into parallel arrays:
+    student_ids[], ca_names[] and a student x CA score matrix (None where no
+    score was saved), plus one comment per student.
+    """
+    student_ids = []
+    ca_names = []
+    student_index = {}
+    ca_index = {}
+    cells = []
+    comments = {}
+
+    for row in scores:
+        student_id = row['student_id']
+        if student_id not in student_index:
+            student_index[student_id] = len(student_ids)
+            student_ids.append(student_id)
+        if row['ca_name'] not in ca_index:
+            ca_index[row['ca_name']] = len(ca_names)
+            ca_names.append(row['ca_name'])
+        cells.append((student_index[student_id], ca_index[row['ca_name']], row['score']))
+        if row['comment'] and not comments.get(student_id):
+            comments[student_id] = row['comment']
+
+    matrix = [[None] * len(ca_names) for _ in student_ids]
+    for i, j, score in cells:
+        matrix[i][j] = score
+
+    return {
+        'student_ids': student_ids,
+        'ca_names': ca_names,
+        'scores': matrix,
+        'comments': [comments.get(student_id, '') for student_id in student_ids],
+    }
+
+
+def scores_gradebook(scores, student_ids=None):
+    """Gradebook over the rows from load_existing_scores, without another query"""
+    return Gradebook.from_rows(
+        ((row['student_id'], row['ca_name'], row['score'], row['max_score']) for row in scores),
+        student_ids=student_ids,
+    )
+
+
+def _finite(value):
+    """A posted score as a float, or ValueError when it isn't a finite number"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{value!r} is not a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{value!r} is not a number")
+    return number
+
+
+def _checked_score(score, max_score):
+    """(score, max_score) of one cell as numbers with 0 <= score <= max_score, or ValueError"""
+    score, max_score = _finite(score), _finite(max_score)
+    if not 0 <= score <= max_score:
+        raise ValueError(f"score {score:g} must be between 0 and {max_score:g}")
+    return score, max_score
+
+
+def save_spreadsheet_rows(teacher, subject, class_level, term, session, rows):
+    """
+    Validate and write a whole spreadsheet payload in one transaction.
+
+    Every student in the payload is checked against a single prefetched set of
+    students in the class and every score must be a number from 0 to its max
+    score; a bad row is reported and skipped while the others are saved. All
+    CA and overall results are then written with one lookup query and a
+    batched upsert. Returns a tuple of
+    (saved_count, errors) where errors is a list of per-row messages.
+    """
+    student_ids = set()
+    for row in rows:
+        try:
+            student_ids.add(int(row.get('student_id')))
+        except (TypeError, ValueError):
+            pass
+
+    students = Student.objects.filter(class_level=class_level).in_bulk(student_ids) if student_ids else {}
+
+    today = timezone.now().date()
+    term = int(term)
+    session = session_key(session)
+    pending = {}
+    errors = []
+    saved_count = 0
+
+    for row in rows:
+        student_id = row.get('student_id')
+        try:
+            student = students.get(int(student_id))
+        except (TypeError, ValueError):
+            student = None
+        if student is None:
+            errors.append(f"Error saving student {student_id}: No Student matches the given query.")
+            continue
+
+        comment = row.get('comment', '')
+        row_results = []
+        try:
+            for ca_score in row.get('ca_scores', []):
+                score, max_score = _checked_score(ca_score.get('score', 0), ca_score.get('max_score', 0))
+                row_results.append((ca_assessment(ca_score.get('ca_name')), {
+                    'score': score,
+                    'max_score': max_score,
+                    'comment': comment,
+                }))
+            total_score, _ = _checked_score(row.get('total_score', 0), 100)
+            row_results.append((OVERALL, {
+                'score': total_score,
+                'max_score': 100,
+                'comment': comment,
+            }))
+        except Exception as e:
+            errors.append(f"Error saving student {student_id}: {str(e)}")
+            continue
+
+        for assessment, values in row_results:
+            pending[(student.id, assessment)] = values
+        saved_count += len(row_results)
+
+    if pending:
+        _upsert_results(teacher, subject, session, term, today, pending)
+
+    return saved_count, errors
+
+
+def _upsert_results(teacher, subject, session, term, date_taken, pending):
+    """
+    Write {(student_id, assessment): values} for one teacher, subject and term.
+
+    Rows are matched on (student, subject, session, term, assessment,
+    recorded_by), the same key as the unique constraint: an existing result
+    keeps its id and only has its score, max score, comment and date
+    refreshed. Where a cell has no row dated today, its most recent older row
+    is first moved to today's date so that a single INSERT ... ON CONFLICT DO
+    UPDATE then covers every cell. Older duplicates of a cell are left alone.
+    """
+    existing = Result.objects.filter(
+        subject=subject,
+        recorded_by=teacher,
+        session=session,
+        term=term,
+        student_id__in={student_id for student_id, _ in pending},
+        assessment__in={assessment for _, assessment in pending},
+    ).order_by('date_taken', 'id').values_list('id', 'student_id', 'assessment', 'date_taken')
+    current = set()
+    stale = {}
+    for result_id, student_id, assessment, result_date in existing:
+        if result_date == date_taken:
+            current.add((student_id, assessment))
+        elif (student_id, assessment) in pending:
+            stale[(student_id, assessment)] = result_id
+    stale_ids = [result_id for cell, result_id in stale.items() if cell not in current]
+
+    results = [
+        Result(
+            student_id=student_id,
+            subject=subject,
+            exam_type=f"term{term}_{assessment}",
+            recorded_by=teacher,
+            date_taken=date_taken,
+            session=session,
+            term=term,
+            assessment=assessment,
+            **values
+        )
+        for (student_id, assessment), values in pending.items()
+    ]
+
+    with transaction.atomic():
+        for i in range(0, len(stale_ids), BATCH_SIZE):
+            Result.objects.filter(id__in=stale_ids[i:i + BATCH_SIZE]).update(date_taken=date_taken)
+        Result.objects.bulk_create(
+            results,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['student', 'subject', 'session', 'exam_type', 'date_taken', 'recorded_by'],
+            update_fields=['score', 'max_score', 'comment'],
+        )
+        refresh_term_summaries((student_id, session, term) for student_id, _ in pending)
+
+
+def grid_version(class_level, subject, session, term):
+    """Current version token of a spreadsheet grid, 0 if it has never been saved"""
+    return GridVersion.objects.filter(
+        class_level=class_level, subject=subject, session=session_key(session), term=term
+    ).values_list('version', flat=True).first() or 0
+
+
+def lock_grid(class_level, subject, session, term):
+    """Fetch a grid's GridVersion row locked for update; call inside a transaction"""
+    grid, _ = GridVersion.objects.select_for_update().get_or_create(
+        class_level=class_level, subject=subject, session=session_key(session), term=int(term)
+    )
+    return grid
+
+
+def bump_grid(grid, teacher):
+    grid.version += 1
+    grid.updated_by = teacher
+    grid.save(update_fields=['version', 'updated_by', 'updated_at'])
+    return grid.version
+
+
+def _number(value):
+    return None if value in (None, '') else float(value)
+
+
+def save_spreadsheet_delta(teacher, subject, class_level, term, session, base_version, cells, comments=None):
+    """
+    Write only the cells that changed since the client loaded the grid.
+
+    cells is a list of {'student_id', 'ca_name', 'score', 'max_score',
+    'base_score'} where base_score is the value the client started from
+    (None for a cell that had no result). If the grid moved on since
+    base_version, each cell is checked on its own: one whose saved score no
+    longer matches base_score is a conflict and is not written. comments is
+    {student_id: comment}. Overall rows of the touched students are
+    recomputed on the server.
+
+    Returns (saved_count, conflicts, version) where conflicts lists the
+    current server value of every rejected cell.
+    """
+    term = int(term)
+    session = session_key(session)
+    comments = {int(student_id): comment for student_id, comment in (comments or {}).items()}
+    student_ids = {int(cell['student_id']) for cell in cells} | set(comments)
+    student_ids = set(
+        Student.objects.filter(class_level=class_level, id__in=student_ids).values_list('id', flat=True)
+    )
+
+    with transaction.atomic():
+        grid = lock_grid(class_level, subject, session, term)
+        stale = base_version is None or int(base_version) != grid.version
+
+        # Current values of every result the touched students have in the grid
+        current = {
+            (student_id, assessment): {'score': score, 'max_score': max_score, 'comment': comment or ''}
+            for student_id, assessment, score, max_score, comment in Result.objects.filter(
+                student_id__in=student_ids, subject=subject, session=session, term=term, recorded_by=teacher,
+            ).values_list('student_id', 'assessment', 'score', 'max_score', 'comment')
+        }
+
+        pending = {}
+        conflicts = []
+        for cell in cells:
+            student_id = int(cell['student_id'])
+            if student_id not in student_ids:
+                continue
+            assessment = ca_assessment(cell['ca_name'])
+            saved = current.get((student_id, assessment))
+            if stale and _number(cell.get('base_score')) != (saved['score'] if saved else None):
+                conflicts.append({'student_id': student_id, 'ca_name': assessment, **(saved or {'score': None})})
+                continue
+            pending[(student_id, assessment)] = {
+                'score': cell.get('score') or 0,
+                'max_score': cell.get('max_score') or 0,
+                'comment': comments.get(student_id, saved['comment'] if saved else ''),
+            }
+
+        # A comment change alone rewrites the student's other saved cells
+        for (student_id, assessment), saved in current.items():
+            if student_id in comments and assessment != OVERALL and (student_id, assessment) not in pending:
+                pending[(student_id, assessment)] = dict(saved, comment=comments[student_id])
+
+        if not pending:
+            return 0, conflicts, grid.version
+
+        saved_count = len(pending)
+        _upsert_results(teacher, subject, session, term, timezone.now().date(), pending)
+
+        touched = {student_id for student_id, _ in pending}
+        totals = Gradebook.load_results(Result.objects.filter(
+            student_id__in=touched, subject=subject, session=session, term=term
+        )).total_by_student()
+        overall = {}
+        for student_id in touched:
+            saved = current.get((student_id, OVERALL), {})
+            overall[(student_id, OVERALL)] = {
+                'score': round(totals.get(student_id, 0)),
+                'max_score': 100,
+                'comment': comments.get(student_id, saved.get('comment', '')),
+            }
+        _upsert_results(teacher, subject, session, term, timezone.now().date(), overall)
+
+        return saved_count, conflicts, bump_grid(grid, teacher)
@@ -0,0 +1,56 @@
+from django.db.models import Avg, Count, F, Max, Min, Q
+
+
+PASS_MARK = 50  # percent
+
+
+def _aggregates():
+    percentage = F('score') * 100.0 / F('max_score')
+    scored = Q(max_score__gt=0)
+    return {
+        'count': Count('id'),
+        'scored_count': Count('id', filter=scored),
+        'mean_percentage': Avg(percentage, filter=scored),
+        'min_percentage': Min(percentage, filter=scored),
+        'max_percentage': Max(percentage, filter=scored),
+        'pass_count': Count('id', filter=scored & Q(score__gte=F('max_score') * PASS_MARK / 100.0)),
+        'subject_count': Count('subject', distinct=True),
+        'class_count': Count('student__class_level', distinct=True),
+    }
+
+
+def _finish(row):
+    """Round the percentages and turn pass_count into a pass rate over the scored results"""
+    count = row['count'] or 0
+    scored_count = row['scored_count'] or 0
+    return {
+        'count': count,
+        'mean_percentage': round(row['mean_percentage'] or 0, 1),
+        'min_percentage': round(row['min_percentage'] or 0, 1),
+        'max_percentage': round(row['max_percentage'] or 0, 1),
+        'pass_rate': round(row['pass_count'] * 100 / scored_count, 1) if scored_count else 0,
+        'subject_count': row['subject_count'],
+        'class_count': row['class_count'],
+    }
+
+
+def result_stats(results):
+    """
+    Count, mean/min/max percentage, pass rate and number of subjects and
+    classes for a Result queryset, in a single aggregate query.
+    """
+    return _finish(results.aggregate(**_aggregates()))
+
+
+def stats_by(results, field):
+    """The same statistics grouped by a field, as {field value: stats}, in one query"""
+    rows = results.values(field).annotate(**_aggregates()).order_by(field)
+    return {row[field]: _finish(row) for row in rows}
+
+
+def class_stats(results):
+    return stats_by(results, 'student__class_level_id')
+
+
+def teacher_stats(results):
+    return stats_by(results, 'recorded_by_id')
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_DIR = 'blobs'
+
+# A blob with no references is only collected once it is this old, so an
+# upload whose row hasn't been saved yet is never removed from under it
+GC_GRACE = timedelta(hours=1)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its contents, e.g.
+    blobs/3f/a9/3fa9...e1.pdf, so identical uploads share one file on disk.
+
+    The upload is hashed while it is copied to a temporary file in the blob
+    directory, then moved into place, or dropped if that blob is already
+    stored. Each blob has a StoredBlob row; references to it are counted by
+    the signals in academic.signals and collect_garbage() removes blobs
+    nothing points at. Names never change for the same contents, so they can
+    be cached forever.
+    """
+
+    def blob_name(self, digest, name):
+        ext = os.path.splitext(name)[1].lower()
+        return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        blob_dir = self.path(BLOB_DIR)
+        os.makedirs(blob_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=blob_dir, prefix='.upload-', delete=False) as temp:
+            try:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+
+        blob_name = self.blob_name(sha256.hexdigest(), name)
+        path = self.path(blob_name)
+        if os.path.exists(path):
+            os.unlink(temp.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp.name, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        blob, created = StoredBlob.objects.get_or_create(name=blob_name, defaults={'size': size})
+        if not created:
+            # Restart the grace period so garbage collection leaves it for the row about to be saved
+            StoredBlob.objects.filter(pk=blob.pk).update(last_uploaded=timezone.now())
+        return blob_name
+
+    def get_available_name(self, name, max_length=None):
+        # The real name is only known once the contents are hashed in _save()
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f"{BLOB_DIR}/")
+
+
+def add_reference(name):
+    from .models import StoredBlob
+
+    if is_blob(name):
+        StoredBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def drop_reference(name):
+    from .models import StoredBlob
+
+    if is_blob(name):
+        StoredBlob.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+
+
+def blob_references():
+    """{blob name: number of rows pointing at it}, counted from the file fields themselves"""
+    from .models import Assignment, StudentAssignment
+
+    counts = {}
+    for model, field in [(Assignment, 'assignment_file'), (StudentAssignment, 'submitted_file')]:
+        rows = model.objects.filter(**{f'{field}__startswith': f'{BLOB_DIR}/'}).values(field).annotate(
+            count=Count('id')
+        ).order_by().values_list(field, 'count')
+        for name, count in rows:
+            counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+def collect_garbage(grace=GC_GRACE, dry_run=False):
+    """
+    Recount every blob's references from the file fields, then delete the
+    blobs (file and row) that nothing references and that haven't been
+    uploaded within grace. Returns (blobs deleted, bytes freed).
+    """
+    from .models import StoredBlob
+
+    references = blob_references()
+    cutoff = timezone.now() - grace
+    changed = []
+    garbage = []
+    for blob in StoredBlob.objects.only('id', 'name', 'size', 'refs', 'last_uploaded').iterator():
+        refs = references.get(blob.name, 0)
+        if blob.refs != refs:
+            blob.refs = refs
+            changed.append(blob)
+        if not refs and blob.last_uploaded < cutoff:
+            garbage.append(blob)
+
+    if dry_run:
+        return len(garbage), sum(blob.size for blob in garbage)
+
+    if changed:
+        StoredBlob.objects.bulk_update(changed, ['refs'], batch_size=1000)
+    deleted = freed = 0
+    for blob in garbage:
+        # Conditional delete, in case the blob was referenced or re-uploaded since it was read
+        if StoredBlob.objects.filter(pk=blob.pk, refs=0, last_uploaded__lt=cutoff).delete()[0]:
+            blob_storage.delete(blob.name)
+            deleted += 1
+            freed += blob.size
+    return deleted, freed
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Result, StudentTermSummary
+
+
+SUMMARY_FIELDS = ['result_count', 'percentage_sum', 'total_score', 'total_max_score', 'subjects_taken']
+
+
+def _term_aggregates(results):
+    """Group a Result queryset by (student, session, term) and aggregate each group"""
+    return results.values('student_id', 'session', 'term').annotate(
+        result_count=Count('id'),
+        percentage_sum=Sum(F('score') * 100.0 / F('max_score'), filter=Q(max_score__gt=0)),
+        total_score=Sum('score'),
+        total_max_score=Sum('max_score'),
+        subjects_taken=Count('subject', distinct=True),
+    ).order_by()
+
+
+def _summary(row):
+    return StudentTermSummary(
+        student_id=row['student_id'],
+        session=row['session'],
+        term=row['term'] or 0,
+        **{field: row[field] or 0 for field in SUMMARY_FIELDS}
+    )
+
+
+def refresh_term_summaries(keys):
+    """
+    Recompute the summaries for an iterable of (student_id, session, term) keys
+    from their Result rows. Summaries whose results are all gone are deleted.
+    """
+    keys = {(student_id, session, term or 0) for student_id, session, term in keys}
+    if not keys:
+        return
+
+    rows = _term_aggregates(Result.objects.filter(
+        student_id__in={student_id for student_id, _, _ in keys},
+        session__in={session for _, session, _ in keys},
+    ))
+    summaries = [
+        summary for summary in map(_summary, rows)
+        if (summary.student_id, summary.session, summary.term) in keys
+    ]
+    found = {(summary.student_id, summary.session, summary.term) for summary in summaries}
+
+    with transaction.atomic():
+        if summaries:
+            StudentTermSummary.objects.bulk_create(
+                summaries,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['student', 'session', 'term'],
+                update_fields=SUMMARY_FIELDS + ['updated_at'],
+            )
+        stale = keys - found
+        if stale:
+            stale_filter = Q()
+            for student_id, session, term in stale:
+                stale_filter |= Q(student_id=student_id, session=session, term=term)
+            StudentTermSummary.objects.filter(stale_filter).delete()
+
+
+def rebuild_term_summaries(batch_size=2000):
+    """Drop every summary and rebuild the table from all results. Returns the row count."""
+    count = 0
+    with transaction.atomic():
+        StudentTermSummary.objects.all().delete()
+        batch = []
+        for row in _term_aggregates(Result.objects.all()).iterator(chunk_size=batch_size):
+            batch.append(_summary(row))
+            if len(batch) >= batch_size:
+                StudentTermSummary.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            StudentTermSummary.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def student_average(student, session=None, term=None):
+    """
+    Return (result_count, average_percentage) for a student from their term
+    summaries, optionally narrowed to one session and/or term.
+    """
+    summaries = StudentTermSummary.objects.filter(student=student)
+    if session:
+        summaries = summaries.filter(session=session)
+    if term:
+        summaries = summaries.filter(term=term)
+    totals = summaries.aggregate(result_count=Sum('result_count'), percentage_sum=Sum('percentage_sum'))
+    if not totals['result_count']:
+        return 0, 0
+    return totals['result_count'], totals['percentage_sum'] / totals['result_count']
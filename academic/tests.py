@@ -1,3 +1,964 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from schools.models import School, SchoolAdmin
+from users.models import Student, Teacher, User
+from .management.commands.benchmark_spreadsheet_save import Command as BenchmarkCommand
+from .models import Assignment, ClassLevel, ClassSubject, StudentAssignment, GradingScheme, StoredBlob, ReportCardJob, Result, StudentTermSummary, Subject, TranscriptSnapshot, parse_exam_type, session_for_date
+from .broadsheet import build_broadsheet, class_broadsheet
+from .gradebook import DENSE, Gradebook
+from .grading import apply_scheme, attach_grades, class_grades, scheme_for_school
+from .transcripts import freeze_session, student_transcript
+from .exports import HEADER, export_results, export_rows
+from .score_import import ScoreImportError, error_report_csv, import_scores, iter_upload_rows
+from .report_cards import class_report_cards, job_dir, run_job
+from .spreadsheet import columnar_scores, grid_version, load_existing_scores, save_spreadsheet_delta, save_spreadsheet_rows, session_key
+from .storage import collect_garbage
+from .assignments import fan_out, grade, materialize, pending_count, reconcile_counters, submit
+from .pagination import decode_cursor, keyset_page
+from .ranking import rank, recompute_positions
+from .summaries import rebuild_term_summaries, refresh_term_summaries, student_average
+from .stats import class_stats, result_stats, stats_by, teacher_stats
+
+
+class ResultFixtures:
+    """A school with one class, two subjects and three students' term 1 exam results"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(
+            name='Test School', school_type='secondary', subscription_type='basic',
+            phone='0', email='test@example.com', address='-', city='-', lga='-',
+        )
+        cls.class_level = ClassLevel.objects.create(name='SS 1A', level='ss_1', school=cls.school)
+        cls.maths = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.english = Subject.objects.create(name='English', code='ENG')
+
+        teacher_user = User.objects.create_user('teacher', password='pass', user_type='teacher', school=cls.school)
+        cls.teacher = Teacher.objects.create(user=teacher_user, school=cls.school)
+        cls.admin_user = User.objects.create_user('admin', password='pass', user_type='senior_admin', school=cls.school)
+        SchoolAdmin.objects.create(user=cls.admin_user, school=cls.school, is_senior=True)
+
+        cls.students = []
+        for i in range(3):
+            user = User.objects.create_user(f'student{i}', password='pass', user_type='student', school=cls.school)
+            cls.students.append(Student.objects.create(
+                user=user, school=cls.school, class_level=cls.class_level, admission_number=f'TST{i:03d}'
+            ))
+
+        # Percentages: student0 80/40, student1 60/20, student2 50/0 (max_score 0 is ignored)
+        scores = [(80, 40), (60, 20), (50, 0)]
+        # The result signals refresh summaries and positions on commit
+        with cls.captureOnCommitCallbacks(execute=True):
+            for student, (maths, english) in zip(cls.students, scores):
+                Result.objects.create(
+                    student=student, subject=cls.maths, exam_type='term1_exam', score=maths, max_score=100,
+                    date_taken='2025-10-01', recorded_by=cls.teacher,
+                )
+                Result.objects.create(
+                    student=student, subject=cls.english, exam_type='term1_exam', score=english,
+                    max_score=100 if english else 0, date_taken='2025-10-01', recorded_by=cls.teacher,
+                )
+
+
+class ResultStatsTests(ResultFixtures, TestCase):
+    """Result statistics are computed in the database with a fixed number of queries"""
+
+    def test_result_stats(self):
+        with self.assertNumQueries(1):
+            stats = result_stats(Result.objects.all())
+        self.assertEqual(stats['count'], 6)
+        self.assertEqual(stats['mean_percentage'], 50.0)
+        self.assertEqual(stats['min_percentage'], 20.0)
+        self.assertEqual(stats['max_percentage'], 80.0)
+        # Three of the five scored results pass; the one out of 0 isn't counted either way
+        self.assertEqual(stats['pass_rate'], 60.0)
+        self.assertEqual(stats['subject_count'], 2)
+        self.assertEqual(stats['class_count'], 1)
+
+    def test_grouped_stats(self):
+        with self.assertNumQueries(1):
+            by_subject = stats_by(Result.objects.all(), 'subject_id')
+        self.assertEqual(by_subject[self.maths.id]['mean_percentage'], 63.3)
+        self.assertEqual(by_subject[self.english.id]['pass_rate'], 0)
+        with self.assertNumQueries(1):
+            by_class = class_stats(Result.objects.all())
+        self.assertEqual(by_class[self.class_level.id]['count'], 6)
+        self.assertEqual(teacher_stats(Result.objects.all())[self.teacher.id]['pass_rate'], 60.0)
+
+    def test_school_analytics_by_class_and_teacher(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('schools:analytics'))
+        self.assertEqual(
+            [(row['name'], row['count'], row['pass_rate']) for row in response.context['class_performance']],
+            [('SS 1A', 6, 60.0)],
+        )
+        self.assertEqual([row['name'] for row in response.context['teacher_performance']], ['teacher'])
+        self.assertContains(response, 'Performance by Teacher')
+
+    def test_empty_stats(self):
+        stats = result_stats(Result.objects.none())
+        self.assertEqual(stats['count'], 0)
+        self.assertEqual(stats['pass_rate'], 0)
+
+    def test_view_scores_queries(self):
+        self.client.force_login(self.teacher.user)
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('academic:view_scores'))
+        self.assertEqual(response.context['stats']['count'], 6)
+
+    def test_student_results_queries(self):
+        self.client.force_login(self.students[0].user)
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('academic:student_results'))
+        self.assertEqual(response.context['total_scores'], 2)
+        self.assertEqual(response.context['average_percentage'], 60.0)
+
+    def test_student_results_admin_queries(self):
+        self.client.force_login(self.admin_user)
+        with self.assertNumQueries(8):
+            response = self.client.get(
+                reverse('academic:student_results_admin', args=[self.students[1].id]), {'subject_id': self.maths.id}
+            )
+        self.assertEqual(response.context['stats']['mean_percentage'], 60.0)
+
+    def test_admin_student_results_queries(self):
+        self.client.force_login(self.admin_user)
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse('academic:admin_student_results', args=[self.students[2].id]))
+        # 50/100 passes; the English result out of 0 isn't part of the rate
+        self.assertEqual(response.context['stats']['pass_rate'], 100.0)
+
+    def test_keyset_pages(self):
+        first, cursor = keyset_page(Result.objects.all(), page_size=4)
+        second, last_cursor = keyset_page(Result.objects.all(), cursor, page_size=4)
+        self.assertEqual(len(first), 4)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(
+            [result.id for result in first + second],
+            list(Result.objects.order_by('-date_taken', '-id').values_list('id', flat=True))
+        )
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+
+
+class ResultRollupSignalTests(ResultFixtures, TestCase):
+    """ORM writes queue their rollups and refresh them once per transaction"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for student in self.students:
+                Result.objects.create(
+                    student=student, subject=self.maths, exam_type='term1_overall', score=0, max_score=100,
+                    date_taken='2025-10-01', recorded_by=self.teacher,
+                )
+        recompute_positions(self.class_level, self.maths, '2025', 1)
+
+    def positions(self):
+        return dict(Result.objects.filter(subject=self.maths, assessment=Result.OVERALL).values_list(
+            'student__admission_number', 'position'
+        ))
+
+    def test_cascade_reranks_each_class_once(self):
+        self.assertEqual(self.positions(), {'TST000': 1, 'TST001': 2, 'TST002': 3})
+        with mock.patch('academic.signals.recompute_positions', wraps=recompute_positions) as recompute, \
+                mock.patch('academic.signals.refresh_term_summaries', wraps=refresh_term_summaries) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.students[0].delete()
+        # Mathematics and English, one re-rank each, and one summary refresh
+        self.assertEqual(recompute.call_count, 2)
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(self.positions(), {'TST001': 1, 'TST002': 2})
+
+    def test_loop_of_saves_in_one_transaction(self):
+        with mock.patch('academic.signals.recompute_positions', wraps=recompute_positions) as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                for result in Result.objects.filter(subject=self.maths, assessment='exam'):
+                    result.score = 100 - result.score
+                    result.save()
+        self.assertEqual(recompute.call_count, 1)
+        self.assertEqual(self.positions(), {'TST000': 3, 'TST001': 2, 'TST002': 1})
+
+
+    def test_rolled_back_changes_are_not_flushed_later(self):
+        try:
+            with transaction.atomic():
+                result = Result.objects.get(student=self.students[0], subject=self.english)
+                result.score = 1
+                result.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with mock.patch('academic.signals.recompute_positions', wraps=recompute_positions) as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = Result.objects.get(student=self.students[0], subject=self.maths, assessment='exam')
+                result.score = 10
+                result.save()
+        # Only the committed Mathematics change is re-ranked
+        self.assertEqual([call.args[1] for call in recompute.call_args_list], [self.maths.id])
+
+    def test_positions_use_scheme_weights(self):
+        GradingScheme.objects.create(school=self.school, weights={'test': 1, 'exam': 3})
+        physics = Subject.objects.create(name='Physics', code='PHY')
+        # Unweighted student0 leads on 50 to 40; with the exam counted three times student1 leads on 60 to 25
+        scores = [(10, 0), (0, 80)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for student, (test, exam) in zip(self.students, scores):
+                for exam_type, score, max_score in [('term1_test', test, 10), ('term1_exam', exam, 100), ('term1_overall', 0, 100)]:
+                    Result.objects.create(
+                        student=student, subject=physics, exam_type=exam_type, score=score, max_score=max_score,
+                        date_taken='2025-10-01', recorded_by=self.teacher,
+                    )
+        overall = dict(Result.objects.filter(subject=physics, assessment=Result.OVERALL).values_list(
+            'student_id', 'position'
+        ))
+        self.assertEqual(overall, {self.students[0].id: 2, self.students[1].id: 1})
+        self.assertEqual(
+            Result.objects.get(subject=physics, student=self.students[1], assessment=Result.OVERALL).score, 60
+        )
+        cards = {card['student']['admission_number']: card for card in class_report_cards(self.school, self.class_level, '2025', 1)}
+        card = next(subject for subject in cards['TST001']['subjects'] if subject['name'] == 'Physics')
+        self.assertEqual((card['total'], card['position']), (60.0, 1))
+
+
+class TermSummaryTests(ResultFixtures, TestCase):
+
+    def summaries(self):
+        return {
+            (summary.student.admission_number, summary.session, summary.term):
+                (summary.result_count, summary.percentage_sum, summary.total_score, summary.subjects_taken)
+            for summary in StudentTermSummary.objects.select_related('student')
+        }
+
+    def test_summaries_follow_results(self):
+        self.assertEqual(self.summaries(), {
+            ('TST000', '2025', 1): (2, 120.0, 120, 2),
+            ('TST001', '2025', 1): (2, 80.0, 80, 2),
+            # Out of 0, so left out of the percentages
+            ('TST002', '2025', 1): (2, 50.0, 50, 2),
+        })
+        self.assertEqual(student_average(self.students[0], '2025', 1), (2, 60.0))
+
+        # Moving a result to another term refreshes both terms
+        result = Result.objects.get(student=self.students[0], subject=self.english)
+        with self.captureOnCommitCallbacks(execute=True):
+            result.exam_type = 'term2_exam'
+            result.save()
+        summaries = self.summaries()
+        self.assertEqual(summaries[('TST000', '2025', 1)], (1, 80.0, 80, 1))
+        self.assertEqual(summaries[('TST000', '2025', 2)], (1, 40.0, 40, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Result.objects.filter(student=self.students[0]).delete()
+        self.assertNotIn(('TST000', '2025', 1), self.summaries())
+        self.assertEqual(student_average(self.students[0]), (0, 0))
+
+    def test_session_moves_with_date_taken(self):
+        result = Result.objects.get(student=self.students[1], subject=self.maths)
+        with self.captureOnCommitCallbacks(execute=True):
+            result.date_taken = '2026-10-01'  # as edit_result posts it
+            result.save()
+        self.assertEqual(Result.objects.get(pk=result.pk).session, '2026')
+        summaries = self.summaries()
+        self.assertEqual(summaries[('TST001', '2025', 1)], (1, 20.0, 20, 1))
+        self.assertEqual(summaries[('TST001', '2026', 1)], (1, 60.0, 60, 1))
+
+        # A session set explicitly is kept
+        result = Result.objects.get(pk=result.pk)
+        result.session = '2024'
+        result.save()
+        result = Result.objects.get(pk=result.pk)
+        result.date_taken = datetime.date(2026, 11, 1)
+        result.save()
+        self.assertEqual(Result.objects.get(pk=result.pk).session, '2024')
+
+    def test_rebuild(self):
+        expected = self.summaries()
+        StudentTermSummary.objects.filter(student=self.students[1]).update(result_count=9)
+        StudentTermSummary.objects.filter(student=self.students[2]).delete()
+        out = io.StringIO()
+        call_command('rebuild_term_summaries', stdout=out)
+        self.assertIn('Successfully rebuilt 3 student term summaries!', out.getvalue())
+        self.assertEqual(self.summaries(), expected)
+        self.assertEqual(rebuild_term_summaries(), 3)
+
+
+class GradebookTests(SimpleTestCase):
+
+    def setUp(self):
+        # Student 4 has no scores; student 3 missed the exam
+        self.gradebook = Gradebook.from_rows([
+            (1, 'test', 16, 20), (1, 'exam', 60, 100),
+            (2, 'test', 10, 20), (2, 'exam', 90, 100),
+            (3, 'test', 14, 20),
+        ], student_ids=[1, 2, 3, 4])
+
+    def test_totals_skip_missing_scores(self):
+        totals = self.gradebook.totals()
+        self.assertEqual(self.gradebook.total_by_student(totals), {1: 70.0, 2: 70.0, 3: 70.0})
+        weighted = self.gradebook.totals(weights={'test': 1, 'exam': 3})
+        self.assertEqual(weighted[:3].tolist(), [65.0, 80.0, 70.0])
+
+    def test_ranks(self):
+        totals = self.gradebook.totals(weights={'test': 1, 'exam': 3})
+        self.assertEqual(self.gradebook.ranks(totals).tolist(), [3, 1, 2, 0])
+        tied = self.gradebook.totals()
+        self.assertEqual(self.gradebook.ranks(tied).tolist(), [1, 1, 1, 0])
+        self.assertEqual(self.gradebook.position_by_student(DENSE, totals), {1: 3, 2: 1, 3: 2})
+
+    def test_grades_and_summary(self):
+        totals = self.gradebook.totals(weights={'test': 1, 'exam': 3})
+        self.assertEqual(self.gradebook.grades(totals).tolist(), ['B', 'A', 'A', ''])
+        summary = self.gradebook.summary(totals)
+        self.assertEqual(summary['students'], 3)
+        self.assertEqual(summary['class_average'], 71.7)
+        self.assertEqual(summary['pass_rate'], 100.0)
+
+
+class GradingSchemeTests(ResultFixtures, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_default_scheme(self):
+        scheme = scheme_for_school(self.school.id)
+        self.assertIsNone(scheme.pk)
+        results = attach_grades(list(Result.objects.filter(subject=self.maths).order_by('score')), scheme)
+        self.assertEqual([result.grade for result in results], ['C6', 'C4', 'A1'])
+        self.assertEqual([result.percentage for result in results], [50, 60, 80])
+
+    def test_overall_rows_use_class_grades(self):
+        scheme = scheme_for_school(self.school.id)
+        overall = Result(
+            student=self.students[0], subject=self.maths, session='2025', term=1,
+            assessment=Result.OVERALL, score=0, max_score=100,
+        )
+        attach_grades([overall], scheme, self.class_level.id)
+        self.assertEqual(overall.percentage, 0)
+        self.assertEqual(overall.grade, class_grades(self.class_level, self.maths, '2025', 1)[self.students[0].id]['grade'])
+        self.assertEqual(overall.grade, 'A1')
+
+    def test_scheme_weights_and_cache(self):
+        scheme = GradingScheme.objects.create(
+            school=self.school, name='Simple',
+            boundaries=[{'min': 55, 'grade': 'P', 'remark': 'Pass'}, {'min': 0, 'grade': 'F', 'remark': 'Fail'}],
+        )
+        gradebook = Gradebook.from_rows([(1, 'test', 10, 20), (1, 'exam', 60, 100), (2, 'exam', 40, 100)])
+        graded = apply_scheme(scheme, gradebook)
+        self.assertEqual(graded[1], {'total': 55.0, 'grade': 'P', 'remark': 'Pass', 'position': 1})
+        self.assertEqual(graded[2]['grade'], 'F')
+
+        grades = class_grades(self.class_level, self.maths, '2025', 1)
+        self.assertEqual(grades[self.students[0].id]['grade'], 'P')
+        with self.assertNumQueries(2):  # the scheme and results_version lookups; grades come from the cache
+            class_grades(self.class_level, self.maths, '2025', 1)
+
+        # The version is stored on the class row, so a change made by another worker is seen here too
+        version = ClassLevel.objects.get(pk=self.class_level.pk).results_version
+        Result.objects.filter(student=self.students[0], subject=self.maths).update(score=50)
+        self.assertEqual(class_grades(self.class_level, self.maths, '2025', 1)[self.students[0].id]['grade'], 'P')
+        recompute_positions(self.class_level, self.maths, '2025', 1)
+        self.assertEqual(ClassLevel.objects.get(pk=self.class_level.pk).results_version, version + 1)
+        self.assertEqual(class_grades(self.class_level, self.maths, '2025', 1)[self.students[0].id]['grade'], 'F')
+
+        scheme.boundaries = [{'min': 70, 'grade': 'P'}, {'min': 0, 'grade': 'F'}]
+        scheme.save()
+        self.assertEqual(scheme.version, 2)
+        grades = class_grades(self.class_level, self.maths, '2025', 1)
+        self.assertEqual(grades[self.students[1].id]['grade'], 'F')
+
+
+class BroadsheetTests(ResultFixtures, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ClassSubject.objects.create(class_level=self.class_level, subject=self.maths)
+        ClassSubject.objects.create(class_level=self.class_level, subject=self.english)
+
+    def test_build_broadsheet(self):
+        with self.assertNumQueries(4):
+            broadsheet = build_broadsheet(self.class_level, '2025', 1)
+        self.assertEqual([subject['code'] for subject in broadsheet['subjects']], ['ENG', 'MTH'])
+        first, second, third = broadsheet['students']
+        self.assertEqual((first['admission_number'], first['position'], first['average']), ('TST000', 1, 60.0))
+        self.assertEqual([cell['total'] for cell in first['cells']], [40.0, 80.0])
+        # student2's English result is out of 0, so only Mathematics counts
+        self.assertEqual((second['admission_number'], second['position'], second['average']), ('TST002', 2, 50.0))
+        self.assertEqual([cell['total'] for cell in second['cells']], [None, 50.0])
+        self.assertEqual((third['position'], third['average']), (3, 40.0))
+        self.assertEqual(broadsheet['subject_averages'], [30.0, 63.3])
+
+    def test_broadsheet_view_is_cached(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('academic:class_broadsheet', args=[self.class_level.id])
+        response = self.client.get(url, {'session': '2025', 'term': 1, 'export': 'json'})
+        self.assertEqual(response.json()['students'][0]['total'], 120.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Result.objects.filter(student=self.students[0], subject=self.maths).first().delete()
+        response = self.client.get(url, {'session': '2025', 'term': 1, 'export': 'json'})
+        self.assertEqual(response.json()['students'][0]['admission_number'], 'TST002')
+        csv_response = self.client.get(url, {'session': '2025', 'term': 1, 'export': 'csv'})
+        self.assertIn('Subject average', b''.join(csv_response.streaming_content).decode())
+
+    def test_cache_follows_class_changes(self):
+        broadsheet = class_broadsheet(self.class_level, '2025', 1)
+        self.assertEqual(len(broadsheet['students']), 3)
+        self.assertEqual(class_broadsheet(self.class_level, '2025', 1), broadsheet)
+
+        other = ClassLevel.objects.create(name='SS 1B', level='ss_1', school=self.school)
+        student = Student.objects.get(pk=self.students[2].pk)
+        student.class_level = other
+        student.save()
+        broadsheet = class_broadsheet(self.class_level, '2025', 1)
+        self.assertEqual([row['admission_number'] for row in broadsheet['students']], ['TST000', 'TST001'])
+        self.assertEqual(len(class_broadsheet(other, '2025', 1)['students']), 1)
+
+        ClassSubject.objects.get(class_level=self.class_level, subject=self.english).delete()
+        broadsheet = class_broadsheet(self.class_level, '2025', 1)
+        self.assertEqual([subject['code'] for subject in broadsheet['subjects']], ['MTH'])
+
+
+class TranscriptTests(ResultFixtures, TestCase):
+
+    def test_finished_session_is_frozen(self):
+        student = self.students[0]
+        transcript = student_transcript(student)
+        record, = transcript['sessions']
+        self.assertEqual(record['session'], '2025')
+        self.assertEqual(record['terms'], {'1': 60.0})
+        self.assertEqual(
+            [(subject['name'], subject['terms'], subject['annual']) for subject in record['subjects']],
+            [('English', {'1': 40.0}, 40.0), ('Mathematics', {'1': 80.0}, 80.0)]
+        )
+        self.assertEqual(transcript['cumulative_average'], 60.0)
+        self.assertTrue(TranscriptSnapshot.objects.filter(student=student, session='2025').exists())
+
+        # Later edits to a finished session don't touch the snapshot
+        Result.objects.filter(student=student, subject=self.maths).update(score=10)
+        with self.assertNumQueries(2):
+            self.assertEqual(student_transcript(student)['cumulative_average'], 60.0)
+
+    def test_freeze_session(self):
+        self.assertEqual(freeze_session('2025'), 3)
+        self.assertEqual(freeze_session('2025'), 0)
+        self.assertEqual(freeze_session('2025', refreeze=True), 3)
+        with self.assertRaises(ValueError):
+            freeze_session('2999')
+
+
+class ResultExportTests(ResultFixtures, TestCase):
+
+    def test_export_rows(self):
+        rows = list(export_rows(Result.objects.filter(student=self.students[2]).order_by('subject__name')))
+        self.assertEqual(len(rows), 2)
+        by_subject = {row[3]: row for row in rows}
+        self.assertEqual(by_subject['Mathematics'][1:10], ['TST002', 'SS 1A', 'Mathematics', 'term1_exam', '2025', 1, 50, 100, 50.0])
+        # A result out of 0 has no percentage
+        self.assertEqual(by_subject['English'][9], '')
+
+    def test_view_results_csv(self):
+        self.client.force_login(self.teacher.user)
+        response = self.client.get(reverse('academic:view_results'), {'export': 'csv', 'subject_id': self.maths.id})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="results_', response['Content-Disposition'])
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0], HEADER)
+        self.assertEqual(sorted(line[1] for line in lines[1:]), ['TST000', 'TST001', 'TST002'])
+        self.assertEqual({line[3] for line in lines[1:]}, {'Mathematics'})
+
+    def test_view_scores_csv_is_filtered(self):
+        self.client.force_login(self.teacher.user)
+        response = self.client.get(reverse('academic:view_scores'), {'export': 'csv', 'term': 2})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [','.join(HEADER)])
+
+    def test_xlsx(self):
+        response = export_results(Result.objects.all(), 'xlsx', 'results')
+        if importlib.util.find_spec('openpyxl') is None:
+            self.assertEqual(response.status_code, 400)
+            return
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), HEADER)
+        self.assertEqual(len(rows), 7)
+
+
+class ExamTypeMigrationTests(ResultFixtures, TestCase):
+    """Migration 0009 splits old exam types into term/assessment and files results under a session"""
+
+    def test_split_exam_types(self):
+        migration = importlib.import_module('academic.migrations.0009_result_session_term_assessment')
+        rows = [
+            ('term2_test_1', '2026-01-15'),
+            ('term1_overall', '2025-09-01'),
+            ('exam', '2025-08-31'),
+            ('termly_review', '2025-10-01'),
+        ]
+        # bulk_create skips Result.save(), leaving the fields blank as they were before the migration
+        Result.objects.bulk_create([
+            Result(student=self.students[0], subject=self.maths, exam_type=exam_type, score=1,
+                   date_taken=date_taken, recorded_by=self.teacher)
+            for exam_type, date_taken in rows
+        ])
+        migration.split_exam_types(django_apps, None)
+
+        split = {
+            exam_type: (term, assessment, session)
+            for exam_type, term, assessment, session in Result.objects.filter(
+                exam_type__in=[exam_type for exam_type, _ in rows]
+            ).values_list('exam_type', 'term', 'assessment', 'session')
+        }
+        self.assertEqual(split, {
+            'term2_test_1': (2, 'test_1', '2025'),
+            'term1_overall': (1, 'overall', '2025'),
+            'exam': (None, 'exam', '2024'),
+            'termly_review': (None, 'termly_review', '2025'),
+        })
+        # Result.save() files new rows the same way
+        for exam_type, date_taken in rows:
+            self.assertEqual(parse_exam_type(exam_type), split[exam_type][:2])
+            self.assertEqual(session_for_date(date_taken), split[exam_type][2])
+
+
+class ExistingScoresTests(ResultFixtures, TestCase):
+
+    def setUp(self):
+        for student, score in [(self.students[0], 15), (self.students[1], 12)]:
+            Result.objects.create(
+                student=student, subject=self.maths, exam_type='term1_test_1', score=score, max_score=20,
+                date_taken='2025-10-02', recorded_by=self.teacher, comment='Keep it up',
+            )
+        Result.objects.create(
+            student=self.students[0], subject=self.maths, exam_type='term1_overall', score=60, max_score=100,
+            date_taken='2025-10-02', recorded_by=self.teacher,
+        )
+
+    def test_scores_load_with_one_query(self):
+        with self.assertNumQueries(1):
+            scores = load_existing_scores(self.teacher, self.maths, self.class_level, 1, '2025')
+        self.assertEqual(len(scores), 5)
+        self.assertNotIn('overall', {row['ca_name'] for row in scores})
+
+        columns = columnar_scores(scores)
+        self.assertEqual(columns['student_ids'], [student.id for student in self.students])
+        self.assertEqual(columns['ca_names'], ['exam', 'test_1'])
+        self.assertEqual(columns['scores'], [[80, 15], [60, 12], [50, None]])
+        self.assertEqual(columns['comments'], ['Keep it up', 'Keep it up', ''])
+
+    def test_columnar_api(self):
+        self.client.force_login(self.teacher.user)
+        response = self.client.get(reverse('academic:api_load_existing_scores'), {
+            'subject_id': self.maths.id, 'class_id': self.class_level.id, 'term': 1, 'session': '2025',
+            'format': 'columnar',
+        })
+        data = response.json()
+        self.assertEqual(data['format'], 'columnar')
+        self.assertEqual(data['scores'], [[80, 15], [60, 12], [50, None]])
+        self.assertEqual(data['total_scores'], 5)
+
+    def test_rank_ties(self):
+        totals = {'a': 90, 'b': 80, 'c': 80, 'd': 70}
+        self.assertEqual(rank(totals), {'a': 1, 'b': 2, 'c': 2, 'd': 4})
+        self.assertEqual(rank(totals, DENSE), {'a': 1, 'b': 2, 'c': 2, 'd': 3})
+        self.assertEqual(rank({'a': 50, 'b': 50}), {'a': 1, 'b': 1})
+        self.assertEqual(rank({}), {})
+
+
+class ReportCardJobTests(ResultFixtures, TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.job = ReportCardJob.objects.create(school=self.school, class_level=self.class_level, session='2025', term=1)
+
+    def test_class_report_cards(self):
+        with self.assertNumQueries(5):
+            cards = class_report_cards(self.school, self.class_level, '2025', 1)
+        self.assertEqual([card['filename'] for card in cards], ['TST000.html', 'TST001.html', 'TST002.html'])
+        # The grades were cached for the next job and the result lists
+        scheme = scheme_for_school(self.school.id)
+        version = ClassLevel.objects.get(pk=self.class_level.pk).results_version
+        with self.assertNumQueries(0):
+            class_grades(self.class_level, self.maths, '2025', 1, scheme=scheme, version=version)
+        self.assertEqual([(card['average'], card['position']) for card in cards], [(60.0, 1), (40.0, 2), (25.0, 3)])
+        self.assertEqual([subject['name'] for subject in cards[0]['subjects']], ['English', 'Mathematics'])
+        self.assertEqual(cards[0]['session'], '2025/2026')
+
+    def test_generate_and_resume(self):
+        progress = []
+        run_job(self.job, workers=1, progress=lambda completed, total: progress.append((completed, total)))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.completed, self.job.total, self.job.progress), ('done', 3, 3, 100))
+        self.assertEqual(progress[0], (0, 3))
+        with zipfile.ZipFile(self.job.output.path) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['SS_1A/TST000.html', 'SS_1A/TST001.html', 'SS_1A/TST002.html'])
+            self.assertIn('Mathematics', archive.read('SS_1A/TST000.html').decode())
+
+        # An interrupted job only renders the cards that are missing
+        os.remove(os.path.join(job_dir(self.job), 'SS_1A', 'TST001.html'))
+        progress = []
+        with mock.patch('academic.report_cards.ProcessPoolExecutor') as pool:
+            pool.return_value.__enter__.return_value.submit.side_effect = (
+                lambda function, *args: mock.Mock(result=lambda: function(*args))
+            )
+            with mock.patch('academic.report_cards.as_completed', side_effect=list):
+                run_job(self.job, progress=lambda completed, total: progress.append((completed, total)))
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        self.assertEqual(pool.return_value.__enter__.return_value.submit.call_count, 1)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.completed), ('done', 3))
+        with zipfile.ZipFile(self.job.output.path) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_failed_job_is_recorded(self):
+        with mock.patch('academic.report_cards.class_report_cards', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                run_job(self.job)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.error), ('failed', 'boom'))
+
+
+class ScoreImportTests(ResultFixtures, TestCase):
+
+    CSV = (
+        "Admission No,Score,Max,Comment\n"
+        "TST000,15,20,Good\n"
+        "TST001,12.5,20,\n"
+        "TST999,10,,\n"
+        "TST002,abc,,\n"
+        ",,,\n"
+        "TST002,25,20,\n"
+        "TST001,18,,\n"
+    )
+
+    def upload(self, content=None, name='scores.csv'):
+        return SimpleUploadedFile(name, (self.CSV if content is None else content).encode('utf-8'), content_type='text/csv')
+
+    def test_import_valid_and_invalid_rows(self):
+        saved, errors = import_scores(
+            self.teacher, self.class_level, self.maths, 'term1_test_1', 20, datetime.date(2025, 10, 5),
+            iter_upload_rows(self.upload()),
+        )
+        self.assertEqual(saved, 2)
+        self.assertEqual([(error['row'], error['admission_number'], error['error']) for error in errors], [
+            (3, 'TST001', 'Scores must be whole numbers'),
+            (4, 'TST999', "No student with admission number 'TST999' in SS 1A"),
+            (5, 'TST002', 'Score must be a number'),
+            (7, 'TST002', 'Score must be between 0 and 20'),
+        ])
+        rows = Result.objects.filter(assessment='test_1').order_by('student__admission_number').values_list(
+            'student__admission_number', 'score', 'max_score', 'comment', 'session', 'term'
+        )
+        self.assertEqual(list(rows), [('TST000', 15, 20, 'Good', '2025', 1), ('TST001', 18, 20, '', '2025', 1)])
+        self.assertEqual(StudentTermSummary.objects.get(student=self.students[0], term=1).result_count, 3)
+
+        report = error_report_csv(errors).splitlines()
+        self.assertEqual(report[0], 'row,admission_number,score,error')
+        self.assertEqual(report[1], '3,TST001,12.5,Scores must be whole numbers')
+
+        # Importing the same file again updates the rows instead of adding more
+        import_scores(
+            self.teacher, self.class_level, self.maths, 'term1_test_1', 20, datetime.date(2025, 10, 5),
+            iter_upload_rows(self.upload()),
+        )
+        self.assertEqual(Result.objects.filter(assessment='test_1').count(), 2)
+
+    def test_unreadable_files(self):
+        with self.assertRaisesMessage(ScoreImportError, 'Missing column(s): score'):
+            list(iter_upload_rows(self.upload('Admission No,Mark Sheet\nTST000,1\n')))
+        with self.assertRaisesMessage(ScoreImportError, 'Upload a .csv or .xlsx file'):
+            iter_upload_rows(self.upload(name='scores.txt'))
+
+    def test_upload_view_returns_error_report(self):
+        self.client.force_login(self.teacher.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        form = {
+            'class_level': self.class_level.id, 'subject': self.maths.id, 'exam_type': 'term1_test_1',
+            'max_score': 20, 'date_taken': '2025-10-05',
+        }
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('academic:upload_scores'), {**form, 'scores_file': self.upload()})
+        data = response.json()
+        self.assertEqual((data['success'], data['created_count'], data['error_count']), (False, 2, 4))
+        self.assertIn('7,TST002,25,Score must be between 0 and 20', data['error_report'])
+        # Nothing is written where it could be downloaded without logging in
+        self.assertEqual(os.listdir(media_root), [])
+
+        response = self.client.post(reverse('academic:upload_scores'), {
+            **form, 'date_taken': '05/10/2025', 'scores_file': self.upload(),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Date taken must be a date (YYYY-MM-DD)')
+        response = self.client.post(reverse('academic:upload_scores'), {
+            **form, 'class_level': 0, 'scores_file': self.upload(),
+        })
+        self.assertEqual((response.status_code, response.json()['success']), (400, False))
+
+
+class SpreadsheetSaveTests(ResultFixtures, TestCase):
+
+    class Rollback(Exception):
+        pass
+
+    def payload(self):
+        return [
+            {
+                'student_id': student.id, 'comment': 'Good', 'total_score': 10 + i, 'position': i + 1,
+                'ca_scores': [
+                    {'ca_name': 'Test 1', 'score': 5 + i, 'max_score': 10},
+                    {'ca_name': 'Test 2', 'score': 4 + i, 'max_score': 10},
+                ],
+            }
+            for i, student in enumerate(self.students)
+        ]
+
+    def saved_rows(self, save):
+        """Rows left after save() runs on top of another teacher's and some older rows; rolled back afterwards"""
+        today = timezone.now().date()
+        try:
+            with transaction.atomic():
+                other = Teacher.objects.create(
+                    user=User.objects.create_user('other', password='pass', user_type='teacher', school=self.school),
+                    school=self.school,
+                )
+                Result.objects.create(
+                    student=self.students[0], subject=self.maths, exam_type='term1_test_1', score=9, max_score=10,
+                    date_taken=today, recorded_by=other,
+                )
+                Result.objects.create(
+                    student=self.students[1], subject=self.maths, exam_type='term1_test_1', score=1, max_score=10,
+                    date_taken=today - timedelta(days=7), recorded_by=self.teacher,
+                )
+                save()
+                # As save_spreadsheet_results does after the write
+                recompute_positions(self.class_level, self.maths, session_key(None), 1)
+                rows = sorted(Result.objects.filter(subject=self.maths).exclude(exam_type='term1_exam').values_list(
+                    'student_id', 'exam_type', 'recorded_by__user__username', 'score', 'max_score', 'date_taken', 'session'
+                ))
+                raise self.Rollback
+        except self.Rollback:
+            pass
+        return rows
+
+    def test_bulk_save_matches_per_cell_save(self):
+        legacy = BenchmarkCommand().legacy_save
+        per_cell = self.saved_rows(lambda: legacy(self.teacher, self.maths, self.class_level, self.payload()))
+        bulk = self.saved_rows(lambda: save_spreadsheet_rows(self.teacher, self.maths, self.class_level, 1, None, self.payload()))
+        self.assertEqual(bulk, per_cell)
+        # The other teacher's row for the same cell is kept as it was
+        self.assertIn((self.students[0].id, 'term1_test_1', 'other', 9, 10, timezone.now().date(), session_key(None)), bulk)
+        self.assertEqual(len(bulk), 10)
+
+    def test_older_duplicates_are_not_moved_onto_each_other(self):
+        today = timezone.now().date()
+        for days, score in [(14, 1), (7, 2)]:
+            Result.objects.create(
+                student=self.students[0], subject=self.maths, exam_type='term1_test_1', score=score, max_score=10,
+                date_taken=today - timedelta(days=days), recorded_by=self.teacher,
+            )
+        saved, errors = save_spreadsheet_rows(self.teacher, self.maths, self.class_level, 1, None, self.payload())
+        self.assertEqual((saved, errors), (9, []))
+        rows = Result.objects.filter(student=self.students[0], exam_type='term1_test_1').order_by('date_taken')
+        self.assertEqual([(row.date_taken, row.score) for row in rows], [(today - timedelta(days=14), 1), (today, 5)])
+
+    def test_bad_row_is_reported_and_the_rest_saved(self):
+        payload = self.payload()
+        payload[1]['ca_scores'][0]['score'] = 'abc'
+        payload[2]['ca_scores'][1]['score'] = 11
+        saved, errors = save_spreadsheet_rows(self.teacher, self.maths, self.class_level, 1, None, payload)
+        self.assertEqual(saved, 3)
+        self.assertEqual(errors, [
+            f"Error saving student {self.students[1].id}: 'abc' is not a number",
+            f"Error saving student {self.students[2].id}: score 11 must be between 0 and 10",
+        ])
+        self.assertEqual(
+            sorted(Result.objects.filter(exam_type__startswith='term1_test').values_list('student_id', flat=True)),
+            [self.students[0].id] * 2,
+        )
+
+
+class SpreadsheetDeltaTests(ResultFixtures, TestCase):
+
+    def setUp(self):
+        ClassSubject.objects.create(class_level=self.class_level, subject=self.maths, teacher=self.teacher)
+
+    def save(self, version, cells, comments=None):
+        return save_spreadsheet_delta(self.teacher, self.maths, self.class_level, 1, '2025', version, cells, comments)
+
+    def test_delta_save_and_conflicts(self):
+        student = self.students[0]
+        cell = {'student_id': student.id, 'ca_name': 'Test 1', 'score': 15, 'max_score': 20, 'base_score': None}
+        saved_count, conflicts, version = self.save(0, [cell], {student.id: 'Good'})
+        self.assertEqual((saved_count, conflicts, version), (2, [], 1))
+        overall = Result.objects.get(student=student, subject=self.maths, assessment=Result.OVERALL)
+        self.assertEqual((overall.score, overall.comment), (78, 'Good'))  # (80 + 75) / 2
+
+        # A second client still on version 0 edits the same cell and a fresh one
+        other = {'student_id': self.students[1].id, 'ca_name': 'Test 1', 'score': 10, 'max_score': 20, 'base_score': None}
+        saved_count, conflicts, version = self.save(0, [dict(cell, score=5), other])
+        self.assertEqual((saved_count, version), (1, 2))
+        self.assertEqual(conflicts, [
+            {'student_id': student.id, 'ca_name': 'test_1', 'score': 15, 'max_score': 20, 'comment': 'Good'}
+        ])
+        self.assertEqual(grid_version(self.class_level, self.maths, '2025', 1), 2)
+
+    def test_replayed_batch_is_not_written_twice(self):
+        self.client.force_login(self.teacher.user)
+        payload = {
+            'class_id': self.class_level.id, 'subject_id': self.maths.id, 'term': 1, 'session': '2025', 'version': 0,
+            'cells': [{'student_id': self.students[0].id, 'ca_name': 'Test 1', 'score': 15, 'max_score': 20, 'base_score': None}],
+        }
+        url = reverse('academic:save_spreadsheet_delta')
+        first = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'batch-1'})
+        with self.assertNumQueries(3):  # session, user and the stored key
+            replay = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'batch-1'})
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(grid_version(self.class_level, self.maths, '2025', 1), 1)
+
+    def test_full_save_with_stale_version_is_rejected(self):
+        self.client.force_login(self.teacher.user)
+        payload = {'class_id': self.class_level.id, 'subject_id': self.maths.id, 'term': 1, 'session': '2025', 'results': []}
+        response = self.client.post(
+            reverse('academic:save_spreadsheet_results'), dict(payload, version=0), content_type='application/json'
+        )
+        self.assertEqual(response.json()['version'], 1)
+        response = self.client.post(
+            reverse('academic:save_spreadsheet_results'), dict(payload, version=0), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class AssignmentFanOutTests(ResultFixtures, TestCase):
+
+    def assignment(self, **kwargs):
+        return Assignment.objects.create(
+            title='Essay', subject=self.maths, teacher=self.teacher, due_date='2030-01-01T00:00Z', **kwargs
+        )
+
+    def test_bulk_fan_out(self):
+        assignment = self.assignment()
+        with self.assertNumQueries(7):  # savepoint, classes.set (3), students, one INSERT, counter
+            self.assertEqual(fan_out(assignment, [self.class_level.id], self.school), 3)
+        self.assertEqual(StudentAssignment.objects.filter(assignment=assignment).count(), 3)
+
+    def test_lazy_rows_are_created_on_first_view(self):
+        assignment = self.assignment(lazy_submissions=True)
+        fan_out(assignment, [self.class_level.id], self.school)
+        student = self.students[0]
+        self.assertFalse(StudentAssignment.objects.exists())
+        self.assertEqual(pending_count(student), 1)
+
+        self.assertEqual(materialize(student), 1)
+        self.assertEqual(materialize(student), 0)
+        self.assertEqual(pending_count(student), 1)
+        self.assertEqual(StudentAssignment.objects.get().student, student)
+
+    def test_counters(self):
+        assignment = self.assignment(max_score=20)
+        fan_out(assignment, [self.class_level.id], self.school)
+        first, second, _ = StudentAssignment.objects.filter(assignment=assignment).order_by('id')
+        self.assertTrue(submit(first))
+        self.assertFalse(submit(first))
+        submit(second)
+        grade(first, 15)
+        grade(second, 10)
+        grade(second, 12)
+        assignment.refresh_from_db()
+        self.assertEqual(
+            (assignment.assigned_count, assignment.submitted_count, assignment.graded_count, assignment.score_sum),
+            (3, 2, 2, 27)
+        )
+        self.assertEqual(assignment.average_percentage, 67.5)
+
+        Assignment.objects.filter(pk=assignment.pk).update(submitted_count=0, score_sum=0)
+        self.assertEqual(reconcile_counters(), 1)
+        assignment.refresh_from_db()
+        self.assertEqual((assignment.submitted_count, assignment.score_sum), (2, 27))
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_teacher_assignment_list_queries(self):
+        for _ in range(3):
+            fan_out(self.assignment(), [self.class_level.id], self.school)
+        self.client.force_login(self.teacher.user)
+        with self.assertNumQueries(5):  # session, user, teacher, school, assignments with subjects
+            response = self.client.get(reverse('academic:teacher_assignments'))
+        self.assertContains(response, '0/3 submitted', count=3)
+
+    def test_download_submissions_zip(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        assignment = self.assignment()
+        fan_out(assignment, [self.class_level.id], self.school)
+        with override_settings(MEDIA_ROOT=media_root):
+            first, second, third = StudentAssignment.objects.filter(assignment=assignment).order_by('student__admission_number')
+            first.submitted_file = SimpleUploadedFile('essay.PDF', b'%PDF ' + b'x' * 200000)
+            submit(first)
+            second.submitted_file = SimpleUploadedFile('essay.txt', b'my essay')
+            submit(second)
+            third.submitted_file = SimpleUploadedFile('lost.txt', b'deleted from disk')
+            submit(third)
+            os.remove(third.submitted_file.path)
+
+            self.client.force_login(self.teacher.user)
+            response = self.client.get(reverse('academic:download_submissions', args=[assignment.id]))
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            with self.assertLogs('academic.exports', 'WARNING') as logs:
+                archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn(f'Submission {third.id}', logs.output[0])
+        names = archive.namelist()
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[0].startswith(first.student.admission_number) and names[0].endswith('.pdf'))
+        self.assertEqual(archive.read(names[0]), b'%PDF ' + b'x' * 200000)
+        self.assertEqual(archive.read(names[1]), b'my essay')
+
+    def test_identical_uploads_share_a_blob(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        assignment = self.assignment()
+        fan_out(assignment, [self.class_level.id], self.school)
+        first, second, third = StudentAssignment.objects.filter(assignment=assignment).order_by('id')
+        with override_settings(MEDIA_ROOT=media_root):
+            for submission, name in [(first, 'essay.pdf'), (second, 'copy.PDF')]:
+                submission.submitted_file = SimpleUploadedFile(name, b'the same essay')
+                submission.save()
+            third.submitted_file = SimpleUploadedFile('own.pdf', b'my own essay')
+            third.save()
+            self.assertEqual(first.submitted_file.name, second.submitted_file.name)
+            self.assertEqual(dict(StoredBlob.objects.values_list('name', 'refs')), {
+                first.submitted_file.name: 2, third.submitted_file.name: 1,
+            })
+
+            second.delete()
+            third = StudentAssignment.objects.get(pk=third.pk)
+            own = third.submitted_file.name
+            third.submitted_file = None
+            third.save()
+            self.assertEqual(StoredBlob.objects.get(name=own).refs, 0)
+
+            self.assertEqual(collect_garbage(grace=timedelta(0)), (1, len(b'my own essay')))
+            self.assertFalse(os.path.exists(os.path.join(media_root, own)))
+            self.assertEqual(list(StoredBlob.objects.values_list('name', 'refs')), [(first.submitted_file.name, 1)])
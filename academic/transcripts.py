@@ -0,0 +1,168 @@
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+from django.utils import timezone
+
+from users.models import Student
+from .grading import scheme_for_school, weight_expression
+from .models import Result, StudentTermSummary, TranscriptSnapshot, session_for_date
+
+
+def current_session():
+    return session_for_date(timezone.now().date())
+
+
+def _average(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def subject_term_totals(student_ids, sessions, weights=None):
+    """
+    {(student_id, session): {subject_name: {term: total}}} from one grouped
+    query. A term total is the weighted average percentage of the student's
+    CA results in that subject, the same figure the class gradebook uses.
+    """
+    weight = weight_expression(weights)
+    rows = Result.objects.filter(
+        student_id__in=student_ids,
+        session__in=sessions,
+        term__isnull=False,
+        max_score__gt=0,
+    ).exclude(assessment=Result.OVERALL).values('student_id', 'session', 'subject__name', 'term').annotate(
+        weighted=Sum(F('score') * 100.0 / F('max_score') * weight, output_field=FloatField()),
+        weight=Sum(weight, output_field=FloatField()),
+    ).order_by().values_list('student_id', 'session', 'subject__name', 'term', 'weighted', 'weight')
+
+    totals = {}
+    for student_id, session, subject_name, term, weighted, weight_sum in rows:
+        if weight_sum:
+            totals.setdefault((student_id, session), {}).setdefault(subject_name, {})[str(term)] = round(
+                weighted / weight_sum, 1
+            )
+    return totals
+
+
+def session_record(summaries, subjects):
+    """
+    One session of a transcript from its term summaries and
+    {subject_name: {term: total}}. Annual figures average the terms taken.
+    """
+    result_count = sum(summary.result_count for summary in summaries)
+    percentage_sum = sum(summary.percentage_sum for summary in summaries)
+    return {
+        'terms': {
+            str(summary.term): round(summary.average_percentage, 1)
+            for summary in summaries if summary.term and summary.result_count
+        },
+        'annual_average': round(percentage_sum / result_count, 1) if result_count else None,
+        'result_count': result_count,
+        'percentage_sum': percentage_sum,
+        'subjects': [
+            {'name': name, 'terms': terms, 'annual': _average(terms.values())}
+            for name, terms in sorted(subjects.items())
+        ],
+    }
+
+
+def build_records(student_ids, sessions, weights=None):
+    """{(student_id, session): session_record} for many students with two queries"""
+    summaries = {}
+    for summary in StudentTermSummary.objects.filter(student_id__in=student_ids, session__in=sessions):
+        summaries.setdefault((summary.student_id, summary.session), []).append(summary)
+    subjects = subject_term_totals(student_ids, sessions, weights)
+    return {
+        key: session_record(summaries.get(key, []), subjects.get(key, {}))
+        for key in set(summaries) | set(subjects)
+    }
+
+
+def freeze_session(session, student_ids=None, refreeze=False, batch_size=500):
+    """
+    Snapshot a finished session for every student with results in it (or just
+    student_ids). Existing snapshots are left alone unless refreeze is set.
+    Returns the number of snapshots written.
+    """
+    if session >= current_session():
+        raise ValueError(f"Session {session} has not finished yet")
+
+    if student_ids is None:
+        student_ids = StudentTermSummary.objects.filter(session=session).values_list('student_id', flat=True)
+    student_ids = sorted(set(student_ids))
+    students = dict(Student.objects.filter(id__in=student_ids).values_list('id', 'school_id'))
+
+    written = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        if not refreeze:
+            frozen = set(TranscriptSnapshot.objects.filter(student_id__in=batch, session=session).values_list(
+                'student_id', flat=True
+            ))
+            batch = [student_id for student_id in batch if student_id not in frozen]
+
+        # Weights differ per school, so group the batch by school
+        by_school = {}
+        for student_id in batch:
+            by_school.setdefault(students.get(student_id), []).append(student_id)
+        snapshots = []
+        for school_id, school_students in by_school.items():
+            records = build_records(school_students, [session], scheme_for_school(school_id).weights)
+            snapshots += [
+                TranscriptSnapshot(student_id=student_id, session=session, data=record)
+                for (student_id, _), record in records.items()
+            ]
+        with transaction.atomic():
+            TranscriptSnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=refreeze,
+                unique_fields=['student', 'session'] if refreeze else None,
+                update_fields=['data'] if refreeze else None,
+                ignore_conflicts=not refreeze,
+            )
+        written += len(snapshots)
+    return written
+
+
+def student_transcript(student):
+    """
+    A student's transcript: every session with term, annual and per-subject
+    averages, plus cumulative averages across sessions.
+
+    Finished sessions are read from their snapshots, and any finished session
+    without one is frozen on the way, so only the current session is ever
+    computed from results.
+    """
+    snapshots = {snapshot.session: snapshot.data for snapshot in student.transcript_snapshots.all()}
+    open_sessions = set(StudentTermSummary.objects.filter(student=student).exclude(
+        session__in=list(snapshots) + ['']
+    ).values_list('session', flat=True))
+
+    records = dict(snapshots)
+    if open_sessions:
+        weights = scheme_for_school(student.school_id).weights
+        for (_, session), record in build_records([student.id], open_sessions, weights).items():
+            records[session] = record
+        finished = [session for session in open_sessions if session < current_session() and session in records]
+        if finished:
+            TranscriptSnapshot.objects.bulk_create(
+                [TranscriptSnapshot(student=student, session=session, data=records[session]) for session in finished],
+                ignore_conflicts=True,
+            )
+
+    sessions = []
+    subjects = {}
+    for session in sorted(records):
+        record = records[session]
+        sessions.append(dict(record, session=session, frozen=session in snapshots or session < current_session()))
+        for subject in record['subjects']:
+            subjects.setdefault(subject['name'], {})[session] = subject['annual']
+
+    result_count = sum(record['result_count'] for record in records.values())
+    percentage_sum = sum(record['percentage_sum'] for record in records.values())
+    return {
+        'sessions': sessions,
+        'subjects': [
+            {'name': name, 'annual': annual, 'cumulative': _average(annual.values())}
+            for name, annual in sorted(subjects.items())
+        ],
+        'cumulative_average': round(percentage_sum / result_count, 1) if result_count else None,
+    }
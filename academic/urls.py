@@ -10,6 +10,8 @@ urlpatterns = [
     path('teacher/assignments/create/', views.create_assignment, name='create_assignment'),
     # path('teacher/assignments/<int:assignment_id>/edit/', views.edit_assignment, name='edit_assignment'),
     path('assignment/<int:assignment_id>/submissions/', views.assignment_submissions, name='assignment_submissions'),
+    path('assignment/<int:assignment_id>/submissions/download/', views.download_submissions, name='download_submissions'),
+    path('submission/<int:student_assignment_id>/grade/', views.grade_submission, name='grade_submission'),
     path('assignment/<int:assignment_id>/edit/', views.edit_assignment, name='edit_assignment'),
     path('assignment/<int:assignment_id>/delete/', views.delete_assignment, name='delete_assignment'),
 
@@ -20,6 +22,8 @@ urlpatterns = [
     path('edit-result/<int:result_id>/', views.edit_result, name='edit_result'),
     path('subject-results-spreadsheet/', views.subject_results_spreadsheet, name='subject_results_spreadsheet'),
     path('save-spreadsheet-results/', views.save_spreadsheet_results, name='save_spreadsheet_results'),
+    path('save-spreadsheet-delta/', views.save_spreadsheet_delta_view, name='save_spreadsheet_delta'),
+    path('spreadsheet-sync-worker.js', views.spreadsheet_sync_worker, name='spreadsheet_sync_worker'),
         
     
     
@@ -29,11 +33,14 @@ urlpatterns = [
     path('assignments/<int:assignment_id>/', views.assignment_detail, name='assignment_detail'),
     path('assignments/submit/<int:student_assignment_id>/', views.submit_assignment, name='submit_assignment'),
     path('student/results/', views.student_results, name='student_results'),  # Student's own results
+    path('student/transcript/', views.transcript, name='transcript'),
     path('student/fees/', views.student_fees, name='student_fees'),
     
     # ===== ADMIN/OTHER URLS =====
     path('student/results/<int:student_id>/', views.student_results_admin, name='student_results_admin'),  # Admin viewing any student
     path('admin/student/<int:student_id>/results/', views.admin_student_results, name='admin_student_results'),
+    path('student/transcript/<int:student_id>/', views.transcript, name='student_transcript_admin'),
+    path('broadsheet/<int:class_id>/', views.class_broadsheet, name='class_broadsheet'),
     
     # ===== API ENDPOINTS =====
     path('api/class-subjects/<int:class_id>/', views.api_class_subjects, name='api_class_subjects'),
@@ -3,14 +3,31 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Subject, Assignment, StudentAssignment, Result, ClassLevel, Result, ClassSubject  
 from django.utils import timezone
+from django.utils.text import get_valid_filename
 from users.models import Teacher, Student
-from schools.models import StudentFee, FeePayment
+from schools.models import StudentFee, FeePayment, FeeBalance
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 import json
+import datetime
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.db import transaction
 import os
+from .spreadsheet import save_spreadsheet_rows, load_existing_scores, columnar_scores, scores_gradebook, session_key
+from .spreadsheet import grid_version, lock_grid, bump_grid, save_spreadsheet_delta
+from .ranking import recompute_positions
+from .summaries import student_average
+from .stats import result_stats
+from .exports import export_results, stream_submissions_zip
+from .pagination import keyset_page, render_rows
+from .grading import attach_grades, scheme_for_school
+from .broadsheet import broadsheet_csv, class_broadsheet as get_class_broadsheet
+from .models import term_for_date
+from .transcripts import student_transcript
+from .idempotency import idempotent
+from .assignments import fan_out, grade, materialize, pending_count, student_assignment_for, submit
+from .score_import import ScoreImportError, import_scores, iter_upload_rows, error_report_csv
 
 # from academic.models import ClassLevel
 
@@ -74,7 +91,7 @@ def teacher_subjects(request):
 @login_required
 def teacher_assignments(request):
     teacher = get_object_or_404(Teacher, user=request.user)
-    assignments = Assignment.objects.filter(teacher=teacher).order_by('-created_at')
+    assignments = Assignment.objects.filter(teacher=teacher).select_related('subject').order_by('-created_at')
     
     return render(request, 'academic/teacher_assignments.html', {
         'teacher': teacher,
@@ -107,7 +124,7 @@ def teacher_students(request):
 @login_required
 def teacher_assignments(request):
     teacher = get_object_or_404(Teacher, user=request.user)
-    assignments = Assignment.objects.filter(teacher=teacher).order_by('-created_at')
+    assignments = Assignment.objects.filter(teacher=teacher).select_related('subject').order_by('-created_at')
     
     return render(request, 'academic/teacher_assignments.html', {
         'teacher': teacher,
@@ -155,7 +172,8 @@ def create_assignment(request):
             subject=subject,
             teacher=teacher,
             due_date=due_date,
-            max_score=max_score
+            max_score=max_score,
+            lazy_submissions=bool(request.POST.get('lazy_submissions'))
         )
         
         # Handle file upload
@@ -172,15 +190,10 @@ def create_assignment(request):
                 })
             assignment.assignment_file = assignment_file
         
-        assignment.save()
-        
-        # Create StudentAssignment records for all students in the school
-        students = Student.objects.filter(school=teacher.school, class_level_id__in=class_ids)
-        for student in students:
-            StudentAssignment.objects.create(
-                assignment=assignment,
-                student=student
-            )
+        # Create StudentAssignment records for every student in the selected classes
+        with transaction.atomic():
+            assignment.save()
+            fan_out(assignment, class_ids, teacher.school)
         
         messages.success(request, 'Assignment created successfully!')
         return redirect('academic:teacher_assignments')
@@ -203,13 +216,47 @@ def create_assignment(request):
 
 @login_required
 def assignment_submissions(request, assignment_id):
-    assignment = get_object_or_404(Assignment, id=assignment_id, teacher=request.user.teacher)
-    submissions = StudentAssignment.objects.filter(assignment=assignment)
+    assignment = get_object_or_404(Assignment.objects.select_related('subject'), id=assignment_id, teacher=request.user.teacher)
+    submissions = StudentAssignment.objects.filter(assignment=assignment).select_related(
+        'student__user', 'student__class_level'
+    ).order_by('-is_submitted', 'student__admission_number')
     return render(request, 'academic/assignment_submissions.html', {
         'assignment': assignment,
-        'submissions': submissions
+        'submissions': submissions,
+        'school': request.user.teacher.school
     })
 
+@login_required
+def download_submissions(request, assignment_id):
+    """All submitted files for an assignment as one zip, streamed as it is built"""
+    assignment = get_object_or_404(Assignment, id=assignment_id, teacher__user=request.user)
+    filename = get_valid_filename(f"{assignment.title} submissions")
+    return stream_submissions_zip(StudentAssignment.objects.filter(assignment=assignment), filename)
+
+@login_required
+@require_http_methods(["POST"])
+def grade_submission(request, student_assignment_id):
+    student_assignment = get_object_or_404(
+        StudentAssignment.objects.select_related('assignment'),
+        id=student_assignment_id,
+        assignment__teacher__user=request.user
+    )
+    assignment = student_assignment.assignment
+    
+    score = request.POST.get('score', '').strip()
+    try:
+        score = float(score) if score else None
+    except ValueError:
+        messages.error(request, 'Score must be a number.')
+        return redirect('academic:assignment_submissions', assignment_id=assignment.id)
+    if score is not None and not 0 <= score <= assignment.max_score:
+        messages.error(request, f'Score must be between 0 and {assignment.max_score}.')
+        return redirect('academic:assignment_submissions', assignment_id=assignment.id)
+    
+    grade(student_assignment, score, request.POST.get('feedback', ''))
+    messages.success(request, f'Grade saved for {student_assignment.student}.')
+    return redirect('academic:assignment_submissions', assignment_id=assignment.id)
+
 @login_required
 def edit_assignment(request, assignment_id):
     assignment = get_object_or_404(Assignment, id=assignment_id, teacher=request.user.teacher)
@@ -424,62 +471,67 @@ def upload_scores(request):
                 created_count = 0
                 errors = []
                 
-                for result_item in results_data:
-                    try:
-                        student_id = result_item.get('student_id')
-                        score_value = result_item.get('score')
+                # One transaction, so the result signals refresh the summaries and
+                # class positions once at the end instead of after every row
+                with transaction.atomic():
+                    for result_item in results_data:
+                        try:
+                            student_id = result_item.get('student_id')
+                            score_value = result_item.get('score')
                         
-                        print(f"Processing student ID: {student_id}, score: {score_value}")
+                            print(f"Processing student ID: {student_id}, score: {score_value}")
                         
-                        if not student_id or score_value is None or score_value == '':
-                            errors.append(f"Missing student ID or score for one entry")
-                            continue
+                            if not student_id or score_value is None or score_value == '':
+                                errors.append(f"Missing student ID or score for one entry")
+                                continue
                         
-                        # Get student object
-                        student = Student.objects.get(id=student_id)
+                            # Get student object
+                            student = Student.objects.get(id=student_id)
                         
-                        # Check if student belongs to the selected class
-                        if student.class_level.id != int(class_level_id):
-                            errors.append(f"Student {student.user.get_full_name()} is not in the selected class")
-                            continue
+                            # Check if student belongs to the selected class
+                            if student.class_level.id != int(class_level_id):
+                                errors.append(f"Student {student.user.get_full_name()} is not in the selected class")
+                                continue
                         
-                        # Check if result already exists (based on unique_together constraint)
-                        existing_result = Result.objects.filter(
-                            student=student,
-                            subject=subject,
-                            exam_type=exam_type,
-                            date_taken=date_taken
-                        ).first()
+                            # One savepoint per row so a failed row leaves the others saved
+                            with transaction.atomic():
+                                # Check if result already exists (based on unique_together constraint)
+                                existing_result = Result.objects.filter(
+                                    student=student,
+                                    subject=subject,
+                                    exam_type=exam_type,
+                                    date_taken=date_taken
+                                ).first()
                         
-                        if existing_result:
-                            # Update existing result
-                            existing_result.score = score_value
-                            existing_result.max_score = max_score
-                            existing_result.save()
-                            print(f"UPDATED Existing Result: {existing_result}")
-                        else:
-                            # Create new Result object
-                            result = Result.objects.create(
-                                student=student,
-                                subject=subject,
-                                exam_type=exam_type,
-                                score=score_value,
-                                max_score=max_score,
-                                date_taken=date_taken,
-                                recorded_by=teacher
-                            )
-                            print(f"CREATED New Result: {result}")
+                                if existing_result:
+                                    # Update existing result
+                                    existing_result.score = score_value
+                                    existing_result.max_score = max_score
+                                    existing_result.save()
+                                    print(f"UPDATED Existing Result: {existing_result}")
+                                else:
+                                    # Create new Result object
+                                    result = Result.objects.create(
+                                        student=student,
+                                        subject=subject,
+                                        exam_type=exam_type,
+                                        score=score_value,
+                                        max_score=max_score,
+                                        date_taken=date_taken,
+                                        recorded_by=teacher
+                                    )
+                                    print(f"CREATED New Result: {result}")
                         
-                        created_count += 1
+                            created_count += 1
                         
-                    except Student.DoesNotExist:
-                        error_msg = f"Student with ID {student_id} does not exist"
-                        errors.append(error_msg)
-                        print(f"ERROR: {error_msg}")
-                    except Exception as e:
-                        error_msg = f"Error creating result for student {student_id}: {str(e)}"
-                        errors.append(error_msg)
-                        print(f"ERROR: {error_msg}")
+                        except Student.DoesNotExist:
+                            error_msg = f"Student with ID {student_id} does not exist"
+                            errors.append(error_msg)
+                            print(f"ERROR: {error_msg}")
+                        except Exception as e:
+                            error_msg = f"Error creating result for student {student_id}: {str(e)}"
+                            errors.append(error_msg)
+                            print(f"ERROR: {error_msg}")
                 
                 print(f"Successfully processed {created_count} results")
                 print(f"Errors: {errors}")
@@ -512,6 +564,48 @@ def upload_scores(request):
                     'error': f'Server error: {str(e)}'
                 })
         
+        # Handle CSV/XLSX file import
+        elif request.method == 'POST' and request.FILES.get('scores_file'):
+            print("=== PROCESSING FILE IMPORT ===")
+            class_level = ClassLevel.objects.filter(id=request.POST.get('class_level') or 0, school=school).first()
+            subject = Subject.objects.filter(id=request.POST.get('subject') or 0).first()
+            if class_level is None or subject is None:
+                return JsonResponse({'success': False, 'error': 'Choose a class and subject'}, status=400)
+            exam_type = request.POST.get('exam_type')
+            
+            try:
+                max_score = int(request.POST.get('max_score', 100))
+            except (TypeError, ValueError):
+                return JsonResponse({'success': False, 'error': 'Max score must be a whole number'}, status=400)
+            try:
+                date_taken = datetime.date.fromisoformat(request.POST.get('date_taken') or '')
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Date taken must be a date (YYYY-MM-DD)'}, status=400)
+            
+            if not exam_type or max_score <= 0:
+                return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
+            
+            scores_file = request.FILES['scores_file']
+            try:
+                created_count, errors = import_scores(
+                    teacher, class_level, subject, exam_type, max_score, date_taken,
+                    iter_upload_rows(scores_file)
+                )
+            except ScoreImportError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=400)
+            
+            # The report holds admission numbers and scores, so it goes back to
+            # this teacher only, in the response, and is never stored
+            return JsonResponse({
+                'success': not errors,
+                'message': f'Successfully uploaded {created_count} results',
+                'error': f'{len(errors)} rows could not be imported' if errors else '',
+                'created_count': created_count,
+                'error_count': len(errors),
+                'errors': errors[:5],
+                'error_report': error_report_csv(errors) if errors else '',
+            })
+        
         # Handle regular form submission (old method - fallback)
         elif request.method == 'POST':
             print("=== PROCESSING REGULAR FORM SUBMISSION ===")
@@ -689,6 +783,8 @@ def view_results(request):
     class_id = request.GET.get('class_id')
     subject_id = request.GET.get('subject_id')
     exam_type = request.GET.get('exam_type')
+    term = request.GET.get('term')
+    session = request.GET.get('session')
     
     if class_id:
         results = results.filter(student__class_level_id=class_id)
@@ -696,19 +792,38 @@ def view_results(request):
         results = results.filter(subject_id=subject_id)
     if exam_type:
         results = results.filter(exam_type=exam_type)
+    if term:
+        results = results.filter(term=term)
+    if session:
+        results = results.filter(session=session)
+    
+    # Export the filtered list as CSV/XLSX instead of rendering it
+    export_format = request.GET.get('export')
+    if export_format:
+        return export_results(results, export_format, f"results_{timezone.now():%Y%m%d}")
+    
+    # Keyset pagination on (date_taken, id)
+    page, next_cursor = keyset_page(results, request.GET.get('cursor'))
+    if request.GET.get('partial'):
+        return render_rows(request, 'academic/partials/view_results_rows.html', {'results': page}, next_cursor)
     
     # Filter options
     classes = ClassLevel.objects.filter(school=school).distinct()
     subjects = Subject.objects.filter(classsubject__teacher=teacher).distinct()
+    sessions = Result.objects.filter(recorded_by=teacher).exclude(session='').values_list('session', flat=True).distinct().order_by('-session')
     
     context = {
         'school': school,
-        'results': results.order_by('-date_taken'),
+        'results': page,
+        'next_cursor': next_cursor,
         'classes': classes,
         'subjects': subjects,
         'selected_class': class_id,
         'selected_subject': subject_id,
         'selected_exam_type': exam_type,
+        'sessions': sessions,
+        'selected_term': term,
+        'selected_session': session,
     }
     return render(request, 'academic/view_results.html', context)
 
@@ -776,6 +891,8 @@ def view_scores(request):
     class_id = request.GET.get('class_id')
     subject_id = request.GET.get('subject_id')
     exam_type = request.GET.get('exam_type')
+    term = request.GET.get('term')
+    session = request.GET.get('session')
     
     if class_id:
         results = results.filter(student__class_level_id=class_id)
@@ -786,7 +903,25 @@ def view_scores(request):
     if exam_type:
         results = results.filter(exam_type=exam_type)
     
+    if term:
+        results = results.filter(term=term)
+    
+    if session:
+        results = results.filter(session=session)
+    
+    # Export the filtered list as CSV/XLSX instead of rendering it
+    export_format = request.GET.get('export')
+    if export_format:
+        return export_results(results, export_format, f"scores_{timezone.now():%Y%m%d}")
+    
+    # Keyset pagination on (date_taken, id)
+    page, next_cursor = keyset_page(results, request.GET.get('cursor'))
+    if request.GET.get('partial'):
+        return render_rows(request, 'academic/partials/view_scores_rows.html', {'scores': page}, next_cursor)
+    
     # Get filter options
+    sessions = Result.objects.filter(recorded_by=teacher).exclude(session='').values_list('session', flat=True).distinct().order_by('-session')
+    
     classes = ClassLevel.objects.filter(
         classsubject__teacher=teacher,
         school=school
@@ -796,14 +931,21 @@ def view_scores(request):
         classsubject__teacher=teacher
     ).distinct()
     
+    stats = result_stats(results)
+    
     context = {
         'school': school,
-        'scores': results,  # Now passing results instead of scores
+        'scores': page,  # Now passing results instead of scores
+        'next_cursor': next_cursor,
+        'stats': stats,
         'classes': classes,
         'subjects': subjects,
         'selected_class_id': class_id,
         'selected_subject_id': subject_id,
         'selected_exam_type': exam_type,
+        'sessions': sessions,
+        'selected_term': term,
+        'selected_session': session,
     }
     return render(request, 'academic/view_scores.html', context)
 
@@ -823,16 +965,12 @@ def student_dashboard(request):
     # Get subject count
     subject_count = Subject.objects.filter(result__student=student).distinct().count()
     
-    # Calculate average score
-    results = Result.objects.filter(student=student)
-    if results.exists():
-        average_score = sum((result.score / result.max_score * 100) for result in results) / results.count()
-        average_score = round(average_score, 1)
-    else:
-        average_score = 0
+    # Calculate average score from the student's term summaries
+    result_count, average_score = student_average(student)
+    average_score = round(average_score, 1)
     
     # Get pending assignments count
-    assignments_count = StudentAssignment.objects.filter(student=student, is_submitted=False).count()
+    assignments_count = pending_count(student)
     
     context = {
         'school': school,
@@ -848,6 +986,7 @@ def student_dashboard(request):
 @login_required
 def student_assignments(request):
     student = get_object_or_404(Student, user=request.user)
+    materialize(student)
     assignments = StudentAssignment.objects.filter(student=student).select_related('assignment')
     
     return render(request, 'academic/student_assignments.html', {
@@ -857,20 +996,20 @@ def student_assignments(request):
     })
 
 @login_required
-def submit_assignment(request, assignment_id):
+def submit_assignment(request, student_assignment_id):
     student = get_object_or_404(Student, user=request.user)
-    student_assignment = get_object_or_404(StudentAssignment, id=assignment_id, student=student)
+    student_assignment = get_object_or_404(StudentAssignment, id=student_assignment_id, student=student)
     
     if request.method == 'POST':
-        submitted_text = request.POST.get('submitted_text')
-        submitted_file = request.FILES.get('submitted_file')
+        if student_assignment.is_submitted:
+            messages.error(request, 'Assignment has already been submitted.')
+            return redirect('academic:student_assignments')
         
-        student_assignment.submitted_text = submitted_text
+        submitted_file = request.FILES.get('submitted_file')
         if submitted_file:
             student_assignment.submitted_file = submitted_file
-        student_assignment.is_submitted = True
-        student_assignment.submitted_at = timezone.now()
-        student_assignment.save()
+        student_assignment.submission_date = timezone.now()
+        submit(student_assignment)
         
         messages.success(request, 'Assignment submitted successfully!')
         return redirect('academic:student_assignments')
@@ -888,7 +1027,7 @@ def student_results_admin(request, student_id):
         messages.error(request, "You don't have permission to view other students' results.")
         return redirect('core:homepage')
     
-    student = get_object_or_404(Student, id=student_id)
+    student = get_object_or_404(Student.objects.select_related('user', 'school', 'class_level'), id=student_id)
     school = student.school
     
     # Get all results for this student - using Result model
@@ -897,6 +1036,8 @@ def student_results_admin(request, student_id):
     # Filter options
     subject_id = request.GET.get('subject_id')
     exam_type = request.GET.get('exam_type')
+    term = request.GET.get('term')
+    session = request.GET.get('session')
     
     if subject_id:
         results = results.filter(subject_id=subject_id)
@@ -904,25 +1045,39 @@ def student_results_admin(request, student_id):
     if exam_type:
         results = results.filter(exam_type=exam_type)
     
-    # Get unique subjects for filter dropdown
+    if term:
+        results = results.filter(term=term)
+    
+    if session:
+        results = results.filter(session=session)
+    
+    # Get unique subjects and sessions for filter dropdowns
     subjects = Subject.objects.filter(result__student=student).distinct()
+    sessions = Result.objects.filter(student=student).exclude(session='').values_list('session', flat=True).distinct().order_by('-session')
     
-    # Calculate statistics
-    total_results = results.count()
-    if total_results > 0:
-        average_percentage = sum((result.score / result.max_score * 100) for result in results) / total_results
-    else:
-        average_percentage = 0
+    # Keyset pagination on (date_taken, id)
+    page, next_cursor = keyset_page(results, request.GET.get('cursor'))
+    attach_grades(page, scheme_for_school(student.school_id), student.class_level_id)
+    if request.GET.get('partial'):
+        return render_rows(request, 'academic/partials/student_results_rows.html', {'scores': page}, next_cursor)
+    
+    # Calculate statistics in the database
+    stats = result_stats(results)
     
     context = {
         'school': school,
         'student': student,
-        'scores': results,  # Still call it 'scores' in template for consistency
+        'scores': page,  # Still call it 'scores' in template for consistency
+        'next_cursor': next_cursor,
         'subjects': subjects,
         'selected_subject_id': subject_id,
         'selected_exam_type': exam_type,
-        'total_scores': total_results,
-        'average_percentage': round(average_percentage, 1),
+        'sessions': sessions,
+        'selected_term': term,
+        'selected_session': session,
+        'stats': stats,
+        'total_scores': stats['count'],
+        'average_percentage': stats['mean_percentage'],
         'is_admin_view': True,
     }
     return render(request, 'academic/student_results.html', context)
@@ -935,7 +1090,8 @@ def admin_student_results(request, student_id):
         messages.error(request, "Access denied.")
         return redirect('core:homepage')
     
-    student = get_object_or_404(Student, id=student_id)
+    student = get_object_or_404(Student.objects.select_related('user', 'school', 'class_level'), id=student_id)
+    school = student.school
     
     # Get all results for this student
     results = Result.objects.filter(student=student).select_related('subject', 'recorded_by__user').order_by('-date_taken')
@@ -943,6 +1099,8 @@ def admin_student_results(request, student_id):
     # Filter options
     subject_id = request.GET.get('subject_id')
     exam_type = request.GET.get('exam_type')
+    term = request.GET.get('term')
+    session = request.GET.get('session')
     
     if subject_id:
         results = results.filter(subject_id=subject_id)
@@ -950,25 +1108,39 @@ def admin_student_results(request, student_id):
     if exam_type:
         results = results.filter(exam_type=exam_type)
     
-    # Get unique subjects for filter dropdown
+    if term:
+        results = results.filter(term=term)
+    
+    if session:
+        results = results.filter(session=session)
+    
+    # Get unique subjects and sessions for filter dropdowns
     subjects = Subject.objects.filter(result__student=student).distinct()
+    sessions = Result.objects.filter(student=student).exclude(session='').values_list('session', flat=True).distinct().order_by('-session')
     
-    # Calculate statistics
-    total_results = results.count()
-    if total_results > 0:
-        average_percentage = sum((result.score / result.max_score * 100) for result in results) / total_results
-    else:
-        average_percentage = 0
+    # Keyset pagination on (date_taken, id)
+    page, next_cursor = keyset_page(results, request.GET.get('cursor'))
+    attach_grades(page, scheme_for_school(student.school_id), student.class_level_id)
+    if request.GET.get('partial'):
+        return render_rows(request, 'academic/partials/student_results_rows.html', {'scores': page}, next_cursor)
+    
+    # Calculate statistics in the database
+    stats = result_stats(results)
     
     context = {
         'school': school,
         'student': student,
-        'scores': results,  # Still call it 'scores' in template
+        'scores': page,  # Still call it 'scores' in template
+        'next_cursor': next_cursor,
         'subjects': subjects,
         'selected_subject_id': subject_id,
         'selected_exam_type': exam_type,
-        'total_scores': total_results,
-        'average_percentage': round(average_percentage, 1),
+        'sessions': sessions,
+        'selected_term': term,
+        'selected_session': session,
+        'stats': stats,
+        'total_scores': stats['count'],
+        'average_percentage': stats['mean_percentage'],
         'is_admin_view': False,
     }
     return render(request, 'academic/student_results.html', context)
@@ -989,6 +1161,8 @@ def student_results(request):
     # Filter options
     subject_id = request.GET.get('subject_id')
     exam_type = request.GET.get('exam_type')
+    term = request.GET.get('term')
+    session = request.GET.get('session')
     
     if subject_id:
         results = results.filter(subject_id=subject_id)
@@ -996,25 +1170,39 @@ def student_results(request):
     if exam_type:
         results = results.filter(exam_type=exam_type)
     
-    # Get unique subjects for filter dropdown
+    if term:
+        results = results.filter(term=term)
+    
+    if session:
+        results = results.filter(session=session)
+    
+    # Get unique subjects and sessions for filter dropdowns
     subjects = Subject.objects.filter(result__student=student).distinct()
+    sessions = Result.objects.filter(student=student).exclude(session='').values_list('session', flat=True).distinct().order_by('-session')
     
-    # Calculate statistics
-    total_results = results.count()
-    if total_results > 0:
-        average_percentage = sum((result.score / result.max_score * 100) for result in results) / total_results
-    else:
-        average_percentage = 0
+    # Keyset pagination on (date_taken, id)
+    page, next_cursor = keyset_page(results, request.GET.get('cursor'))
+    attach_grades(page, scheme_for_school(student.school_id), student.class_level_id)
+    if request.GET.get('partial'):
+        return render_rows(request, 'academic/partials/student_results_rows.html', {'scores': page}, next_cursor)
+    
+    # Calculate statistics in the database
+    stats = result_stats(results)
     
     context = {
         'school': school,
         'student': student,
-        'scores': results,  # Still call it 'scores' in template
+        'scores': page,  # Still call it 'scores' in template
+        'next_cursor': next_cursor,
         'subjects': subjects,
         'selected_subject_id': subject_id,
         'selected_exam_type': exam_type,
-        'total_scores': total_results,
-        'average_percentage': round(average_percentage, 1),
+        'sessions': sessions,
+        'selected_term': term,
+        'selected_session': session,
+        'stats': stats,
+        'total_scores': stats['count'],
+        'average_percentage': stats['mean_percentage'],
         'is_admin_view': False,
     }
     return render(request, 'academic/student_results.html', context)
@@ -1025,10 +1213,19 @@ def student_fees(request):
     
     student_fees = StudentFee.objects.filter(student=student).select_related('fee_structure')
     
-    # Calculate totals
-    total_due = sum(fee.amount_due for fee in student_fees)
-    total_paid = sum(fee.amount_paid for fee in student_fees)
-    total_balance = total_due - total_paid
+    # Totals come from the ledger's running balance, not from summing fees
+    balance = FeeBalance.objects.filter(student=student).first() or FeeBalance(student=student)
+    total_due = balance.total_due
+    total_paid = balance.paid
+    total_balance = balance.balance
+    unpaid_dates = [fee.due_date for fee in student_fees if fee.balance() > 0]
+    fee_status = {
+        'total_due': total_due,
+        'amount_paid': total_paid,
+        'balance': total_balance,
+        'status': 'paid' if total_balance <= 0 else 'partial' if total_paid > 0 else 'pending',
+        'due_date': min(unpaid_dates) if unpaid_dates else None,
+    }
     
     # Payment history
     payment_history = FeePayment.objects.filter(
@@ -1039,6 +1236,7 @@ def student_fees(request):
         'student': student,
         'student_fees': student_fees,
         'payment_history': payment_history,
+        'fee_status': fee_status,
         'total_due': total_due,
         'total_paid': total_paid,
         'total_balance': total_balance,
@@ -1050,11 +1248,10 @@ def student_fees(request):
 def assignment_detail(request, assignment_id):
     try:
         assignment = get_object_or_404(Assignment, id=assignment_id)
-        student_assignment = get_object_or_404(
-            StudentAssignment, 
-            assignment=assignment, 
-            student__user=request.user
-        )
+        student = get_object_or_404(Student, user=request.user)
+        student_assignment = student_assignment_for(student, assignment)
+        if student_assignment is None:
+            raise Http404("No StudentAssignment matches the given query.")
         
         return render(request, 'academic/assignment_detail.html', {
             'assignment': assignment,
@@ -1101,40 +1298,35 @@ def api_load_existing_scores(request):
     subject_id = request.GET.get('subject_id')
     class_id = request.GET.get('class_id')
     term = request.GET.get('term')
+    session = request.GET.get('session')
     
     try:
         subject = get_object_or_404(Subject, id=subject_id)
         class_level = get_object_or_404(ClassLevel, id=class_id)
         
-        # Get students in this class
-        students = Student.objects.filter(class_level=class_level)
+        scores_data = load_existing_scores(teacher, subject, class_level, term, session)
+        version = grid_version(class_level, subject, session, term)
         
-        # Build scores data
-        scores_data = []
-        for student in students:
-            # Get all results for this student, subject, and term pattern
-            results = Result.objects.filter(
-                student=student,
-                subject=subject,
-                exam_type__startswith=f"term{term}_",
-                recorded_by=teacher
-            )
-            
-            for result in results:
-                # Extract CA name from exam_type (e.g., "term1_test1" -> "test1")
-                ca_name = result.exam_type.replace(f"term{term}_", "")
-                if ca_name != "overall":  # Skip overall results
-                    scores_data.append({
-                        'student_id': student.id,
-                        'ca_name': ca_name,
-                        'score': result.score,
-                        'comment': result.comment or ''
-                    })
+        # Compact student x CA matrix, requested with ?format=columnar
+        if request.GET.get('format') == 'columnar':
+            columns = columnar_scores(scores_data)
+            gradebook = scores_gradebook(scores_data, columns['student_ids'])
+            totals = gradebook.totals()
+            return JsonResponse({
+                'success': True,
+                'format': 'columnar',
+                **columns,
+                **gradebook.student_columns(totals),
+                'summary': gradebook.summary(totals),
+                'total_scores': len(scores_data),
+                'version': version
+            })
         
         return JsonResponse({
             'success': True,
             'scores': scores_data,
-            'total_scores': len(scores_data)
+            'total_scores': len(scores_data),
+            'version': version
         })
         
     except Exception as e:
@@ -1178,6 +1370,7 @@ def api_subject_students(request, subject_id):
 
 
 @login_required
+@idempotent
 def save_spreadsheet_results(request):
     """Save spreadsheet results to database"""
     if request.method == 'POST':
@@ -1211,62 +1404,23 @@ def save_spreadsheet_results(request):
                     'error': 'You do not teach this subject in the selected class'
                 })
             
-            saved_count = 0
-            errors = []
+            # Reject a full save made from a stale copy of the grid
+            with transaction.atomic():
+                grid = lock_grid(class_level, subject, session, term)
+                if data.get('version') is not None and int(data['version']) != grid.version:
+                    return JsonResponse({
+                        'success': False,
+                        'conflict': True,
+                        'version': grid.version,
+                        'error': 'Someone else saved this class since you loaded it. Reload the scores or save only your changes.'
+                    }, status=409)
+                saved_count, errors = save_spreadsheet_rows(teacher, subject, class_level, term, session, results)
+                version = bump_grid(grid, teacher)
+            for error in errors:
+                print(error)
             
-            for result_data in results:
-                student_id = result_data.get('student_id')
-                ca_scores = result_data.get('ca_scores', [])
-                comment = result_data.get('comment', '')
-                total_score = result_data.get('total_score', 0)
-                position = result_data.get('position', '')
-                
-                try:
-                    student = get_object_or_404(Student, id=student_id, class_level=class_level)
-                    
-                    # Save individual CA scores as Result objects
-                    for ca_score in ca_scores:
-                        ca_name = ca_score.get('ca_name')
-                        score = ca_score.get('score', 0)
-                        max_score = ca_score.get('max_score', 0)
-                        
-                        # Create a unique exam type for this CA
-                        exam_type = f"term{term}_{ca_name.lower().replace(' ', '_')}"
-                        
-                        # Create or update result
-                        result, created = Result.objects.update_or_create(
-                            student=student,
-                            subject=subject,
-                            exam_type=exam_type,
-                            recorded_by=teacher,
-                            defaults={
-                                'score': score,
-                                'max_score': max_score,
-                                'comment': comment,
-                                'date_taken': timezone.now().date(),
-                            }
-                        )
-                        saved_count += 1
-                        print(f"Saved {ca_name} for {student.user.get_full_name()}: {score}/{max_score}")
-                    
-                    # Save overall result
-                    overall_result, created = Result.objects.update_or_create(
-                        student=student,
-                        subject=subject,
-                        exam_type=f"term{term}_overall",
-                        recorded_by=teacher,
-                        defaults={
-                            'score': total_score,
-                            'max_score': 100,
-                            'comment': f"Position: {position}. {comment}",
-                            'date_taken': timezone.now().date(),
-                        }
-                    )
-                    saved_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Error saving student {student_id}: {str(e)}")
-                    print(f"Error saving student {student_id}: {str(e)}")
+            # Positions are always ranked on the server from the saved scores
+            positions = recompute_positions(class_level, subject, session_key(session), int(term))
             
             print(f"Successfully saved {saved_count} results")
             
@@ -1275,13 +1429,17 @@ def save_spreadsheet_results(request):
                     'success': True,
                     'message': f'Saved {saved_count} results with some errors',
                     'saved_count': saved_count,
-                    'errors': errors[:5]  # Return first 5 errors
+                    'positions': positions,
+                    'version': version,
+                    'errors': errors
                 })
             else:
                 return JsonResponse({
                     'success': True,
                     'message': f'Successfully saved {saved_count} results',
-                    'saved_count': saved_count
+                    'saved_count': saved_count,
+                    'positions': positions,
+                    'version': version
                 })
             
         except Exception as e:
@@ -1293,4 +1451,118 @@ def save_spreadsheet_results(request):
                 'error': str(e)
             }, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+def save_spreadsheet_delta_view(request):
+    """
+    Save only the changed cells of a results spreadsheet. Cells edited by
+    someone else since the client's version come back as conflicts.
+    """
+    if not hasattr(request.user, 'teacher'):
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
+    teacher = request.user.teacher
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+    subject = get_object_or_404(Subject, id=data.get('subject_id'))
+    class_level = get_object_or_404(ClassLevel, id=data.get('class_id'))
+    if not ClassSubject.objects.filter(class_level=class_level, subject=subject, teacher=teacher).exists():
+        return JsonResponse({'success': False, 'error': 'You do not teach this subject in the selected class'})
+
+    term = data.get('term')
+    session = data.get('session')
+    try:
+        saved_count, conflicts, version = save_spreadsheet_delta(
+            teacher, subject, class_level, term, session,
+            data.get('version'), data.get('cells', []), data.get('comments'),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': f'Invalid cell: {e}'}, status=400)
+
+    positions = recompute_positions(class_level, subject, session_key(session), int(term)) if saved_count else {}
+
+    return JsonResponse({
+        'success': True,
+        'saved_count': saved_count,
+        'conflicts': conflicts,
+        'positions': positions,
+        'version': version,
+    })
+
+
+@login_required
+def class_broadsheet(request, class_id):
+    """Broadsheet of every student in a class against every subject, as a page, JSON or CSV"""
+    if request.user.user_type not in ['senior_admin', 'junior_admin']:
+        messages.error(request, "You don't have permission to view broadsheets.")
+        return redirect('core:homepage')
+
+    class_level = get_object_or_404(ClassLevel, id=class_id, school=request.user.school)
+    session = session_key(request.GET.get('session'))
+    term = request.GET.get('term') or term_for_date(timezone.now().date())
+    try:
+        term = int(term)
+    except ValueError:
+        term = term_for_date(timezone.now().date())
+
+    broadsheet = get_class_broadsheet(class_level, session, term)
+
+    export_format = request.GET.get('export')
+    if export_format == 'json':
+        return JsonResponse(broadsheet)
+    if export_format == 'csv':
+        return broadsheet_csv(broadsheet, f"broadsheet_{class_level.name}_{session}_term{term}".replace(' ', '_'))
+
+    sessions = Result.objects.filter(student__class_level=class_level).exclude(session='').values_list(
+        'session', flat=True
+    ).distinct().order_by('-session')
+    context = {
+        'school': class_level.school,
+        'class_level': class_level,
+        'broadsheet': broadsheet,
+        'sessions': sessions,
+        'selected_session': session,
+        'selected_term': term,
+        'term_choices': Result.TERM_CHOICES,
+    }
+    return render(request, 'academic/broadsheet.html', context)
+
+
+@login_required
+def transcript(request, student_id=None):
+    """A student's transcript across every session; admins can pass a student_id"""
+    if student_id is None:
+        if not hasattr(request.user, 'student'):
+            messages.error(request, "You must be a student to view a transcript.")
+            return redirect('core:homepage')
+        student = Student.objects.select_related('user', 'school', 'class_level').get(user=request.user)
+    else:
+        if request.user.user_type not in ['senior_admin', 'junior_admin']:
+            messages.error(request, "You don't have permission to view other students' transcripts.")
+            return redirect('core:homepage')
+        student = get_object_or_404(
+            Student.objects.select_related('user', 'school', 'class_level'), id=student_id, school=request.user.school
+        )
+
+    context = {
+        'school': student.school,
+        'student': student,
+        'transcript': student_transcript(student),
+        'is_admin_view': student_id is not None,
+    }
+    if request.GET.get('export') == 'json':
+        return JsonResponse(context['transcript'])
+    return render(request, 'academic/transcript.html', context)
+
+
+def spreadsheet_sync_worker(request):
+    """Service worker that queues spreadsheet edits in IndexedDB and syncs them, scoped to /academic/"""
+    response = render(request, 'academic/spreadsheet_sync_worker.js', content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
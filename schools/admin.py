@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import School, SchoolAdmin, Payment, Subscription
+from .models import School, SchoolAdmin, Payment, Subscription, LedgerEntry, FeeBalance, FeeCollection, FeeOutstanding, NumberSequence
+from .sequences import reset_cache
 
 @admin.register(School)
 class SchoolAdminModel(admin.ModelAdmin):  # Changed from SchoolAdmin
@@ -20,4 +21,46 @@ class SubscriptionAdmin(admin.ModelAdmin):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['school', 'amount', 'payment_date', 'status']
-    list_filter = ['status']
\ No newline at end of file
+    list_filter = ['status']
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'student', 'kind', 'debit_account', 'credit_account', 'amount', 'payment_method', 'reference']
+    list_filter = ['kind', 'school']
+    search_fields = ['reference', 'student__admission_number']
+
+    # The ledger is append-only; entries are posted and reversed through schools.ledger
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(FeeBalance)
+class FeeBalanceAdmin(admin.ModelAdmin):
+    list_display = ['student', 'school', 'charged', 'paid', 'discounted', 'balance', 'updated_at']
+    list_filter = ['school']
+    readonly_fields = ['student', 'school', 'charged', 'paid', 'discounted', 'balance']
+
+@admin.register(FeeCollection)
+class FeeCollectionAdmin(admin.ModelAdmin):
+    list_display = ['school', 'period', 'period_start', 'payment_method', 'amount', 'payments']
+    list_filter = ['period', 'payment_method', 'school']
+
+@admin.register(FeeOutstanding)
+class FeeOutstandingAdmin(admin.ModelAdmin):
+    list_display = ['school', 'class_level', 'payment_status', 'fees', 'amount_due', 'amount_paid', 'amount_discounted']
+    list_filter = ['payment_status', 'school']
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ['school', 'name', 'format', 'next_value', 'block_size']
+    list_filter = ['name']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Other workers pick up a new format when their reserved block runs out
+        reset_cache()
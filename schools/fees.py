@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from academic.models import FeeStructure, session_for_date
+from users.models import Student
+from .ledger import MONEY, ZERO, payment_status, sync_charges
+from .models import StudentFee
+from .rollups import refresh_outstanding
+
+
+BATCH_SIZE = 1000
+
+# New StudentFee rows fall due this long after they are created
+DUE_AFTER = timedelta(days=30)
+
+
+def assign_fees(class_level_ids, academic_year=None, students=None):
+    """
+    Create the StudentFee rows missing for every student in some classes
+    against each of their classes' fee structures (optionally only one
+    academic year, or only some student ids). Rows that already exist are
+    left untouched, so it is safe to run again. One query for the
+    structures, one for the students and batched INSERTs that skip existing
+    (student, fee structure) pairs. Returns the number of (student,
+    structure) pairs covered.
+    """
+    structures = FeeStructure.objects.filter(class_level_id__in=class_level_ids)
+    if academic_year:
+        structures = structures.filter(academic_year=academic_year)
+    by_class = {}
+    for structure_id, class_level_id, total_fee in structures.values_list('id', 'class_level_id', 'total_fee'):
+        by_class.setdefault(class_level_id, []).append((structure_id, total_fee))
+    if not by_class:
+        return 0
+
+    class_students = Student.objects.filter(class_level_id__in=by_class)
+    fees = StudentFee.objects.filter(fee_structure__in=structures)
+    if students is not None:
+        class_students = class_students.filter(id__in=students)
+        fees = fees.filter(student_id__in=students)
+
+    due_date = timezone.now().date() + DUE_AFTER
+    rows = [
+        StudentFee(
+            student_id=student_id, fee_structure_id=structure_id,
+            amount_due=total_fee, amount_paid=0, payment_status='pending', due_date=due_date,
+        )
+        for student_id, class_level_id in class_students.values_list('id', 'class_level_id')
+        for structure_id, total_fee in by_class[class_level_id]
+    ]
+    StudentFee.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    # Charge the new rows (and any whose amount has changed) to the ledger
+    sync_charges(fees)
+    refresh_outstanding(by_class)
+    return len(rows)
+
+
+def current_academic_year():
+    """The running academic year as FeeStructure stores it, e.g. 2025-2026"""
+    start = int(session_for_date(timezone.now().date()))
+    return f"{start}-{start + 1}"
+
+
+def academic_year_choices():
+    """Last, current and next academic year"""
+    start = int(current_academic_year()[:4])
+    return [f"{year}-{year + 1}" for year in range(start - 1, start + 2)]
+
+
+def post_fees(class_level_ids, academic_year, total_fee):
+    """
+    Set the fee for some classes and one academic year and post it to every
+    student in them, in one transaction:
+
+    - one upsert for the classes' FeeStructure rows,
+    - one UPDATE moving amount_due (and the payment status it implies) on
+      the StudentFee rows that already exist,
+    - batched INSERTs, skipping existing pairs, for students without one,
+    - the matching charges and adjustments in the fee ledger, and the
+      classes' outstanding rollup.
+
+    Returns {'structures_created', 'structures_updated', 'fees_created', 'fees_updated'}.
+    """
+    class_level_ids = list(class_level_ids)
+    with transaction.atomic():
+        existing = set(FeeStructure.objects.filter(
+            class_level_id__in=class_level_ids, academic_year=academic_year
+        ).values_list('class_level_id', flat=True))
+        # bulk_create sends no post_save, so the structure signal doesn't post the fees a second time
+        FeeStructure.objects.bulk_create(
+            [
+                FeeStructure(class_level_id=class_level_id, academic_year=academic_year,
+                             tuition_fee=total_fee, total_fee=total_fee)
+                for class_level_id in class_level_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['class_level', 'academic_year'],
+            update_fields=['tuition_fee', 'total_fee'],
+        )
+        structures = FeeStructure.objects.filter(class_level_id__in=class_level_ids, academic_year=academic_year)
+
+        student_fees = StudentFee.objects.filter(fee_structure__in=structures)
+        fees_before = student_fees.count()
+        fees_updated = student_fees.exclude(amount_due=total_fee).update(
+            amount_due=total_fee,
+            payment_status=payment_status(Value(total_fee, output_field=MONEY)),
+        )
+        assign_fees(class_level_ids, academic_year)
+        fees_created = student_fees.count() - fees_before
+
+    return {
+        'structures_created': len(set(class_level_ids) - existing),
+        'structures_updated': len(existing),
+        'fees_created': fees_created,
+        'fees_updated': fees_updated,
+    }
+
+
+def fee_totals(students):
+    """
+    Annotate a Student queryset with total_due, total_paid and balance from
+    their FeeBalance snapshots - a join, with nothing summed per request.
+    """
+    return students.annotate(
+        total_due=Coalesce(F('fee_balance__charged') - F('fee_balance__discounted'), ZERO),
+        total_paid=Coalesce(F('fee_balance__paid'), ZERO),
+        balance=Coalesce(F('fee_balance__balance'), ZERO),
+    )
@@ -0,0 +1,244 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, CharField, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FeeBalance, FeePayment, LedgerEntry, NumberSequence, StudentFee
+from .rollups import move_outstanding, outstanding_key, record_collection
+from .sequences import next_number
+
+
+BATCH_SIZE = 1000
+
+# (debit, credit) for each kind of entry; a fee adjustment downwards and a
+# reversal use the same accounts the other way round
+ACCOUNTS = {
+    LedgerEntry.CHARGE: (LedgerEntry.RECEIVABLE, LedgerEntry.FEE_INCOME),
+    LedgerEntry.ADJUSTMENT: (LedgerEntry.RECEIVABLE, LedgerEntry.FEE_INCOME),
+    LedgerEntry.PAYMENT: (LedgerEntry.CASH, LedgerEntry.RECEIVABLE),
+    LedgerEntry.DISCOUNT: (LedgerEntry.DISCOUNTS, LedgerEntry.RECEIVABLE),
+}
+
+CHARGES = [LedgerEntry.CHARGE, LedgerEntry.ADJUSTMENT]
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=MONEY)
+
+
+def payment_status(amount_due):
+    """Case expression for StudentFee.payment_status once amount_due, amount_paid and amount_discounted are set"""
+    return Case(
+        When(amount_paid__gte=amount_due - F('amount_discounted'), then=Value('paid')),
+        When(amount_paid__gt=0, then=Value('partial')),
+        When(payment_status__in=['paid', 'partial'], then=Value('pending')),
+        default=F('payment_status'),
+        output_field=CharField(),
+    )
+
+
+def _receivable_change(prefix=''):
+    """Signed change an entry makes to what the student owes"""
+    return Case(
+        When(**{f'{prefix}debit_account': LedgerEntry.RECEIVABLE}, then=F(f'{prefix}amount')),
+        When(**{f'{prefix}credit_account': LedgerEntry.RECEIVABLE}, then=-F(f'{prefix}amount')),
+        default=ZERO,
+        output_field=MONEY,
+    )
+
+
+def _of_kind(kinds, prefix=''):
+    """Entries of these kinds, and the reversals of such entries"""
+    return Q(**{f'{prefix}kind__in': kinds}) | Q(**{f'{prefix}reverses__kind__in': kinds})
+
+
+def _apply(entry, kind):
+    """Move the student's FeeBalance and the StudentFee an entry belongs to"""
+    change = entry.receivable_change
+    balance, _ = FeeBalance.objects.get_or_create(student_id=entry.student_id, defaults={'school_id': entry.school_id})
+    moves = {'balance': F('balance') + change}
+    if kind in CHARGES:
+        moves['charged'] = F('charged') + change
+    elif kind == LedgerEntry.PAYMENT:
+        moves['paid'] = F('paid') - change
+    elif kind == LedgerEntry.DISCOUNT:
+        moves['discounted'] = F('discounted') - change
+    FeeBalance.objects.filter(pk=balance.pk).update(updated_at=timezone.now(), **moves)
+
+    if entry.student_fee_id and kind in (LedgerEntry.PAYMENT, LedgerEntry.DISCOUNT):
+        field = 'amount_paid' if kind == LedgerEntry.PAYMENT else 'amount_discounted'
+        before = outstanding_key(entry.student_fee_id)
+        fees = StudentFee.objects.filter(pk=entry.student_fee_id)
+        fees.update(**{field: F(field) - change})
+        fees.update(payment_status=payment_status(F('amount_due')))
+        move_outstanding(before, outstanding_key(entry.student_fee_id))
+    if kind == LedgerEntry.PAYMENT:
+        record_collection(entry)
+
+
+def post_entry(student, kind, amount, student_fee=None, user=None, reference='', memo='', payment_method=''):
+    """
+    Append one charge, payment or discount for a student and update their
+    balance in the same transaction. Returns the entry.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Ledger amounts must be positive")
+    debit, credit = ACCOUNTS[kind]
+    with transaction.atomic():
+        entry = LedgerEntry.objects.create(
+            school_id=student.school_id, student=student, student_fee=student_fee, kind=kind,
+            debit_account=debit, credit_account=credit, amount=amount,
+            reference=reference, memo=memo, payment_method=payment_method, created_by=user,
+        )
+        _apply(entry, kind)
+    return entry
+
+
+def reverse_entry(entry, user=None, memo=''):
+    """Undo an entry with an equal and opposite one. An entry can only be reversed once."""
+    if entry.kind == LedgerEntry.REVERSAL:
+        raise ValueError("A reversal can't itself be reversed; post a new entry instead")
+    with transaction.atomic():
+        if LedgerEntry.objects.select_for_update().filter(reverses=entry).exists():
+            raise ValueError("This entry has already been reversed")
+        reversal = LedgerEntry.objects.create(
+            school_id=entry.school_id, student_id=entry.student_id, student_fee_id=entry.student_fee_id,
+            kind=LedgerEntry.REVERSAL, debit_account=entry.credit_account, credit_account=entry.debit_account,
+            amount=entry.amount, reverses=entry, reference=entry.reference, payment_method=entry.payment_method,
+            memo=memo or f"Reversal of {entry.get_kind_display().lower()}", created_by=user,
+        )
+        _apply(reversal, entry.kind)
+    return reversal
+
+
+def record_payment(student_fee, amount, user, payment_method='Cash'):
+    """Record a payment against a student's fee: a FeePayment receipt and its ledger entry. Returns the FeePayment."""
+    receipt_number = next_number(student_fee.student.school, NumberSequence.RECEIPT)
+    with transaction.atomic():
+        payment = FeePayment.objects.create(
+            student_fee=student_fee, amount_paid=amount, payment_method=payment_method,
+            receipt_number=receipt_number, recorded_by=user,
+        )
+        post_entry(
+            student_fee.student, LedgerEntry.PAYMENT, amount, student_fee=student_fee, user=user,
+            reference=receipt_number, memo=payment_method, payment_method=payment_method,
+        )
+    return payment
+
+
+def give_discount(student_fee, amount, user, memo=''):
+    return post_entry(student_fee.student, LedgerEntry.DISCOUNT, amount, student_fee=student_fee, user=user, memo=memo)
+
+
+def sync_charges(student_fees, user=None):
+    """
+    Bring the ledger in line with the amount_due of a StudentFee queryset:
+    post a charge for a fee not yet charged, and an adjustment for one whose
+    amount_due has moved since. One grouped query, batched INSERTs and a
+    balance refresh for the students touched. Returns the entries posted.
+    """
+    charged = Coalesce(
+        Sum(_receivable_change('ledger_entries__'), filter=_of_kind(CHARGES, 'ledger_entries__')), ZERO
+    )
+    rows = student_fees.annotate(charged=charged).values_list(
+        'id', 'student_id', 'student__school_id', 'amount_due', 'charged'
+    )
+    entries = []
+    for fee_id, student_id, school_id, amount_due, already_charged in rows:
+        change = amount_due - already_charged
+        if not change:
+            continue
+        if already_charged:
+            kind, memo = LedgerEntry.ADJUSTMENT, 'Fee changed'
+        else:
+            kind, memo = LedgerEntry.CHARGE, 'Fee charged'
+        debit, credit = ACCOUNTS[kind] if change > 0 else reversed(ACCOUNTS[kind])
+        entries.append(LedgerEntry(
+            school_id=school_id, student_id=student_id, student_fee_id=fee_id, kind=kind,
+            debit_account=debit, credit_account=credit, amount=abs(change), memo=memo, created_by=user,
+        ))
+    if entries:
+        with transaction.atomic():
+            LedgerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+            refresh_balances({entry.student_id for entry in entries})
+    return len(entries)
+
+
+def sync_opening_payments(student_fees):
+    """
+    Post, as an opening balance, any part of a StudentFee's amount_paid the
+    ledger doesn't account for - money taken before the ledger existed.
+    amount_paid itself is left alone. Returns the entries posted.
+    """
+    paid = Coalesce(
+        -Sum(_receivable_change('ledger_entries__'), filter=_of_kind([LedgerEntry.PAYMENT], 'ledger_entries__')), ZERO
+    )
+    rows = student_fees.annotate(ledger_paid=paid).filter(amount_paid__gt=F('ledger_paid')).values_list(
+        'id', 'student_id', 'student__school_id', 'amount_paid', 'ledger_paid'
+    )
+    debit, credit = ACCOUNTS[LedgerEntry.PAYMENT]
+    entries = [
+        LedgerEntry(
+            school_id=school_id, student_id=student_id, student_fee_id=fee_id, kind=LedgerEntry.PAYMENT,
+            debit_account=debit, credit_account=credit, amount=amount_paid - ledger_paid, memo='Opening balance',
+        )
+        for fee_id, student_id, school_id, amount_paid, ledger_paid in rows
+    ]
+    if entries:
+        with transaction.atomic():
+            LedgerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+            refresh_balances({entry.student_id for entry in entries})
+    return len(entries)
+
+
+def ledger_totals(entries):
+    """{student_id: {school_id, charged, paid, discounted, balance}} replayed from a LedgerEntry queryset in one query"""
+    change = _receivable_change()
+    rows = entries.values('student_id', 'school_id').annotate(
+        charged=Coalesce(Sum(change, filter=_of_kind(CHARGES)), ZERO),
+        paid=Coalesce(-Sum(change, filter=_of_kind([LedgerEntry.PAYMENT])), ZERO),
+        discounted=Coalesce(-Sum(change, filter=_of_kind([LedgerEntry.DISCOUNT])), ZERO),
+        balance=Coalesce(Sum(change), ZERO),
+    ).order_by()
+    return {row.pop('student_id'): row for row in rows}
+
+
+def refresh_balances(student_ids=None):
+    """
+    Rebuild FeeBalance snapshots by replaying the ledger, for some students
+    or everyone with entries. Returns the number of snapshots that were
+    wrong (or missing) and have been rewritten.
+    """
+    entries = LedgerEntry.objects.all()
+    balances = FeeBalance.objects.all()
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        entries = entries.filter(student_id__in=student_ids)
+        balances = balances.filter(student_id__in=student_ids)
+    totals = ledger_totals(entries)
+    fields = ['charged', 'paid', 'discounted', 'balance']
+    current = {row[0]: row[1:] for row in balances.values_list('student_id', *fields)}
+
+    now = timezone.now()
+    snapshots = []
+    for student_id, row in totals.items():
+        values = tuple(row[field] for field in fields)
+        if current.get(student_id) != values:
+            snapshots.append(FeeBalance(
+                student_id=student_id, school_id=row['school_id'], updated_at=now,
+                **{field: row[field] for field in fields}
+            ))
+    if snapshots:
+        FeeBalance.objects.bulk_create(
+            snapshots, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['student'], update_fields=fields + ['updated_at'],
+        )
+    # A snapshot with no entries left behind it goes back to zero
+    emptied = [student_id for student_id, values in current.items() if student_id not in totals and any(values)]
+    if emptied:
+        FeeBalance.objects.filter(student_id__in=emptied).update(
+            charged=0, paid=0, discounted=0, balance=0, updated_at=now
+        )
+    return len(snapshots) + len(emptied)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from academic.models import ClassLevel
+from schools.fees import assign_fees
+
+
+class Command(BaseCommand):
+    help = "Create any missing StudentFee rows for students against their class's fee structures"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only this school id')
+        parser.add_argument('--year', help='Only this academic year, e.g. 2024-2025')
+
+    def handle(self, *args, **options):
+        classes = ClassLevel.objects.all()
+        if options['school']:
+            classes = classes.filter(school_id=options['school'])
+        count = assign_fees(list(classes.values_list('id', flat=True)), options['year'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully checked {count} student fees!')
+        )
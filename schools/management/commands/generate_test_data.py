@@ -5,7 +5,8 @@ from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 from datetime import timedelta
 import pandas as pd
-from schools.models import School, SchoolAdmin, Subscription, Payment
+from schools.models import School, SchoolAdmin, Subscription, Payment, NumberSequence
+from schools.sequences import allocate
 from users.models import User, Teacher, Student
 from academic.models import Subject, ClassLevel, Assignment, StudentAssignment, Result
 
@@ -381,6 +382,9 @@ class Command(BaseCommand):
         else:  # enterprise
             num_students = random.randint(80, 100)
         
+        # One reservation for the whole batch of admission numbers
+        admission_numbers = allocate(school, NumberSequence.ADMISSION, num_students)
+        
         for i in range(num_students):
             first_name = random.choice(student_first_names)
             last_name = random.choice(student_last_names)
@@ -399,7 +403,7 @@ class Command(BaseCommand):
             student = Student.objects.create(
                 user=student_user,
                 school=school,
-                admission_number=f"{school.name[:3].upper()}{2024}{i+1:04d}",
+                admission_number=admission_numbers[i],
                 class_level=class_level
             )
             
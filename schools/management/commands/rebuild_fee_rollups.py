@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from academic.models import ClassLevel
+from schools.models import School
+from schools.rollups import rebuild_collections, refresh_outstanding
+
+
+class Command(BaseCommand):
+    help = ('Recompute the fee analytics rollups (daily and monthly collections, '
+            'outstanding fees by class and status) from the ledger and student fees')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only this school id')
+
+    def handle(self, *args, **options):
+        schools = School.objects.all()
+        if options['school']:
+            schools = schools.filter(id=options['school'])
+        school_ids = list(schools.values_list('id', flat=True))
+
+        collections = rebuild_collections(school_ids)
+        outstanding = refresh_outstanding(ClassLevel.objects.filter(school_id__in=school_ids).values_list('id', flat=True))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {collections} collection rows and {outstanding} outstanding rows '
+                f'for {len(school_ids)} schools!'
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from schools.ledger import refresh_balances, sync_charges, sync_opening_payments
+from schools.models import StudentFee
+from users.models import Student
+
+
+class Command(BaseCommand):
+    help = ('Post ledger charges and opening payments for fees recorded outside the ledger, '
+            'then replay the ledger to check and repair every balance snapshot')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only this school id')
+
+    def handle(self, *args, **options):
+        fees = StudentFee.objects.all()
+        student_ids = None
+        if options['school']:
+            fees = fees.filter(student__school_id=options['school'])
+            student_ids = Student.objects.filter(school_id=options['school']).values_list('id', flat=True)
+
+        charges = sync_charges(fees)
+        payments = sync_opening_payments(fees)
+        repaired = refresh_balances(student_ids)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully posted {charges} charges and {payments} opening payments, '
+                f'and repaired {repaired} balances!'
+            )
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:29
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_fees(apps, schema_editor):
+    """
+    Fold duplicate (student, fee structure) rows into the oldest one, keeping
+    their payments, and set its payment_status from the merged amounts
+    """
+    StudentFee = apps.get_model('schools', 'StudentFee')
+    FeePayment = apps.get_model('schools', 'FeePayment')
+    duplicates = StudentFee.objects.values('student_id', 'fee_structure_id').annotate(
+        rows=Count('id')
+    ).filter(rows__gt=1)
+    for duplicate in duplicates:
+        fees = list(StudentFee.objects.filter(
+            student_id=duplicate['student_id'], fee_structure_id=duplicate['fee_structure_id']
+        ).order_by('id'))
+        keep, extra = fees[0], [fee.id for fee in fees[1:]]
+        FeePayment.objects.filter(student_fee_id__in=extra).update(student_fee=keep)
+        keep.amount_paid = sum(fee.amount_paid for fee in fees)
+        keep.amount_due = max(fee.amount_due for fee in fees)
+        if keep.amount_paid >= keep.amount_due:
+            keep.payment_status = 'paid'
+        elif keep.amount_paid > 0:
+            keep.payment_status = 'partial'
+        elif keep.payment_status in ('paid', 'partial'):
+            keep.payment_status = 'pending'
+        keep.save()
+        StudentFee.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0007_about_text'),
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_fees, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='studentfee',
+            unique_together={('student', 'fee_structure')},
+        ),
+    ]
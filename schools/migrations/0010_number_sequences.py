@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0009_fee_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('admission', 'Admission number'), ('receipt', 'Receipt number')], max_length=20)),
+                ('format', models.CharField(max_length=50)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('block_size', models.PositiveIntegerField(default=10)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_sequences', to='schools.school')),
+            ],
+            options={
+                'unique_together': {('school', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0020_stored_blobs'),
+        ('schools', '0010_number_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='payment_method',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.CreateModel(
+            name='FeeCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('payment_method', models.CharField(max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.IntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_collections', to='schools.school')),
+            ],
+            options={
+                'unique_together': {('school', 'period', 'period_start', 'payment_method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeOutstanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('partial', 'Partial'), ('paid', 'Paid'), ('overdue', 'Overdue')], max_length=20)),
+                ('fees', models.IntegerField(default=0)),
+                ('amount_due', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('amount_discounted', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('class_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_outstanding', to='academic.classlevel')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_outstanding', to='schools.school')),
+            ],
+            options={
+                'unique_together': {('school', 'class_level', 'payment_status')},
+            },
+        ),
+    ]
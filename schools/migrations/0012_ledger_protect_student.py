@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0011_fee_rollups'),
+        ('users', '0005_admission_number_length'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='schools.school'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='users.student'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class School(models.Model):
     SCHOOL_TYPES = (
@@ -118,15 +119,20 @@ class StudentFee(models.Model):
     fee_structure = models.ForeignKey('academic.FeeStructure', on_delete=models.CASCADE)
     amount_due = models.DecimalField(max_digits=10, decimal_places=2)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Discounts granted on this fee; like amount_paid, kept in step by schools.ledger
+    amount_discounted = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
     due_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['student', 'fee_structure']
     
     def balance(self):
-        return self.amount_due - self.amount_paid
+        return self.amount_due - self.amount_paid - self.amount_discounted
     
     def __str__(self):
-        return f"{self.student.user.get_full_name()} - {self.fee_structure.name}"
+        return f"{self.student.user.get_full_name()} - {self.fee_structure}"
 
 class FeePayment(models.Model):
     student_fee = models.ForeignKey(StudentFee, on_delete=models.CASCADE)
@@ -137,4 +143,184 @@ class FeePayment(models.Model):
     recorded_by = models.ForeignKey('users.User', on_delete=models.CASCADE)  # String reference
     
     def __str__(self):
-        return f"Receipt {self.receipt_number} - {self.amount_paid}"
\ No newline at end of file
+        return f"Receipt {self.receipt_number} - {self.amount_paid}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One append-only line of the fee ledger. Every entry moves amount from
+    its credit account to its debit account, so the books always balance;
+    a student's receivable (what they owe) is their receivable debits minus
+    credits. Entries are never edited or deleted - a mistake is undone by
+    a reversal entry. Post entries through schools.ledger.
+
+    The student and school are protected too, so the books can't be emptied
+    by a cascade: a student with entries is deactivated instead of deleted
+    (see schools.views.delete_user).
+    """
+    CHARGE = 'charge'
+    ADJUSTMENT = 'adjustment'
+    PAYMENT = 'payment'
+    DISCOUNT = 'discount'
+    REVERSAL = 'reversal'
+    KINDS = (
+        (CHARGE, 'Charge'),
+        (ADJUSTMENT, 'Fee adjustment'),
+        (PAYMENT, 'Payment'),
+        (DISCOUNT, 'Discount'),
+        (REVERSAL, 'Reversal'),
+    )
+
+    RECEIVABLE = 'receivable'
+    FEE_INCOME = 'fee_income'
+    CASH = 'cash'
+    DISCOUNTS = 'discounts'
+    ACCOUNTS = (
+        (RECEIVABLE, 'Fees receivable'),
+        (FEE_INCOME, 'Fee income'),
+        (CASH, 'Cash and bank'),
+        (DISCOUNTS, 'Discounts allowed'),
+    )
+
+    school = models.ForeignKey(School, on_delete=models.PROTECT, related_name='ledger_entries')
+    student = models.ForeignKey('users.Student', on_delete=models.PROTECT, related_name='ledger_entries')
+    student_fee = models.ForeignKey(StudentFee, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    debit_account = models.CharField(max_length=20, choices=ACCOUNTS)
+    credit_account = models.CharField(max_length=20, choices=ACCOUNTS)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reverses = models.OneToOneField('self', on_delete=models.PROTECT, null=True, blank=True, related_name='reversed_by')
+    reference = models.CharField(max_length=50, blank=True)
+    # How a payment was taken; blank for everything else and for opening balances
+    payment_method = models.CharField(max_length=50, blank=True)
+    memo = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['student', 'created_at']),
+            models.Index(fields=['school', 'kind', 'created_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(amount__gt=0), name='ledger_entry_amount_positive'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} ({self.debit_account} / {self.credit_account})"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Ledger entries can't be changed; post a reversal instead")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries can't be deleted; post a reversal instead")
+
+    @property
+    def receivable_change(self):
+        """How much this entry adds to (or, negative, takes off) what the student owes"""
+        if self.debit_account == self.RECEIVABLE:
+            return self.amount
+        if self.credit_account == self.RECEIVABLE:
+            return -self.amount
+        return 0
+
+
+class FeeBalance(models.Model):
+    """
+    A student's running fee position, updated in the same transaction as
+    every ledger entry so reading it is a single-row lookup.
+    refresh_balances() rebuilds it from the ledger.
+    """
+    student = models.OneToOneField('users.Student', on_delete=models.CASCADE, primary_key=True, related_name='fee_balance')
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='fee_balances')
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discounted = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['school', 'balance'])]
+
+    def __str__(self):
+        return f"{self.student} owes {self.balance}"
+
+    @property
+    def total_due(self):
+        return self.charged - self.discounted
+
+
+class NumberSequence(models.Model):
+    """
+    A school's counter for one kind of document number (admission numbers,
+    receipts). Numbers are handed out by schools.sequences, which reserves
+    them in blocks so most allocations never touch this row.
+    """
+    ADMISSION = 'admission'
+    RECEIPT = 'receipt'
+    NAMES = (
+        (ADMISSION, 'Admission number'),
+        (RECEIPT, 'Receipt number'),
+    )
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='number_sequences')
+    name = models.CharField(max_length=20, choices=NAMES)
+    # str.format pattern with {year} and {number}, e.g. "GWD/{year}/{number:06d}"
+    format = models.CharField(max_length=50)
+    next_value = models.PositiveBigIntegerField(default=1)
+    # Numbers a worker reserves at a time; 1 gives gapless numbers at the cost of a row update per number
+    block_size = models.PositiveIntegerField(default=10)
+
+    class Meta:
+        unique_together = ['school', 'name']
+
+    def __str__(self):
+        return f"{self.school.name} {self.get_name_display()} ({self.format})"
+
+
+class FeeCollection(models.Model):
+    """
+    Fees a school collected in one day or month by one payment method, net
+    of reversed payments. Kept up to date by schools.rollups as payments
+    post; rebuild_fee_rollups recomputes it from the ledger.
+    """
+    DAY = 'day'
+    MONTH = 'month'
+    PERIODS = ((DAY, 'Day'), (MONTH, 'Month'))
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='fee_collections')
+    period = models.CharField(max_length=5, choices=PERIODS)
+    period_start = models.DateField()
+    payment_method = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['school', 'period', 'period_start', 'payment_method']
+
+    def __str__(self):
+        return f"{self.school.name} {self.period} {self.period_start} {self.payment_method}: {self.amount}"
+
+
+class FeeOutstanding(models.Model):
+    """Current totals of a school's student fees for one class and payment status"""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='fee_outstanding')
+    class_level = models.ForeignKey('academic.ClassLevel', on_delete=models.CASCADE, related_name='fee_outstanding')
+    payment_status = models.CharField(max_length=20, choices=StudentFee.PAYMENT_STATUS)
+    fees = models.IntegerField(default=0)
+    amount_due = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount_discounted = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['school', 'class_level', 'payment_status']
+
+    def __str__(self):
+        return f"{self.class_level.name} {self.payment_status}: {self.balance}"
+
+    @property
+    def balance(self):
+        return self.amount_due - self.amount_paid - self.amount_discounted
@@ -0,0 +1,152 @@
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import FeeCollection, FeeOutstanding, LedgerEntry, StudentFee
+
+
+BATCH_SIZE = 1000
+
+# Ranges up to this many days are charted by day, longer ones by month
+DAILY_RANGE_DAYS = 92
+
+OUTSTANDING_FIELDS = ['amount_due', 'amount_paid', 'amount_discounted']
+
+
+def _bump(model, keys, **deltas):
+    """Add deltas to the rollup row for keys, creating it the first time. One UPDATE when the row exists."""
+    if model.objects.filter(**keys).update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another payment created the row first
+        model.objects.filter(**keys).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def record_collection(entry):
+    """Count a payment (or take off a reversed one) in its school's day and month collections"""
+    if not entry.payment_method:
+        return
+    amount = -entry.receivable_change
+    day = timezone.localdate(entry.created_at)
+    for period, start in [(FeeCollection.DAY, day), (FeeCollection.MONTH, month_start(day))]:
+        _bump(
+            FeeCollection,
+            {'school_id': entry.school_id, 'period': period, 'period_start': start, 'payment_method': entry.payment_method},
+            amount=amount, payments=1 if amount > 0 else -1,
+        )
+
+
+def outstanding_key(student_fee_id):
+    """(school_id, class_level_id, payment_status, amount_due, amount_paid, amount_discounted) of a StudentFee"""
+    return StudentFee.objects.filter(pk=student_fee_id).values_list(
+        'fee_structure__class_level__school_id', 'fee_structure__class_level_id', 'payment_status', *OUTSTANDING_FIELDS
+    ).first()
+
+
+def move_outstanding(before, after):
+    """Move a fee's amounts from its old (class, status) bucket to its new one, given outstanding_key() tuples"""
+    for row, sign in [(before, -1), (after, 1)]:
+        if not row:
+            continue
+        school_id, class_level_id, status = row[:3]
+        _bump(
+            FeeOutstanding,
+            {'school_id': school_id, 'class_level_id': class_level_id, 'payment_status': status},
+            fees=sign, **{field: sign * value for field, value in zip(OUTSTANDING_FIELDS, row[3:])},
+        )
+
+
+def refresh_outstanding(class_level_ids):
+    """Recompute the outstanding rollup of some classes from their StudentFee rows, with one grouped query"""
+    class_level_ids = list(class_level_ids)
+    rows = StudentFee.objects.filter(fee_structure__class_level_id__in=class_level_ids).values(
+        'fee_structure__class_level__school_id', 'fee_structure__class_level_id', 'payment_status'
+    ).annotate(
+        count=Count('id'), due=Sum('amount_due'), paid=Sum('amount_paid'), discounted=Sum('amount_discounted'),
+    ).order_by()
+    with transaction.atomic():
+        FeeOutstanding.objects.filter(class_level_id__in=class_level_ids).delete()
+        FeeOutstanding.objects.bulk_create([
+            FeeOutstanding(
+                school_id=row['fee_structure__class_level__school_id'],
+                class_level_id=row['fee_structure__class_level_id'],
+                payment_status=row['payment_status'], fees=row['count'],
+                amount_due=row['due'], amount_paid=row['paid'], amount_discounted=row['discounted'],
+            )
+            for row in rows
+        ], batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_collections(school_ids):
+    """Recompute the day and month collections of some schools from their ledger payments"""
+    school_ids = list(school_ids)
+    payments = LedgerEntry.objects.filter(school_id__in=school_ids).exclude(payment_method='').filter(
+        Q(kind=LedgerEntry.PAYMENT) | Q(kind=LedgerEntry.REVERSAL, reverses__kind=LedgerEntry.PAYMENT)
+    )
+    signed = Case(When(kind=LedgerEntry.REVERSAL, then=-F('amount')), default=F('amount'))
+    counted = Case(When(kind=LedgerEntry.REVERSAL, then=Value(-1)), default=Value(1), output_field=IntegerField())
+
+    collections = []
+    for period, trunc in [(FeeCollection.DAY, TruncDate), (FeeCollection.MONTH, TruncMonth)]:
+        rows = payments.annotate(period_start=trunc('created_at')).values(
+            'school_id', 'period_start', 'payment_method'
+        ).annotate(total=Sum(signed), count=Sum(counted)).order_by()
+        for row in rows:
+            start = row['period_start']
+            if isinstance(start, datetime.datetime):
+                start = timezone.localtime(start).date() if timezone.is_aware(start) else start.date()
+            collections.append(FeeCollection(
+                school_id=row['school_id'], period=period, period_start=start,
+                payment_method=row['payment_method'], amount=row['total'], payments=row['count'],
+            ))
+    with transaction.atomic():
+        FeeCollection.objects.filter(school_id__in=school_ids).delete()
+        FeeCollection.objects.bulk_create(collections, batch_size=BATCH_SIZE)
+    return len(collections)
+
+
+def collection_series(school, start, end):
+    """
+    Collections between two dates for a chart: by day for short ranges and
+    by month for long ones. Reads only the rollup rows in the range.
+    Returns {'period', 'labels', 'methods': {method: [amount per label]}, 'totals': {method: amount}, 'total'}.
+    """
+    if (end - start).days <= DAILY_RANGE_DAYS:
+        period = FeeCollection.DAY
+        labels = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    else:
+        period = FeeCollection.MONTH
+        labels = []
+        month = month_start(start)
+        while month <= end:
+            labels.append(month)
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+    index = {label: i for i, label in enumerate(labels)}
+    methods = {}
+    rows = FeeCollection.objects.filter(
+        school=school, period=period, period_start__gte=labels[0] if labels else start, period_start__lte=end
+    ).values_list('period_start', 'payment_method', 'amount')
+    for period_start, method, amount in rows:
+        methods.setdefault(method, [0.0] * len(labels))[index[period_start]] += float(amount)
+
+    totals = {method: round(sum(amounts), 2) for method, amounts in sorted(methods.items())}
+    return {
+        'period': period,
+        'labels': [label.strftime('%d %b' if period == FeeCollection.DAY else '%b %Y') for label in labels],
+        'methods': {method: methods[method] for method in totals},
+        'totals': totals,
+        'total': Decimal(str(round(sum(totals.values()), 2))),
+    }
@@ -0,0 +1,108 @@
+import re
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NumberSequence
+
+
+DEFAULT_FORMATS = {
+    NumberSequence.ADMISSION: '{code}/{{year}}/{{number:06d}}',
+    NumberSequence.RECEIPT: 'RCP/{code}/{{year}}/{{number:06d}}',
+}
+
+STOP_WORDS = {'the', 'of', 'and', 'school', 'schools', 'college', 'academy', 'int', "int'l", 'international'}
+
+# Numbers reserved by this process: {(school_id, name): [next, end, format]}
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def school_code(school):
+    """
+    Up to three initials of the school's name followed by its id, e.g.
+    "GWD12". Letters then digits, so no two schools share a code.
+    """
+    words = [word for word in re.findall(r"[A-Za-z']+", school.name) if word.lower() not in STOP_WORDS]
+    initials = ''.join(word[0] for word in words[:3]).upper() or 'SCH'
+    return f"{initials}{school.id}"
+
+
+def get_sequence(school, name):
+    return NumberSequence.objects.get_or_create(
+        school=school, name=name,
+        defaults={'format': DEFAULT_FORMATS[name].format(code=school_code(school))},
+    )[0]
+
+
+def format_number(pattern, number):
+    return pattern.format(year=timezone.now().year, number=number)
+
+
+def _take_cached(key, count):
+    """Up to count numbers from this process's reserved block"""
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if not block:
+            return [], None
+        start, end, pattern = block
+        taken = list(range(start, min(start + count, end)))
+        if start + len(taken) >= end:
+            del _blocks[key]
+        else:
+            block[0] = start + len(taken)
+        return taken, pattern
+
+
+def _reserve(school, name, count):
+    """
+    Move the counter on by at least count, in one short locked UPDATE.
+    Returns (first reserved number, numbers reserved, format).
+    """
+    sequence = get_sequence(school, name)
+    with transaction.atomic():
+        sequence = NumberSequence.objects.select_for_update().get(pk=sequence.pk)
+        reserved = max(count, sequence.block_size)
+        start = sequence.next_value
+        NumberSequence.objects.filter(pk=sequence.pk).update(next_value=start + reserved)
+    return start, reserved, sequence.format
+
+
+def allocate(school, name, count=1):
+    """
+    count new numbers of a school's sequence, formatted, in order.
+
+    Each process reserves a block of block_size numbers at a time and serves
+    later requests from memory, so the sequence row is only locked once per
+    block. Spare numbers from a reservation are only kept once the
+    transaction that reserved them commits: if it rolls back, the counter
+    goes back too, and nothing is handed out twice. Numbers stay unique but
+    may have gaps (a restarted worker's unused block) and needn't come out
+    in time order across workers.
+    """
+    key = (school.id, name)
+    numbers, pattern = _take_cached(key, count)
+    if len(numbers) < count:
+        start, reserved, pattern = _reserve(school, name, count - len(numbers))
+        needed = count - len(numbers)
+        numbers += list(range(start, start + needed))
+        if reserved > needed:
+            spare = [start + needed, start + reserved, pattern]
+
+            def keep_spare():
+                with _blocks_lock:
+                    _blocks.setdefault(key, spare)
+
+            transaction.on_commit(keep_spare)
+    return [format_number(pattern, number) for number in numbers]
+
+
+def next_number(school, name):
+    return allocate(school, name)[0]
+
+
+def reset_cache():
+    """Forget this process's reserved blocks, e.g. after a sequence's format is changed"""
+    with _blocks_lock:
+        _blocks.clear()
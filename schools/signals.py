@@ -0,0 +1,26 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from academic.models import FeeStructure
+from users.models import Student
+from .fees import assign_fees
+
+
+@receiver(post_save, sender=FeeStructure)
+def assign_structure_fees(sender, instance, **kwargs):
+    """Give every student in the class the new (or edited) fee structure"""
+    if instance.class_level_id:
+        assign_fees([instance.class_level_id], instance.academic_year)
+
+
+@receiver(post_init, sender=Student)
+def remember_class(sender, instance, **kwargs):
+    instance._previous_class_level_id = instance.__dict__.get('class_level_id')
+
+
+@receiver(post_save, sender=Student)
+def assign_class_fees(sender, instance, created, **kwargs):
+    """A student who joins a class picks up that class's fees"""
+    if instance.class_level_id and (created or instance.class_level_id != instance._previous_class_level_id):
+        assign_fees([instance.class_level_id], students=[instance.id])
+    instance._previous_class_level_id = instance.class_level_id
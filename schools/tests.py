@@ -1,3 +1,248 @@
+from django.db.models import ProtectedError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from academic.models import ClassLevel, FeeStructure
+from users.models import Student, User
+from . import sequences
+from .fees import assign_fees, post_fees
+from .ledger import give_discount, record_payment, refresh_balances, reverse_entry, sync_opening_payments
+from .models import FeeBalance, FeeCollection, FeeOutstanding, LedgerEntry, NumberSequence, School, SchoolAdmin, StudentFee
+from .rollups import rebuild_collections, refresh_outstanding
+
+
+class FeeFixtures:
+    """A school with one class of three students and a senior admin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(
+            name='Test School', school_type='secondary', subscription_type='basic',
+            phone='0', email='test@example.com', address='-', city='-', lga='-',
+        )
+        cls.class_level = ClassLevel.objects.create(name='SS 1A', level='ss_1', school=cls.school)
+        cls.admin_user = User.objects.create_user('admin', password='pass', user_type='senior_admin', school=cls.school)
+        SchoolAdmin.objects.create(user=cls.admin_user, school=cls.school, is_senior=True)
+
+        cls.students = []
+        for i in range(3):
+            user = User.objects.create_user(f'student{i}', password='pass', user_type='student', school=cls.school)
+            cls.students.append(Student.objects.create(
+                user=user, school=cls.school, class_level=cls.class_level, admission_number=f'TST{i:03d}'
+            ))
+
+    def structure(self, total, year='2025-2026'):
+        return FeeStructure.objects.create(
+            class_level=self.class_level, academic_year=year, tuition_fee=total, total_fee=total
+        )
+
+
+class FeeAssignmentTests(FeeFixtures, TestCase):
+
+    def test_structures_and_new_students_get_fees(self):
+        self.structure(50000)
+        self.assertEqual(StudentFee.objects.count(), 3)
+        self.assertEqual(assign_fees([self.class_level.id]), 3)
+        self.assertEqual(StudentFee.objects.count(), 3)
+
+        other = ClassLevel.objects.create(name='SS 1B', level='ss_1', school=self.school)
+        student = self.students[0]
+        student.class_level = other
+        student.save()
+        self.assertEqual(StudentFee.objects.filter(student=student).count(), 1)
+        student.class_level = self.class_level
+        student.save()
+        self.assertEqual(StudentFee.objects.filter(student=student).count(), 1)
+
+    def test_joining_a_class_only_assigns_that_student(self):
+        self.structure(50000)
+        StudentFee.objects.filter(student=self.students[1]).delete()
+        other = ClassLevel.objects.create(name='SS 1B', level='ss_1', school=self.school)
+        student = self.students[0]
+        student.class_level = other
+        student.save()
+        student.class_level = self.class_level
+        student.save()
+        # The rest of the class is left for assign_fees() over the whole class
+        self.assertFalse(StudentFee.objects.filter(student=self.students[1]).exists())
+        self.assertEqual(assign_fees([self.class_level.id]), 3)
+        self.assertTrue(StudentFee.objects.filter(student=self.students[1]).exists())
+
+    def test_fee_management_only_reads(self):
+        self.structure(50000)
+        self.structure(20000, year='2024-2025')
+        for fee in StudentFee.objects.filter(student=self.students[0]):
+            record_payment(fee, fee.amount_due, self.admin_user)
+        self.client.force_login(self.admin_user)
+        with self.assertNumQueries(5):  # session, user, school admin, school, students with totals
+            response = self.client.get(reverse('schools:fee_management'))
+        self.assertEqual(StudentFee.objects.count(), 6)
+        self.assertEqual(response.context['paid_count'], 1)
+        self.assertEqual(response.context['total_revenue'], 70000)
+        fees = {fee['student'].id: fee for fee in response.context['student_fees']}
+        self.assertEqual(fees[self.students[1].id]['balance'], 70000)
+
+    def test_post_fees_to_several_classes(self):
+        other = ClassLevel.objects.create(name='SS 1B', level='ss_1', school=self.school)
+        Student.objects.create(
+            user=User.objects.create_user('student9', password='pass', user_type='student', school=self.school),
+            school=self.school, class_level=other, admission_number='TST009',
+        )
+        classes = [self.class_level.id, other.id]
+        # savepoint, structures (2), counts (2), UPDATE, assign_fees (3), ledger charges and balances (7),
+        # outstanding rollup (5), release
+        with self.assertNumQueries(22):
+            counts = post_fees(classes, '2025-2026', 30000)
+        self.assertEqual(counts, {'structures_created': 2, 'structures_updated': 0, 'fees_created': 4, 'fees_updated': 0})
+
+        record_payment(StudentFee.objects.get(student=self.students[0]), 30000, self.admin_user)
+        counts = post_fees(classes, '2025-2026', 45000)
+        self.assertEqual(counts, {'structures_created': 0, 'structures_updated': 2, 'fees_created': 0, 'fees_updated': 4})
+        self.assertEqual(StudentFee.objects.get(student=self.students[0]).payment_status, 'partial')
+        self.assertEqual(set(FeeStructure.objects.values_list('total_fee', flat=True)), {45000})
+
+    def test_create_fees_for_whole_school_and_two_years(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.post(reverse('schools:create_fees'), {
+            'whole_school': '1', 'academic_years': ['2025-2026', '2026-2027'],
+            'fee_items[]': ['Tuition', 'Books'], 'amounts[]': ['25000', '5000.50'],
+        })
+        self.assertRedirects(response, reverse('schools:fee_management'), fetch_redirect_response=False)
+        self.assertEqual(FeeStructure.objects.count(), 2)
+        self.assertEqual(StudentFee.objects.filter(amount_due='30000.50').count(), 6)
+
+
+class LedgerTests(FeeFixtures, TestCase):
+
+    def test_ledger_keeps_balances(self):
+        self.structure(50000)
+        student = self.students[1]
+        fee = StudentFee.objects.get(student=student)
+        payment = record_payment(fee, 20000, self.admin_user)
+        discount = give_discount(fee, 5000, self.admin_user, 'Sibling')
+        balance = FeeBalance.objects.get(student=student)
+        self.assertEqual((balance.charged, balance.paid, balance.discounted, balance.balance), (50000, 20000, 5000, 25000))
+
+        payment_entry = LedgerEntry.objects.get(reference=payment.receipt_number)
+        reverse_entry(payment_entry, self.admin_user)
+        with self.assertRaises(ValueError):
+            reverse_entry(payment_entry, self.admin_user)
+        fee.refresh_from_db()
+        self.assertEqual((fee.amount_paid, fee.amount_discounted, fee.payment_status), (0, 5000, 'pending'))
+        self.assertEqual(FeeBalance.objects.get(student=student).balance, 45000)
+
+        # Every entry balances, and replaying the ledger gives the same snapshots
+        self.assertEqual(sum(entry.receivable_change for entry in LedgerEntry.objects.filter(student=student)), 45000)
+        self.assertEqual(refresh_balances(), 0)
+        FeeBalance.objects.filter(student=student).update(balance=0)
+        self.assertEqual(refresh_balances(), 1)
+        self.assertEqual(FeeBalance.objects.get(student=student).balance, 45000)
+        with self.assertRaises(ValueError):
+            discount.delete()
+
+    def test_opening_payments(self):
+        self.structure(50000)
+        StudentFee.objects.filter(student=self.students[2]).update(amount_paid=10000)
+        self.assertEqual(sync_opening_payments(StudentFee.objects.all()), 1)
+        self.assertEqual(sync_opening_payments(StudentFee.objects.all()), 0)
+        self.assertEqual(FeeBalance.objects.get(student=self.students[2]).balance, 40000)
+
+    def test_student_with_reversed_entry_is_deactivated_not_deleted(self):
+        self.structure(50000)
+        student = self.students[0]
+        payment = record_payment(StudentFee.objects.get(student=student), 20000, self.admin_user)
+        reverse_entry(LedgerEntry.objects.get(reference=payment.receipt_number), self.admin_user)
+        with self.assertRaises(ProtectedError):
+            Student.objects.get(pk=student.pk).delete()
+
+        self.client.force_login(self.admin_user)
+        response = self.client.post(reverse('schools:delete_user', args=['student', student.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('deactivated', response.json()['message'])
+        student.refresh_from_db()
+        self.assertEqual((student.user.is_active, student.class_level), (False, None))
+        self.assertEqual(LedgerEntry.objects.filter(student=student).count(), 3)
+
+        # A student with no ledger entries is still deleted outright
+        newcomer = Student.objects.create(
+            user=User.objects.create_user('student9', password='pass', user_type='student', school=self.school),
+            school=self.school, admission_number='TST009',
+        )
+        response = self.client.post(reverse('schools:delete_user', args=['student', newcomer.id]))
+        self.assertEqual(response.json(), {'success': True})
+        self.assertFalse(User.objects.filter(username='student9').exists())
+
+
+class FeeRollupTests(FeeFixtures, TestCase):
+
+    def test_rollups_follow_payments(self):
+        self.structure(50000)
+        fee = StudentFee.objects.get(student=self.students[0])
+        record_payment(fee, 20000, self.admin_user, 'Transfer')
+        payment = record_payment(fee, 30000, self.admin_user)
+        reverse_entry(LedgerEntry.objects.get(reference=payment.receipt_number), self.admin_user)
+        today = timezone.localdate()
+
+        collections = {
+            (row.period, row.payment_method): (row.amount, row.payments)
+            for row in FeeCollection.objects.filter(school=self.school)
+        }
+        self.assertEqual(collections[('day', 'Transfer')], (20000, 1))
+        self.assertEqual(collections[('month', 'Cash')], (0, 0))
+        outstanding = {row.payment_status: (row.fees, row.balance) for row in FeeOutstanding.objects.all()}
+        self.assertEqual(outstanding, {'partial': (1, 30000), 'pending': (2, 100000), 'paid': (0, 0)})
+
+        # Rebuilding from the ledger and the fees gives the same rows
+        rows = lambda model, *fields: sorted(model.objects.values_list(*fields))
+        before = rows(FeeCollection, 'period', 'period_start', 'payment_method', 'amount', 'payments')
+        self.assertEqual(rebuild_collections([self.school.id]), 4)
+        self.assertEqual(rows(FeeCollection, 'period', 'period_start', 'payment_method', 'amount', 'payments'), before)
+        refresh_outstanding([self.class_level.id])
+        self.assertEqual(rows(FeeOutstanding, 'payment_status', 'fees', 'amount_paid'), [('partial', 1, 20000), ('pending', 2, 0)])
+
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('schools:fee_analytics'), {'start': today.isoformat(), 'end': today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['series']['totals'], {'Cash': 0.0, 'Transfer': 20000.0})
+        self.assertEqual(response.context['total_fees_due']['balance'], 130000)
+
+
+class NumberSequenceTests(FeeFixtures, TestCase):
+
+    def setUp(self):
+        sequences.reset_cache()
+        self.addCleanup(sequences.reset_cache)
+
+    def test_numbers_are_formatted_and_reserved_in_blocks(self):
+        year = timezone.now().year
+        self.assertEqual(sequences.school_code(self.school), f'T{self.school.id}')
+        self.assertEqual(
+            sequences.allocate(self.school, NumberSequence.ADMISSION, 2),
+            [f'T{self.school.id}/{year}/000001', f'T{self.school.id}/{year}/000002'],
+        )
+        sequence = NumberSequence.objects.get(school=self.school, name=NumberSequence.ADMISSION)
+        self.assertEqual(sequence.next_value, 11)  # a block of 10 was reserved
+
+        # Once the reserving transaction commits, the rest of the block is served from memory
+        with self.captureOnCommitCallbacks(execute=True):
+            sequences.next_number(self.school, NumberSequence.RECEIPT)
+        with self.assertNumQueries(0):
+            receipts = sequences.allocate(self.school, NumberSequence.RECEIPT, 9)
+        self.assertEqual(receipts[-1], f'RCP/T{self.school.id}/{year}/000010')
+        self.assertEqual(sequences.next_number(self.school, NumberSequence.RECEIPT)[-6:], '000011')
+
+    def test_rolled_back_reservation_is_not_reused(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            sequences.next_number(self.school, NumberSequence.RECEIPT)
+        # The callback never ran, so the spare numbers were not kept
+        self.assertEqual(sequences._blocks, {})
+
+    def test_new_student_gets_sequence_number(self):
+        self.client.force_login(self.admin_user)
+        self.client.post(reverse('schools:create_user', args=['student']), {
+            'username': 'newkid', 'first_name': 'New', 'last_name': 'Kid', 'email': 'new@example.com',
+            'password': 'pass12345', 'confirm_password': 'pass12345', 'class_level': self.class_level.id,
+        })
+        student = Student.objects.get(user__username='newkid')
+        self.assertEqual(student.admission_number, f'T{self.school.id}/{timezone.now().year}/000001')
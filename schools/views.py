@@ -1,19 +1,25 @@
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import School, SchoolAdmin, Payment, Subscription, StudentFee, GalleryImage, Article, AdmissionInfo
+from .models import School, SchoolAdmin, Payment, Subscription, StudentFee, FeePayment, FeeBalance, FeeOutstanding, LedgerEntry, GalleryImage, Article, AdmissionInfo
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q, Count
 from users.models import User, Teacher, Student
 from users.forms import CreateUserForm
 from django.utils import timezone  # Add timezone import
-from academic.models import ClassLevel, Assignment, FeeStructure, Subject, ClassSubject
+from academic.models import ClassLevel, Assignment, FeeStructure, Subject, ClassSubject, Result
+from academic.gradebook import Gradebook
+from academic.stats import class_stats, teacher_stats
+from .fees import academic_year_choices, current_academic_year, fee_totals, post_fees
+from .ledger import give_discount, record_payment, reverse_entry
+from .rollups import collection_series
 # from .schools.model import StudentFee
 from django.contrib.auth import logout
 from users.forms import SubjectForm
 from users.forms import UserProfileForm
-from datetime import timedelta
-from decimal import Decimal
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 from django.http import JsonResponse
 
 @login_required
@@ -374,102 +380,103 @@ def student_fee_details(request, student_id):
     school_admin = get_object_or_404(SchoolAdmin, user=request.user)
     student = get_object_or_404(Student, id=student_id, school=school_admin.school)
     
-    student_fees = StudentFee.objects.filter(student=student).select_related('fee_structure')
-    
-    # Add payment history query if you have a FeePayment model
-    # payment_history = FeePayment.objects.filter(student_fee__student=student).order_by('-payment_date')
-    
     if request.method == 'POST':
-        if 'mark_paid' in request.POST:
-            student_fee_id = request.POST.get('student_fee_id')
-            student_fee = get_object_or_404(StudentFee, id=student_fee_id, student=student)
-            
-            # Create payment record
-            receipt_number = f"RCP{student_fee.id}{timezone.now().strftime('%Y%m%d%H%M%S')}"
-            # FeePayment.objects.create(...) - Uncomment if you have FeePayment model
-            
-            # Update student fee
-            student_fee.amount_paid = student_fee.amount_due
-            student_fee.payment_status = 'paid'
-            student_fee.save()
-            
-            messages.success(request, f'Fee marked as fully paid! Receipt: {receipt_number}')
-        
-        elif 'add_payment' in request.POST:
-            student_fee_id = request.POST.get('student_fee_id')
-            amount_paid = request.POST.get('amount_paid')
-            payment_method = request.POST.get('payment_method')
-            
-            student_fee = get_object_or_404(StudentFee, id=student_fee_id, student=student)
+        student_fee = get_object_or_404(StudentFee, id=request.POST.get('student_fee_id'), student=student) \
+            if request.POST.get('student_fee_id') else None
+        try:
+            if 'mark_paid' in request.POST and student_fee:
+                if student_fee.balance() <= 0:
+                    messages.info(request, 'This fee is already fully paid.')
+                else:
+                    payment = record_payment(student_fee, student_fee.balance(), request.user)
+                    messages.success(request, f'Fee marked as fully paid! Receipt: {payment.receipt_number}')
             
-            # Create payment record
-            receipt_number = f"RCP{student_fee.id}{timezone.now().strftime('%Y%m%d%H%M%S')}"
-            # FeePayment.objects.create(...) - Uncomment if you have FeePayment model
+            elif 'add_payment' in request.POST and student_fee:
+                amount_paid = Decimal(request.POST.get('amount_paid') or '0')
+                payment_method = request.POST.get('payment_method') or 'Cash'
+                payment = record_payment(student_fee, amount_paid, request.user, payment_method)
+                messages.success(request, f'Payment recorded! Receipt: {payment.receipt_number}')
             
-            # Update student fee
-            student_fee.amount_paid += Decimal(amount_paid)
-            if student_fee.amount_paid >= student_fee.amount_due:
-                student_fee.payment_status = 'paid'
-            elif student_fee.amount_paid > 0:
-                student_fee.payment_status = 'partial'
-            student_fee.save()
+            elif 'add_discount' in request.POST and student_fee and school_admin.is_senior:
+                amount = Decimal(request.POST.get('discount_amount') or '0')
+                give_discount(student_fee, amount, request.user, request.POST.get('memo', ''))
+                messages.success(request, f'Discount of ₦{amount} applied.')
             
-            messages.success(request, f'Payment recorded! Receipt: {receipt_number}')
-    
-    # Calculate totals
-    total_due = sum(fee.amount_due for fee in student_fees)
-    total_paid = sum(fee.amount_paid for fee in student_fees)
-    total_balance = total_due - total_paid
+            elif 'reverse_entry' in request.POST and school_admin.is_senior:
+                entry = get_object_or_404(LedgerEntry, id=request.POST.get('entry_id'), student=student)
+                reverse_entry(entry, request.user, request.POST.get('memo', ''))
+                messages.success(request, f'{entry.get_kind_display()} of ₦{entry.amount} reversed.')
+        except (InvalidOperation, ValueError) as e:
+            messages.error(request, f'Could not record that: {e}')
+        return redirect('schools:student_fee_details', student_id=student.id)
+    
+    student_fees = StudentFee.objects.filter(student=student).select_related('fee_structure__class_level')
+    payment_history = FeePayment.objects.filter(student_fee__student=student).select_related('recorded_by').order_by('-payment_date')
+    ledger = LedgerEntry.objects.filter(student=student).select_related('created_by').order_by('-created_at', '-id')
+    reversed_ids = set(ledger.filter(reverses__isnull=False).values_list('reverses_id', flat=True))
+    balance = FeeBalance.objects.filter(student=student).first() or FeeBalance(student=student)
     
     return render(request, 'schools/student_fee_details.html', {
         'school': school_admin.school,
         'student': student,
         'student_fees': student_fees,
-        'total_due': total_due,
-        'total_paid': total_paid,
-        'total_balance': total_balance,
+        'total_due': balance.total_due,
+        'total_paid': balance.paid,
+        'total_balance': balance.balance,
         'is_senior_admin': school_admin.is_senior,
-        # 'payment_history': payment_history,  # Uncomment if you have FeePayment model
+        'payment_history': payment_history,
+        'ledger': ledger,
+        'reversed_ids': reversed_ids,
     })
 
 
 @login_required
 def fee_analytics(request):
+    """Collection trends and outstanding fees, read from the rollup tables rather than summed per request"""
     school_admin = get_object_or_404(SchoolAdmin, user=request.user)
     school = school_admin.school
-    
-    # Fee summary
-    total_fees_due = StudentFee.objects.filter(student__school=school).aggregate(
-        total_due=models.Sum('amount_due'),
-        total_paid=models.Sum('amount_paid')
-    )
-    
-    # Payment status distribution
-    status_distribution = StudentFee.objects.filter(student__school=school).values(
-        'payment_status'
-    ).annotate(
-        count=models.Count('id'),
-        amount=models.Sum('amount_due')
-    )
-    
-    # Fee type distribution
-    fee_type_distribution = FeeStructure.objects.filter(school=school).values(
-        'fee_type'
-    ).annotate(
-        total_amount=models.Sum('amount'),
-        count=models.Count('id')
+
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.GET.get('end') or today.isoformat())
+        start = date.fromisoformat(request.GET.get('start') or (end - timedelta(days=89)).isoformat())
+    except ValueError:
+        messages.error(request, 'Dates must be in YYYY-MM-DD format.')
+        start, end = today - timedelta(days=89), today
+    if start > end:
+        start, end = end, start
+
+    series = collection_series(school, start, end)
+
+    # Outstanding by class and status, and the summary figures from the same rows
+    outstanding = FeeOutstanding.objects.filter(school=school, fees__gt=0).select_related('class_level').order_by(
+        'class_level__name', 'payment_status'
     )
-    
+    status_distribution = {}
+    total_fees_due = {'total_due': Decimal('0'), 'total_paid': Decimal('0'), 'total_discounted': Decimal('0')}
+    for row in outstanding:
+        total_fees_due['total_due'] += row.amount_due
+        total_fees_due['total_paid'] += row.amount_paid
+        total_fees_due['total_discounted'] += row.amount_discounted
+        status = status_distribution.setdefault(row.payment_status, {'payment_status': row.payment_status, 'count': 0, 'amount': Decimal('0')})
+        status['count'] += row.fees
+        status['amount'] += row.amount_due
+    total_fees_due['balance'] = total_fees_due['total_due'] - total_fees_due['total_paid'] - total_fees_due['total_discounted']
+
     # Recent payments
-    recent_payments = FeePayment.objects.filter(
-        student_fee__student__school=school
-    ).select_related('student_fee__student__user', 'recorded_by').order_by('-payment_date')[:10]
-    
+    recent_payments = LedgerEntry.objects.filter(
+        school=school, kind=LedgerEntry.PAYMENT
+    ).select_related('student__user', 'created_by').order_by('-created_at')[:10]
+
     return render(request, 'schools/fee_analytics.html', {
         'school': school,
+        'start': start,
+        'end': end,
+        'series': series,
+        'chart': {'labels': series['labels'], 'methods': series['methods']},
         'total_fees_due': total_fees_due,
-        'status_distribution': status_distribution,
-        'fee_type_distribution': fee_type_distribution,
+        'status_distribution': list(status_distribution.values()),
+        'outstanding': outstanding,
         'recent_payments': recent_payments
     })
 
@@ -725,7 +732,7 @@ def manage_users(request):
     
     school = school_admin.school
     teachers = User.objects.filter(teacher__school=school) if hasattr(User, 'teacher') else []
-    students = User.objects.filter(student__school=school) if hasattr(User, 'student') else []
+    students = User.objects.filter(student__school=school, is_active=True) if hasattr(User, 'student') else []
     junior_admins = SchoolAdmin.objects.filter(school=school, is_senior=False)
     
     # Apply search filter
@@ -860,44 +867,33 @@ def user_profile(request, user_type, user_id):
 @login_required
 def fee_management(request):
     school_admin = get_object_or_404(SchoolAdmin, user=request.user)
-    students = Student.objects.filter(school=school_admin.school).select_related('user', 'class_level')
+    # Fees are assigned by schools.fees.assign_fees when structures or classes change,
+    # so this page only reads: one query joining each student's FeeBalance snapshot
+    students = fee_totals(
+        Student.objects.filter(school=school_admin.school).select_related('user', 'class_level')
+    ).order_by('class_level__name', 'admission_number')
+    owing_only = request.GET.get('owing') == '1'
+    if owing_only:
+        students = students.filter(fee_balance__balance__gt=0).order_by('-fee_balance__balance')
     
-    # Calculate fee totals for each student
     student_fees = []
     for student in students:
-        total_due = 0
-        total_paid = 0
-        
-        if student.class_level:
-            # Remove is_active filter since FeeStructure doesn't have this field
-            fee_structures = FeeStructure.objects.filter(class_level=student.class_level)
-            
-            for fee_structure in fee_structures:
-                total_due += fee_structure.total_fee
-                # Get or create student fee record
-                student_fee, created = StudentFee.objects.get_or_create(
-                    student=student,
-                    fee_structure=fee_structure,
-                    defaults={
-                        'amount_due': fee_structure.total_fee,
-                        'amount_paid': 0,
-                        'payment_status': 'pending',
-                        'due_date': timezone.now().date() + timedelta(days=30)
-                    }
-                )
-                total_paid += student_fee.amount_paid
-        
         student_fees.append({
             'student': student,
-            'total_due': total_due,
-            'total_paid': total_paid,
-            'balance': total_due - total_paid,
-            'status': 'Paid' if total_paid >= total_due else 'Unpaid'
+            'total_due': student.total_due,
+            'total_paid': student.total_paid,
+            'balance': student.balance,
+            'status': 'Paid' if student.balance <= 0 else 'Unpaid'
         })
+    paid_count = sum(1 for fee in student_fees if fee['status'] == 'Paid')
     
     context = {
         'school': school_admin.school,
         'student_fees': student_fees,
+        'paid_count': paid_count,
+        'unpaid_count': len(student_fees) - paid_count,
+        'total_revenue': sum(fee['total_paid'] for fee in student_fees),
+        'owing_only': owing_only,
         'is_senior_admin': school_admin.is_senior,
     }
     return render(request, 'schools/fee_management.html', context)
@@ -914,58 +910,42 @@ def create_fees(request):
     class_levels = ClassLevel.objects.filter(school=school_admin.school)
     
     if request.method == 'POST':
-        class_level_id = request.POST.get('class_level')
+        class_level_ids = request.POST.getlist('class_levels')
+        academic_years = [year for year in request.POST.getlist('academic_years') if year in academic_year_choices()]
         fee_items = request.POST.getlist('fee_items[]')
         amounts = request.POST.getlist('amounts[]')
         
-        if class_level_id and fee_items:
-            class_level = get_object_or_404(ClassLevel, id=class_level_id, school=school_admin.school)
-            total_amount = sum(float(amount) for amount in amounts if amount)
-            
-            # Check if fee structure already exists for this class and academic year
-            academic_year = "2024-2025"  # Make this dynamic if needed
-            fee_structure, created = FeeStructure.objects.get_or_create(
-                class_level=class_level,
-                academic_year=academic_year,
-                defaults={
-                    'tuition_fee': total_amount,
-                    'total_fee': total_amount
-                }
-            )
-            
-            if not created:
-                # Update existing fee structure
-                fee_structure.tuition_fee = total_amount
-                fee_structure.total_fee = total_amount
-                fee_structure.save()
-                messages.info(request, f'Fees updated for {class_level.name}!')
-            else:
-                messages.success(request, f'Fees created for {class_level.name} successfully!')
-            
-            # Assign fees to all students in that class
-            students = Student.objects.filter(class_level=class_level, school=school_admin.school)
-            for student in students:
-                student_fee, fee_created = StudentFee.objects.get_or_create(
-                    student=student,
-                    fee_structure=fee_structure,
-                    defaults={
-                        'amount_due': total_amount,
-                        'amount_paid': 0,
-                        'payment_status': 'pending',
-                        'due_date': timezone.now().date() + timedelta(days=30)
-                    }
-                )
-                
-                if not fee_created:
-                    # Update existing student fee
-                    student_fee.amount_due = total_amount
-                    student_fee.save()
-            
+        if request.POST.get('whole_school'):
+            class_level_ids = list(class_levels.values_list('id', flat=True))
+        else:
+            class_level_ids = list(class_levels.filter(id__in=class_level_ids).values_list('id', flat=True))
+        
+        try:
+            total_amount = sum((Decimal(amount) for amount in amounts if amount), Decimal('0'))
+        except InvalidOperation:
+            total_amount = None
+        
+        if not class_level_ids or not academic_years or not fee_items:
+            messages.error(request, 'Choose at least one class, academic year and fee item.')
+        elif total_amount is None or total_amount < 0:
+            messages.error(request, 'Fee amounts must be valid numbers.')
+        else:
+            with transaction.atomic():
+                for academic_year in academic_years:
+                    counts = post_fees(class_level_ids, academic_year, total_amount)
+                    messages.success(
+                        request,
+                        f"{academic_year}: ₦{total_amount} posted to {len(class_level_ids)} class(es) - "
+                        f"{counts['structures_created']} fee structures created, {counts['structures_updated']} updated; "
+                        f"{counts['fees_created']} student fees created, {counts['fees_updated']} updated."
+                    )
             return redirect('schools:fee_management')
     
     context = {
         'school': school_admin.school,
         'class_levels': class_levels,
+        'academic_years': academic_year_choices(),
+        'current_year': current_academic_year(),
     }
     return render(request, 'schools/create_fees.html', context)
 
@@ -1198,7 +1178,42 @@ def school_analytics(request):
     # Recent activity
     recent_assignments = Assignment.objects.filter(
         teacher__school=school
-    ).order_by('-created_at')[:5]
+    ).select_related('subject').order_by('-created_at')[:5]
+    
+    # Subject performance for the latest term with results, from one gradebook per subject
+    latest_term = Result.objects.filter(
+        student__school=school, term__isnull=False
+    ).order_by('-session', '-term').values_list('session', 'term').first()
+    subject_performance = []
+    class_performance = []
+    teacher_performance = []
+    if latest_term:
+        term_results = Result.objects.filter(student__school=school, session=latest_term[0], term=latest_term[1])
+        gradebooks = Gradebook.load_by_subject(term_results)
+        subject_names = Subject.objects.in_bulk(gradebooks.keys())
+        for subject_id, gradebook in gradebooks.items():
+            subject_performance.append({
+                'subject': subject_names[subject_id].name,
+                **gradebook.summary(),
+            })
+        subject_performance.sort(key=lambda row: row['subject'])
+
+        # Class and teacher figures for the same term, one grouped query each
+        by_class = class_stats(term_results)
+        classes = ClassLevel.objects.in_bulk([class_id for class_id in by_class if class_id])
+        class_performance = sorted(
+            ({'name': classes[class_id].name, **stats} for class_id, stats in by_class.items() if class_id in classes),
+            key=lambda row: row['name']
+        )
+        by_teacher = teacher_stats(term_results)
+        teachers = Teacher.objects.select_related('user').in_bulk(list(by_teacher))
+        teacher_performance = sorted(
+            (
+                {'name': teachers[teacher_id].user.get_full_name() or teachers[teacher_id].user.username, **stats}
+                for teacher_id, stats in by_teacher.items()
+            ),
+            key=lambda row: row['name']
+        )
     
     context = {
         'school': school,
@@ -1206,6 +1221,11 @@ def school_analytics(request):
         'students_count': students_count,
         'class_distribution': class_distribution,
         'recent_assignments': recent_assignments,
+        'subject_performance': subject_performance,
+        'class_performance': class_performance,
+        'teacher_performance': teacher_performance,
+        'performance_session': latest_term[0] if latest_term else None,
+        'performance_term': latest_term[1] if latest_term else None,
         'is_senior_admin': school_admin.is_senior,
     }
     return render(request, 'schools/school_analytics.html', context)
@@ -1332,6 +1352,17 @@ def delete_user(request, user_type, user_id):
             
             # Delete the associated User object
             user_account = user.user
+            if user_type == 'student' and user.ledger_entries.exists():
+                # The fee ledger keeps its entries, so the student stays on record but can't log in
+                with transaction.atomic():
+                    user_account.is_active = False
+                    user_account.save(update_fields=['is_active'])
+                    user.class_level = None
+                    user.save(update_fields=['class_level'])
+                return JsonResponse({
+                    'success': True,
+                    'message': f'{user_account.get_full_name() or user_account.username} has fee records, so their account was deactivated instead of deleted.',
+                })
             user.delete()
             user_account.delete()
             
@@ -1371,19 +1402,17 @@ def mark_fee_paid(request, student_id):
     if request.method == 'POST':
         try:
             student = get_object_or_404(Student, id=student_id, school=request.user.schooladmin.school)
-            fee_record = StudentFee.objects.get(student=student)
+            outstanding = [fee for fee in StudentFee.objects.filter(student=student) if fee.balance() > 0]
+            if not outstanding:
+                return JsonResponse({'error': 'Fee record not found'}, status=404)
             
-            # Set balance to 0 and mark as paid
-            fee_record.total_paid = fee_record.total_due
-            fee_record.balance = 0
-            fee_record.status = 'Paid'
-            fee_record.save()
+            # Pay off every outstanding fee, each with its own receipt
+            with transaction.atomic():
+                receipts = [record_payment(fee, fee.balance(), request.user).receipt_number for fee in outstanding]
             
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'receipts': receipts})
             
-        except StudentFee.DoesNotExist:
-            return JsonResponse({'error': 'Fee record not found'}, status=404)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
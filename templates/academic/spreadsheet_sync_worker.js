@@ -0,0 +1,123 @@
+// Queues results spreadsheet edits in IndexedDB and posts them to the delta
+// save API in order. Every batch carries its own Idempotency-Key, so a batch
+// that reached the server before the connection dropped is replayed for free.
+// The CSRF token is not queued with a batch: the page posts its current token
+// with every message and the worker sends whichever it was given last.
+const DB_NAME = 'anthill-scores';
+const STORE = 'batches';
+const SETTINGS = 'settings';
+const SYNC_TAG = 'score-sync';
+const DELTA_URL = '{% url "academic:save_spreadsheet_delta" %}';
+
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', event => event.waitUntil(self.clients.claim()));
+
+function openDb() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(DB_NAME, 2);
+        request.onupgradeneeded = () => {
+            const db = request.result;
+            if (!db.objectStoreNames.contains(STORE)) db.createObjectStore(STORE, { keyPath: 'id' });
+            if (!db.objectStoreNames.contains(SETTINGS)) db.createObjectStore(SETTINGS);
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function withStore(mode, callback, name = STORE) {
+    return openDb().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction(name, mode);
+        const result = callback(tx.objectStore(name));
+        tx.oncomplete = () => resolve(result && result.result);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+const queueBatch = batch => withStore('readwrite', store => store.put(batch));
+const deleteBatch = id => withStore('readwrite', store => store.delete(id));
+const allBatches = () => withStore('readonly', store => store.getAll())
+    .then(batches => batches.sort((a, b) => a.created - b.created));
+const saveCsrfToken = token => withStore('readwrite', store => store.put(token, 'csrfToken'), SETTINGS);
+const csrfToken = () => withStore('readonly', store => store.get('csrfToken'), SETTINGS);
+
+async function notify(message) {
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach(client => client.postMessage(message));
+}
+
+let flushing = null;
+
+// A reply the page can act on: JSON with a success flag
+async function readReply(response) {
+    if (!(response.headers.get('Content-Type') || '').includes('application/json')) return null;
+    try {
+        const data = await response.json();
+        return typeof data.success === 'boolean' ? data : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+// Send queued batches oldest first. A batch is only dropped once the server
+// has answered it: a 2xx JSON reply, or a 400 rejecting the edits. On a
+// network error, a 5xx, a login redirect, a 401/403 (expired session or
+// CSRF token) or any other reply the batch stays queued, the rest wait
+// behind it and the page is told why.
+function flushQueue() {
+    if (!flushing) {
+        flushing = (async () => {
+            for (const batch of await allBatches()) {
+                let response;
+                try {
+                    response = await fetch(DELTA_URL, {
+                        method: 'POST',
+                        credentials: 'same-origin',
+                        headers: {
+                            'Content-Type': 'application/json',
+                            'X-CSRFToken': (await csrfToken()) || '',
+                            'Idempotency-Key': batch.id,
+                        },
+                        body: JSON.stringify(batch.payload),
+                    });
+                } catch (error) {
+                    break;
+                }
+                if (response.status >= 500) break;
+                if (response.redirected || response.status === 401 || response.status === 403) {
+                    await notify({ type: 'blocked', reason: 'auth', status: response.status });
+                    break;
+                }
+                const data = await readReply(response);
+                if (!data || !(response.ok || response.status === 400)) {
+                    await notify({ type: 'blocked', reason: 'reply', status: response.status });
+                    break;
+                }
+                await deleteBatch(batch.id);
+                await notify({ type: 'synced', batch: batch, data: data });
+            }
+            const remaining = (await allBatches()).length;
+            await notify({ type: 'queue', pending: remaining });
+        })().finally(() => { flushing = null; });
+    }
+    return flushing;
+}
+
+self.addEventListener('message', event => {
+    const message = event.data || {};
+    const ready = message.csrfToken ? saveCsrfToken(message.csrfToken) : Promise.resolve();
+    if (message.type === 'queue') {
+        event.waitUntil(ready.then(() => queueBatch(message.batch)).then(() => {
+            if (self.registration.sync) {
+                return self.registration.sync.register(SYNC_TAG).catch(flushQueue);
+            }
+            return flushQueue();
+        }));
+    } else if (message.type === 'flush') {
+        event.waitUntil(ready.then(flushQueue));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === SYNC_TAG) event.waitUntil(flushQueue());
+});
@@ -163,10 +163,10 @@ class CreateUserForm(forms.ModelForm):
                     
                 elif self.user_type == 'student':
                     from users.models import Student
-                    # Generate admission number without school code
-                    last_student = Student.objects.filter(school=self.school).order_by('-id').first()
-                    next_id = last_student.id + 1 if last_student else 1
-                    admission_number = f"STD{next_id:06d}"
+                    from schools.models import NumberSequence
+                    from schools.sequences import next_number
+                    # From the school's admission sequence, e.g. GWD12/2026/000123
+                    admission_number = next_number(self.school, NumberSequence.ADMISSION)
                     
                     student = Student.objects.create(
                         user=user, 
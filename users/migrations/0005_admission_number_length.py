@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_teacher_school'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='admission_number',
+            field=models.CharField(max_length=30, unique=True),
+        ),
+    ]
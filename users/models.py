@@ -105,7 +105,7 @@ class Teacher(models.Model):
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     school = models.ForeignKey('schools.School', on_delete=models.CASCADE, null=True)  # String reference
-    admission_number = models.CharField(max_length=20, unique=True)
+    admission_number = models.CharField(max_length=30, unique=True)
     class_level = models.ForeignKey('academic.ClassLevel', on_delete=models.SET_NULL, null=True, blank=True)  # String reference
     date_admitted = models.DateField(auto_now_add=True)
     elective_subjects = models.ManyToManyField('academic.Subject', blank=True, related_name='elective_students')  # String reference